@@ -489,12 +489,13 @@ class DeleteFace(Resource):
         feature = FaceFeature.query.get(face_id)
         if not feature or feature.user_id != user['id']:
             return {'success': False, 'message': '无权限或人脸不存在'}, 403
+        name = feature.name
         db.session.delete(feature)
         db.session.commit()
         try:
-            current_app.face_recognition_service.reload_face_database()
+            current_app.face_recognition_service.refresh_face(name)
         except Exception as e:
-            logger.error(f"删除人脸后重载数据库失败: {e}")
+            logger.error(f"删除人脸后更新人脸库失败: {e}")
             return {'success': False, 'message': '人脸信息删除失败'}
         return {'success': True, 'message': '人脸信息已删除'}
 # ... existing code ...
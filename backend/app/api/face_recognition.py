@@ -1,10 +1,10 @@
-from turtle import distance
 from flask_restx import Namespace, Resource, fields
 from flask import request, current_app, g
+from werkzeug.datastructures import FileStorage
 import logging
 from ..core.models import FaceFeature, db
 from functools import wraps
-from ..services.alert_service import save_alert_frame
+from ..services.alert_writer import enqueue_alert_frame
 from datetime import datetime
 from pathlib import Path
 import hashlib
@@ -26,6 +26,11 @@ face_recognition_model = ns.model('FaceRecognition', {
     'image': fields.String(required=True, description='Base64图片', example='data:image/jpeg;base64,...')
 })
 
+# multipart/form-data 方式上传原始 JPEG/PNG 文件（避免 base64 膨胀）
+face_image_upload_parser = ns.parser()
+face_image_upload_parser.add_argument('image', type=FileStorage, location='files', required=False,
+                                      help='JPEG/PNG 图片文件（与 JSON 中的 Base64 图片二选一）')
+
 face_register_response_model = ns.model('FaceRegisterResponse', {
     'success': fields.Boolean(description='是否成功', example=True),
     'message': fields.String(description='提示信息', example='成功注册 张三 的人脸特征'),
@@ -44,8 +49,34 @@ face_recognition_response_model = ns.model('FaceRecognitionResponse', {
     'faces': fields.List(fields.Nested(face_recognition_result_model), description='识别结果列表')
 })
 
+face_search_match_model = ns.model('FaceSearchMatch', {
+    'name': fields.String(description='人脸库中的姓名', example='张三'),
+    'distance': fields.Float(description='欧氏距离（越小越相似）', example=0.32),
+    'is_match': fields.Boolean(description='距离是否低于识别阈值', example=True)
+})
+
+face_search_response_model = ns.model('FaceSearchResponse', {
+    'success': fields.Boolean(description='是否成功', example=True),
+    'message': fields.String(description='失败原因'),
+    'bbox': fields.Raw(description='用于检索的人脸框（图中最大的人脸）', example={'left': 10, 'top': 20, 'right': 100, 'bottom': 120}),
+    'gallery_size': fields.Integer(description='人脸库中的人脸数', example=120),
+    'matches': fields.List(fields.Nested(face_search_match_model), description='距离最近的 k 个身份，按距离升序')
+})
+
+face_search_parser = ns.parser()
+face_search_parser.add_argument('k', type=int, location='args', required=False, default=5,
+                                help='返回最相似的身份个数（1-50）')
+
 # 权限校验装饰器
 
+def login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not getattr(g, 'user', None):
+            return {'success': False, 'message': '未登录'}, 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -147,8 +178,8 @@ class FaceRegister(Resource):
 
 @ns.route('/recognize')
 class FaceRecognition(Resource):
-    @ns.doc('人脸识别', description='对单张图片进行人脸识别', security='jwt')
-    @ns.expect(face_recognition_model, validate=True)
+    @ns.doc('人脸识别', description='对单张图片进行人脸识别，支持 JSON Base64 或 multipart 文件上传', security='jwt')
+    @ns.expect(face_recognition_model, face_image_upload_parser)
     @ns.marshal_with(face_recognition_response_model)
     @ns.response(200, '识别成功')
     @ns.response(400, '缺少图片数据')
@@ -157,12 +188,16 @@ class FaceRecognition(Resource):
     def post(self):
         """
         人脸识别接口（用于单张图片识别）。
-        参数：Base64图片。
+        参数：Base64图片（JSON），或 multipart 文件字段 image（原始 JPEG/PNG）。
         返回：识别结果。
         """
         try:
-            data = ns.payload
-            image_base64 = data.get('image')
+            upload = request.files.get('image')
+            if upload is not None:
+                image_base64 = upload.read()
+            else:
+                data = request.get_json(silent=True) or {}
+                image_base64 = data.get('image')
             
             logger.info(f"收到人脸识别请求: image_length={len(image_base64) if image_base64 else 0}")
             
@@ -194,12 +229,12 @@ class FaceRecognition(Resource):
             if recognition_results[0].get("name") == "陌生人" or recognition_results[0].get("name") == "deepfake":                # 1️. 自动生成保存路径
                 now = datetime.now()
                 timestamp = now.strftime('%Y%m%d_%H%M%S')
+                # 目录创建与写盘由后台告警写入线程完成
                 save_dir = Path(f'data/alert_videos/face/video_{timestamp}')
-                save_dir.mkdir(parents=True, exist_ok=True)
                 if(recognition_results[0].get("confidence") != None):
                     confidence = recognition_results[0].get("confidence")
                 else: confidence = 0.1
-                save_alert_frame(
+                enqueue_alert_frame(
                     "face",
                     image_base64,
                     confidence,
@@ -217,6 +252,40 @@ class FaceRecognition(Resource):
             return {'success': False, 'message': f'识别失败: {str(e)}'}
 
 
+@ns.route('/search')
+class FaceSearch(Resource):
+    @ns.doc('以图搜人', description='检索与图中最大人脸最相似的 k 个已注册身份，支持 JSON Base64 或 multipart 文件上传', security='jwt')
+    @ns.expect(face_recognition_model, face_image_upload_parser, face_search_parser)
+    @ns.marshal_with(face_search_response_model)
+    @ns.response(200, '检索完成')
+    @ns.response(400, '缺少图片数据')
+    @ns.response(401, '未登录')
+    @login_required
+    def post(self):
+        """
+        以图搜人接口（需登录：可枚举已注册身份）。
+        参数：Base64图片（JSON），或 multipart 文件字段 image；查询参数 k（默认 5）。
+        返回：人脸框及距离最近的 k 个身份。
+        """
+        try:
+            upload = request.files.get('image')
+            if upload is not None:
+                image_data = upload.read()
+            else:
+                data = request.get_json(silent=True) or {}
+                image_data = data.get('image')
+            if not image_data:
+                return {'success': False, 'message': '缺少图片数据'}, 400
+
+            k = face_search_parser.parse_args().get('k') or 5
+            k = max(1, min(int(k), 50))
+            service = current_app.face_recognition_service
+            return service.search_face(image_data, k)
+        except Exception as e:
+            logger.error(f"以图搜人接口处理失败: {e}", exc_info=True)
+            return {'success': False, 'message': f'检索失败: {str(e)}'}
+
+
 @ns.route('/save_frame')
 class SaveFaceFrame(Resource):
     def post(self):
@@ -357,13 +426,11 @@ class FaceFeatureDetail(Resource):
             from ..services.face_db_service import FaceDatabaseService
             success = FaceDatabaseService.delete_feature(name)
             if success:
-                # 重新加载人脸识别服务的数据库
+                # 从人脸识别服务的人脸库中增量删除
                 try:
-                    service = current_app.face_recognition_service
-                    service.reload_face_database()
-                    logger.info(f"删除人脸特征后重新加载数据库，当前数据库包含 {len(service.features_known_list)} 个特征")
+                    current_app.face_recognition_service.refresh_face(name)
                 except Exception as e:
-                    logger.error(f"重新加载人脸数据库失败: {e}")
+                    logger.error(f"更新人脸库失败: {e}")
                 
                 return {'success': True, 'message': f'成功删除 {name} 的人脸特征'}
             else:
@@ -400,10 +467,30 @@ class FaceFeatureDelete(Resource):
         feature = FaceFeature.query.get(face_id)
         if not feature:
             return {'success': False, 'message': '人脸信息不存在'}, 404
+        name = feature.name
         db.session.delete(feature)
         db.session.commit()
+        try:
+            # 人脸库与近似索引增量删除该姓名
+            current_app.face_recognition_service.refresh_face(name)
+        except Exception as e:
+            logger.error(f"更新人脸库失败: {e}")
         return {'success': True, 'message': '人脸信息已删除'}
 
+
+@ns.route('/gallery/resync')
+class FaceGalleryResync(Resource):
+    @ns.doc('重新同步人脸库', description='从数据库全量重新加载人脸库（注册与删除已增量更新，仅在数据库被外部修改后使用）', security='jwt')
+    @admin_required
+    def post(self):
+        """全量重新加载人脸库（管理员）"""
+        try:
+            count = current_app.face_recognition_service.reload_face_database()
+            return {'success': True, 'message': f'人脸库已重新同步，共 {count} 张已知人脸', 'faces': count}
+        except Exception as e:
+            logger.error(f"重新同步人脸库失败: {e}", exc_info=True)
+            return {'success': False, 'message': f'重新同步失败: {str(e)}'}
+
 @ns.route('/my_faces')
 class MyFaces(Resource):
     def get(self):
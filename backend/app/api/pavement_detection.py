@@ -1,12 +1,20 @@
 # backend/app/api/pavement_detection.py
 
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource, fields, marshal, inputs
+from flask import current_app, request, Response, stream_with_context
+from werkzeug.datastructures import FileStorage
 from flask_socketio import emit # 统一导入 emit
-from ..services.pavement_service import detect_single_image, detect_batch_images # 统一导入 detect_batch_images
+from ..services.pavement_service import (detect_batch_images, detect_video_file, resolve_annotate_every,  # 统一导入 detect_batch_images
+                                         iter_batch_results, iter_video_file_results, get_global_model)
+from ..services.video_ingest_service import SAMPLE_MODES, SAMPLE_FPS, SAMPLE_STRIDE, SAMPLE_SCENE
+from ..services.pavement_stream_service import PavementSessionManager
 from ..utils.logger import get_logger # 统一导入 logger
-from ..services.alert_service import create_alert_video, save_alert_frame, update_alert_video_frame_count # 统一导入 alert_service
-from datetime import datetime
-from pathlib import Path
+from ..utils.metrics import QUEUE_DEPTH
+from ..utils.upload_images import UploadedImages, UploadError
+import json
+import os
+import tempfile
+import time
 
 # 获取日志器实例
 logger = get_logger(__name__)
@@ -16,16 +24,34 @@ ns = Namespace('pavement_detection', description='路面病害检测相关操作
 # 定义用于批量检测的请求解析器
 parser = ns.parser()
 parser.add_argument(
-    'images', type=str, action='split', required=True, location='form',
+    'images', type=str, action='split', required=False, location='form',
     help='一组Base64编码的图片字符串，用英文逗号分隔',
     default='data:image/jpeg;base64,...,data:image/jpeg;base64,...'
 )
+parser.add_argument(
+    'files', type=FileStorage, action='append', required=False, location='files',
+    help='多个 JPEG/PNG 图片文件（multipart/form-data，按上传顺序作为帧顺序），与 images 二选一'
+)
+parser.add_argument(
+    'batch_size', type=int, required=False, location='form',
+    help='每次批量推理的帧数（如 8/16），默认取配置 PAVEMENT_BATCH_SIZE'
+)
+parser.add_argument(
+    'response_mode', type=str, required=False, location='form', default='full',
+    choices=('full', 'detections'),
+    help='full：返回检测列表和标注图；detections：只返回检测列表'
+)
+parser.add_argument(
+    'annotate_every', type=int, required=False, location='form',
+    help='每 N 帧返回一次标注图（0 表示不返回），未指定时由 response_mode 决定'
+)
 
 # 定义检测结果项的模型
 detection_result_item_model = ns.model('DetectionResultItem', {
     'class': fields.String(description='检测到的病害类别', example='坑洞'),
     'confidence': fields.Float(description='检测置信度', example=0.95),
     'bbox': fields.List(fields.Float, description='边界框坐标 [xmin, ymin, xmax, ymax]', example=[10.0, 20.0, 100.0, 120.0]),
+    'track_id': fields.Integer(required=False, description='跨帧病害跟踪ID（同一处病害在连续帧中保持不变）', example=3),
     'error': fields.String(required=False, description='处理错误信息（如果存在）', example='图片解码失败')
 })
 
@@ -42,9 +68,201 @@ frame_result_model = ns.model('FrameResult', {
 detection_response_model = ns.model('DetectionResponse', {
     'status': fields.String(description='整体处理状态', example='success'),
     'message': fields.String(description='整体处理消息', example='共处理 2 帧图像'),
-    'frames': fields.List(fields.Nested(frame_result_model), description='每帧的检测结果列表')
+    'frames': fields.List(fields.Nested(frame_result_model), description='每帧的检测结果列表'),
+    'batch_size': fields.Integer(description='实际使用的推理批大小', example=8),
+    'elapsed_seconds': fields.Float(description='批量检测总耗时（秒）', example=3.2),
+    'fps': fields.Float(description='实际达到的处理帧率（帧/秒）', example=25.0)
+})
+
+# 服务端视频检测的请求解析器
+video_parser = ns.parser()
+video_parser.add_argument('video', type=FileStorage, location='files', required=True,
+                          help='待检测的视频文件（mp4/avi/mov 等 OpenCV 可解码的格式）')
+video_parser.add_argument('sample_mode', type=str, location='form', default='fps', choices=SAMPLE_MODES,
+                          help='抽帧方式：fps 按帧率 / stride 按固定步长 / scene 按场景变化')
+video_parser.add_argument('sample_fps', type=float, location='form', default=2.0, help='fps 模式下每秒抽取的帧数')
+video_parser.add_argument('stride', type=int, location='form', default=10, help='stride 模式下每隔多少帧取一帧')
+video_parser.add_argument('scene_threshold', type=float, location='form', default=0.12,
+                          help='scene 模式下判定场景变化的平均灰度差阈值（0~1）')
+video_parser.add_argument('max_frames', type=int, location='form', required=False, help='最多抽取的帧数')
+video_parser.add_argument('batch_size', type=int, location='form', required=False,
+                          help='每次批量推理的帧数，默认取配置 PAVEMENT_BATCH_SIZE')
+video_parser.add_argument('response_mode', type=str, location='form', default='full', choices=('full', 'detections'),
+                          help='full：返回检测列表和标注图；detections：只返回检测列表')
+video_parser.add_argument('annotate_every', type=int, location='form', required=False,
+                          help='每 N 帧返回一次标注图（0 表示不返回），未指定时由 response_mode 决定')
+
+video_frame_result_model = ns.inherit('VideoFrameResult', frame_result_model, {
+    'source_frame_index': fields.Integer(description='该帧在源视频中的帧序号', example=120),
+    'timestamp': fields.Float(description='该帧在源视频中的时间（秒）', example=4.8)
 })
 
+video_detection_response_model = ns.model('VideoDetectionResponse', {
+    'status': fields.String(description='整体处理状态', example='success'),
+    'message': fields.String(description='整体处理消息', example='共抽取并检测 20 帧'),
+    'video': fields.Raw(description='源视频信息（fps、frame_count、width、height）'),
+    'frames': fields.List(fields.Nested(video_frame_result_model), description='抽取帧的检测结果列表'),
+    'batch_size': fields.Integer(description='实际使用的推理批大小', example=8),
+    'elapsed_seconds': fields.Float(description='解码与检测总耗时（秒）', example=3.2),
+    'fps': fields.Float(description='实际达到的处理帧率（帧/秒）', example=25.0)
+})
+
+
+# 批量图片上传（multipart 多文件或单个压缩包）的请求解析器
+bulk_parser = ns.parser()
+bulk_parser.add_argument('files', type=FileStorage, action='append', required=False, location='files',
+                         help='多个 JPEG/PNG 图片文件（按上传顺序作为帧顺序），与 archive 二选一')
+bulk_parser.add_argument('archive', type=FileStorage, required=False, location='files',
+                         help='包含图片的 zip / tar / tar.gz 压缩包（按成员路径排序作为帧顺序）')
+bulk_parser.add_argument('batch_size', type=int, required=False, location='form',
+                         help='每次批量推理的帧数，默认取配置 PAVEMENT_BATCH_SIZE')
+bulk_parser.add_argument('response_mode', type=str, required=False, location='form', default='detections',
+                         choices=('full', 'detections'),
+                         help='full：返回检测列表和标注图；detections（默认）：只返回检测列表')
+bulk_parser.add_argument('annotate_every', type=int, required=False, location='form',
+                         help='每 N 帧返回一次标注图（0 表示不返回），未指定时由 response_mode 决定')
+bulk_parser.add_argument('stream', type=inputs.boolean, required=False, location='form', default=False,
+                         help='为 true 时以 NDJSON 逐帧流式返回')
+
+bulk_frame_result_model = ns.inherit('BulkFrameResult', frame_result_model, {
+    'file_name': fields.String(description='该帧对应的上传文件名或压缩包内路径', example='images/0001.jpg')
+})
+
+bulk_detection_response_model = ns.model('BulkDetectionResponse', {
+    'status': fields.String(description='整体处理状态', example='success'),
+    'message': fields.String(description='整体处理消息', example='共处理 1000 张图像'),
+    'video_id': fields.Integer(description='本次检测对应的告警记录ID', example=12),
+    'alert_count': fields.Integer(description='保存的告警帧数', example=5),
+    'frames': fields.List(fields.Nested(bulk_frame_result_model), description='每张图像的检测结果列表'),
+    'batch_size': fields.Integer(description='实际使用的推理批大小', example=8),
+    'elapsed_seconds': fields.Float(description='检测总耗时（秒）', example=40.5),
+    'fps': fields.Float(description='实际达到的处理帧率（帧/秒）', example=24.7)
+})
+
+
+def _join_data_urls(parts):
+    """
+    action='split' 会把 data URL 前缀中的逗号一并切开（'data:image/jpeg;base64' 与数据被拆成两段），
+    这里把前缀段与紧随其后的数据段重新拼接成完整的 data URL。
+    """
+    if not parts:
+        return []
+    images = []
+    for part in parts:
+        if images and images[-1].startswith('data:') and ',' not in images[-1]:
+            images[-1] = f"{images[-1]},{part}"
+        else:
+            images.append(part)
+    return images
+
+
+def _annotate_every(args) -> int:
+    """解析 response_mode / annotate_every，非法值返回 400。"""
+    try:
+        return resolve_annotate_every(args.get('response_mode'), args.get('annotate_every'))
+    except ValueError as e:
+        ns.abort(400, message=str(e))
+
+
+def _batch_args():
+    """解析并校验批量检测参数，返回 (图像列表, batch_size, annotate_every)。"""
+    args = parser.parse_args()
+    files = [f for f in (args.get('files') or []) if f and f.filename]
+    # 优先使用二进制文件上传，否则回退到逗号分隔的 Base64 字符串
+    images = files if files else _join_data_urls(args.get('images'))
+    batch_size = args.get('batch_size') or current_app.config.get('PAVEMENT_BATCH_SIZE', 8)
+    if batch_size <= 0:
+        ns.abort(400, message="batch_size 必须为正整数")
+    annotate_every = _annotate_every(args)
+    if not isinstance(images, list) or len(images) == 0:
+        logger.warning("收到空的或无效的图像数据进行批量检测")
+        ns.abort(400, message="图像数据不能为空")
+    return images, batch_size, annotate_every
+
+
+def _with_file_names(results, names):
+    """按 frame_index 给每帧结果补上来源文件名。"""
+    for frame in results:
+        frame['file_name'] = names[frame['frame_index']]
+        yield frame
+
+
+def _video_args():
+    """解析并校验视频文件检测参数，返回 (参数字典, batch_size, annotate_every)。"""
+    args = video_parser.parse_args()
+    video = args['video']
+    if video is None or not video.filename:
+        ns.abort(400, message="视频文件不能为空")
+    batch_size = args.get('batch_size') or current_app.config.get('PAVEMENT_BATCH_SIZE', 8)
+    if batch_size <= 0:
+        ns.abort(400, message="batch_size 必须为正整数")
+    # 抽帧参数在创建告警视频记录、开始流式响应之前校验，避免留下空的 AlertVideo 或在 200 响应中途才报错
+    if args['sample_mode'] == SAMPLE_FPS and not (args['sample_fps'] is not None and args['sample_fps'] > 0):
+        ns.abort(400, message="sample_fps 必须大于 0")
+    if args['sample_mode'] == SAMPLE_STRIDE and not (args['stride'] is not None and args['stride'] > 0):
+        ns.abort(400, message="stride 必须为正整数")
+    if args['sample_mode'] == SAMPLE_SCENE and not (args['scene_threshold'] is not None and 0 <= args['scene_threshold'] <= 1):
+        ns.abort(400, message="scene_threshold 必须在 0~1 之间")
+    if args.get('max_frames') is not None and args['max_frames'] <= 0:
+        ns.abort(400, message="max_frames 必须为正整数")
+    annotate_every = _annotate_every(args)
+    return args, batch_size, annotate_every
+
+
+def _save_upload(video) -> str:
+    """OpenCV 需要文件路径，先把上传内容落到临时文件，返回临时文件路径。"""
+    suffix = os.path.splitext(video.filename)[1] or '.mp4'
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        video.save(tmp)
+    finally:
+        tmp.close()
+    return tmp.name
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _ndjson_line(payload) -> str:
+    return json.dumps(payload, ensure_ascii=False) + '\n'
+
+
+def _ndjson_response(results, summary: dict, frame_model, header: dict, on_close=None) -> Response:
+    """
+    将逐帧结果生成器包装为 NDJSON 流式响应（application/x-ndjson）：
+    首行 type=start，之后每帧一行 type=frame（字段同非流式接口的 frames 元素），
+    结束时一行 type=summary（video_id、帧数、告警数、耗时、帧率），出错时一行 type=error。
+    每帧处理完立即写出，服务端不再累积全部结果。
+    """
+    def generate():
+        start = time.perf_counter()
+        try:
+            yield _ndjson_line(dict(header, type='start'))
+            for frame in results:
+                yield _ndjson_line(dict(marshal(frame, frame_model), type='frame'))
+            elapsed = time.perf_counter() - start
+            frame_count = summary.get('frame_count', 0)
+            fps = frame_count / elapsed if elapsed > 0 else 0.0
+            logger.info(f"流式检测完成，共 {frame_count} 帧，耗时 {elapsed:.2f}s，{fps:.2f} 帧/秒。")
+            yield _ndjson_line(dict(summary, type='summary', elapsed_seconds=round(elapsed, 3), fps=round(fps, 2)))
+        except Exception as e:
+            logger.exception(f"流式检测失败: {str(e)}")
+            yield _ndjson_line({'type': 'error', 'message': f'检测失败: {str(e)}'})
+        finally:
+            # 客户端中途断开时关闭结果生成器，已处理部分的轨迹与计数仍会保存
+            close = getattr(results, 'close', None)
+            if close is not None:
+                close()
+            if on_close is not None:
+                on_close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 
 @ns.route('/analyze_video')
 class DetectPavementBatch(Resource):
@@ -56,25 +274,28 @@ class DetectPavementBatch(Resource):
     @ns.response(500, '服务器内部错误')
     def post(self):
         """
-        对一组路面图像（Base64编码）执行病害检测。
-        参数：images（form-data，Base64图片字符串数组，英文逗号分隔）。
+        对一组路面图像执行病害检测。
+        参数：images（form-data，Base64图片字符串数组，英文逗号分隔），
+              或 files（multipart 上传的多个 JPEG/PNG 文件）。
         返回：每帧的检测结果。
         """
-        args = parser.parse_args()
-        images = args['images']
-
-        if not isinstance(images, list) or len(images) == 0:
-            logger.warning("收到空的或无效的图像数据进行批量检测")
-            ns.abort(400, message="图像数据不能为空")
+        images, batch_size, annotate_every = _batch_args()
 
         try:
             # 调用服务层进行批量检测
-            results = detect_batch_images(images)
-            logger.info(f"成功处理 {len(results)} 帧图像的批量检测请求。")
+            start = time.perf_counter()
+            frames = [f.read() if isinstance(f, FileStorage) else f for f in images]
+            results = detect_batch_images(frames, batch_size=batch_size, annotate_every=annotate_every)
+            elapsed = time.perf_counter() - start
+            fps = len(results) / elapsed if elapsed > 0 else 0.0
+            logger.info(f"成功处理 {len(results)} 帧图像的批量检测请求，batch_size={batch_size}，耗时 {elapsed:.2f}s，{fps:.2f} 帧/秒。")
             return {
                 'status': 'success',
                 'message': f'共处理 {len(results)} 帧图像',
-                'frames': results
+                'frames': results,
+                'batch_size': batch_size,
+                'elapsed_seconds': round(elapsed, 3),
+                'fps': round(fps, 2)
             }
         except ValueError as ve:
             logger.error(f"批量检测请求参数错误: {str(ve)}")
@@ -84,94 +305,229 @@ class DetectPavementBatch(Resource):
             ns.abort(500, message=f"检测失败: {str(e)}")
 
 
-def get_pavement_socketio_handlers():
+@ns.route('/analyze_video_file')
+class DetectPavementVideoFile(Resource):
+    @ns.doc('视频文件路面病害检测', description='上传视频文件，由服务端解码并抽帧后执行病害检测')
+    @ns.expect(video_parser)
+    @ns.marshal_with(video_detection_response_model)
+    @ns.response(200, '检测成功')
+    @ns.response(400, '无效的请求数据')
+    @ns.response(500, '服务器内部错误')
+    def post(self):
+        """
+        上传视频文件进行路面病害检测。
+        服务端用 OpenCV 流式解码，按帧率/步长/场景变化抽帧后送入批量检测，无需浏览器逐帧上传。
+        """
+        args, batch_size, annotate_every = _video_args()
+        video = args['video']
+        video_path = _save_upload(video)
+        try:
+            start = time.perf_counter()
+            result = detect_video_file(
+                video_path, video.filename,
+                sample_mode=args['sample_mode'], target_fps=args['sample_fps'], stride=args['stride'],
+                scene_threshold=args['scene_threshold'], max_frames=args.get('max_frames'),
+                batch_size=batch_size, annotate_every=annotate_every
+            )
+            elapsed = time.perf_counter() - start
+            frames = result['frames']
+            fps = len(frames) / elapsed if elapsed > 0 else 0.0
+            logger.info(f"视频 {video.filename} 检测完成，抽取 {len(frames)} 帧，耗时 {elapsed:.2f}s，{fps:.2f} 帧/秒。")
+            return {
+                'status': 'success',
+                'message': f'共抽取并检测 {len(frames)} 帧',
+                'video': result['video'],
+                'frames': frames,
+                'batch_size': batch_size,
+                'elapsed_seconds': round(elapsed, 3),
+                'fps': round(fps, 2)
+            }
+        except ValueError as ve:
+            logger.error(f"视频检测请求参数错误: {str(ve)}")
+            ns.abort(400, message=str(ve))
+        except Exception as e:
+            logger.exception(f"视频检测服务器内部错误: {str(e)}")
+            ns.abort(500, message=f"检测失败: {str(e)}")
+        finally:
+            _remove_quietly(video_path)
+
+
+@ns.route('/analyze_video/stream')
+class DetectPavementBatchStream(Resource):
+    @ns.doc('多帧路面病害检测（流式）',
+            description='参数同 /analyze_video；以 NDJSON（application/x-ndjson）逐帧返回结果，每帧完成即写出')
+    @ns.expect(parser)
+    @ns.response(200, '流式返回：start / frame... / summary 各占一行')
+    @ns.response(400, '无效的请求数据')
+    def post(self):
+        """
+        流式批量检测：每帧检测完成后立即以一行 JSON 写出，客户端可以边收边显示进度，
+        服务端内存占用与帧数无关。
+        """
+        images, batch_size, annotate_every = _batch_args()
+        if get_global_model() is None:
+            ns.abort(500, message="模型未加载，无法进行检测")
+        # 上传文件按需逐个读取，不在请求开始时一次性读入全部字节
+        frames = (f.read() if isinstance(f, FileStorage) else f for f in images)
+        summary = {'batch_size': batch_size}
+        results = iter_batch_results(frames, batch_size, annotate_every, total_frames=len(images), summary=summary)
+        return _ndjson_response(results, summary, frame_result_model,
+                                {'total_frames': len(images), 'batch_size': batch_size})
+
+
+@ns.route('/analyze_video_file/stream')
+class DetectPavementVideoFileStream(Resource):
+    @ns.doc('视频文件路面病害检测（流式）',
+            description='参数同 /analyze_video_file；以 NDJSON（application/x-ndjson）逐帧返回抽帧检测结果')
+    @ns.expect(video_parser)
+    @ns.response(200, '流式返回：start / frame... / summary 各占一行')
+    @ns.response(400, '无效的请求数据')
+    def post(self):
+        """流式视频文件检测：边解码抽帧边检测，每帧完成即写出，临时文件在流结束后删除。"""
+        args, batch_size, annotate_every = _video_args()
+        if get_global_model() is None:
+            ns.abort(500, message="模型未加载，无法进行检测")
+        video = args['video']
+        video_path = _save_upload(video)
+        summary = {'batch_size': batch_size}
+        results = iter_video_file_results(
+            video_path, video.filename,
+            sample_mode=args['sample_mode'], target_fps=args['sample_fps'], stride=args['stride'],
+            scene_threshold=args['scene_threshold'], max_frames=args.get('max_frames'),
+            batch_size=batch_size, annotate_every=annotate_every, summary=summary
+        )
+        return _ndjson_response(results, summary, video_frame_result_model,
+                                {'video_name': video.filename, 'batch_size': batch_size},
+                                on_close=lambda: _remove_quietly(video_path))
+
+
+@ns.route('/analyze_images')
+class DetectPavementBulkImages(Resource):
+    @ns.doc('批量图片路面病害检测',
+            description='multipart 上传多个图片文件或单个 zip/tar 压缩包；stream=true 时以 NDJSON 逐帧返回')
+    @ns.expect(bulk_parser)
+    @ns.response(200, '检测成功（stream=true 时为 NDJSON：start / frame... / summary）',
+                 bulk_detection_response_model)
+    @ns.response(400, '无效的请求数据')
+    @ns.response(500, '服务器内部错误')
+    def post(self):
+        """
+        大批量图片检测（上千张）：图片以二进制文件或压缩包上传，不再经过 Base64 与逗号拼接的表单字段。
+        上传内容由 werkzeug 写入临时文件，检测引擎按批逐张读取，内存占用与图片总数无关。
+        返回的每帧结果带 file_name，便于与原始文件对应。
+        """
+        args = bulk_parser.parse_args()
+        batch_size = args.get('batch_size') or current_app.config.get('PAVEMENT_BATCH_SIZE', 8)
+        if batch_size <= 0:
+            ns.abort(400, message="batch_size 必须为正整数")
+        annotate_every = _annotate_every(args)
+        if get_global_model() is None:
+            ns.abort(500, message="模型未加载，无法进行检测")
+
+        try:
+            images = UploadedImages(
+                files=args.get('files'), archive=args.get('archive'),
+                max_images=current_app.config.get('BULK_UPLOAD_MAX_IMAGES', 5000),
+                max_image_bytes=current_app.config.get('BULK_UPLOAD_MAX_IMAGE_MB', 32) * 1024 * 1024
+            )
+        except UploadError as e:
+            logger.warning(f"批量图片上传不合法: {e}")
+            ns.abort(400, message=str(e))
+
+        total = len(images)
+        summary = {'batch_size': batch_size}
+        results = _with_file_names(
+            iter_batch_results(images, batch_size, annotate_every, total_frames=total, summary=summary),
+            images.names
+        )
+        logger.info(f"收到 {total} 张图像的批量检测请求，batch_size={batch_size}，stream={args.get('stream')}")
+        if args.get('stream'):
+            return _ndjson_response(results, summary, bulk_frame_result_model,
+                                    {'total_frames': total, 'batch_size': batch_size}, on_close=images.close)
+
+        try:
+            start = time.perf_counter()
+            frames = [marshal(frame, bulk_frame_result_model) for frame in results]
+            elapsed = time.perf_counter() - start
+            fps = len(frames) / elapsed if elapsed > 0 else 0.0
+            logger.info(f"成功处理 {len(frames)} 张图像，耗时 {elapsed:.2f}s，{fps:.2f} 帧/秒。")
+            return marshal({
+                'status': 'success',
+                'message': f'共处理 {len(frames)} 张图像',
+                'video_id': summary.get('video_id'),
+                'alert_count': summary.get('alert_count', 0),
+                'frames': frames,
+                'batch_size': batch_size,
+                'elapsed_seconds': round(elapsed, 3),
+                'fps': round(fps, 2)
+            }, bulk_detection_response_model)
+        except Exception as e:
+            logger.exception(f"批量图片检测失败: {str(e)}")
+            ns.abort(500, message=f"检测失败: {str(e)}")
+        finally:
+            images.close()
+
+
+def get_pavement_socketio_handlers(socketio):
     """
     返回路面检测的Socket.IO事件处理器。
-    这些处理器用于实时视频流的单帧处理。
+    这些处理器用于实时视频流的单帧处理：每个客户端（sid）拥有独立的会话与工作线程，
+    事件处理器只负责把帧放入会话队列，检测结果由工作线程通过 socketio.emit 发回该客户端。
     """
-    first_frame_handled = False  # 闭包变量
-    frame_count = 0  # 闭包变量
-    alert_count = 0  # 闭包变量
-    video_id = None  # 外部变量，在首次帧中初始化
+    manager = PavementSessionManager()
+    QUEUE_DEPTH.track(manager.queued_frames, queue='pavement_stream')
+    QUEUE_DEPTH.track(manager.session_count, queue='pavement_stream_sessions')
+
+    def _get_session(sid):
+        app = current_app._get_current_object()
+
+        def emit_to_client(event, payload):
+            socketio.emit(event, payload, to=sid)
+
+        return manager.get_or_create(
+            sid, app, emit_to_client,
+            max_queue=app.config.get('PAVEMENT_STREAM_QUEUE_SIZE', 4),
+            max_in_flight=app.config.get('PAVEMENT_STREAM_MAX_IN_FLIGHT', 2),
+            skip_threshold=app.config.get('PAVEMENT_SKIP_THRESHOLD', 0.01),
+            target_latency_ms=app.config.get('STREAM_TARGET_LATENCY_MS', 200)
+        )
 
     def handle_video_frame(data: dict):
-        nonlocal first_frame_handled  # 允许修改外部变量
-        nonlocal frame_count  # 允许修改外部变量
-        nonlocal alert_count  # 允许修改外部变量
-        nonlocal video_id 
         """
         处理从客户端接收到的单帧视频图像数据。
-        对图像进行病害检测，并将结果通过Socket.IO发送回客户端。
+        帧进入该客户端会话的有界队列，检测结果以 frame_result 事件（带 frame_index）异步返回。
         """
-        logger.info("开始处理视频帧...")
-
-        image_data = data.get('image')
-        frame_index = data.get('frame_index')
+        image_data = data.get('image') if isinstance(data, dict) else None
         if not image_data:
             logger.error("视频帧图像数据为空。")
-            emit('frame_result', {'status': 'error', 'message': '图像数据为空', 'detections': [], 'annotated_image': None})
+            emit('frame_result', {'status': 'error', 'message': '图像数据为空', 'detections': [], 'annotated_image': None,
+                                  'frame_index': data.get('frame_index') if isinstance(data, dict) else None})
             return
 
-        try:
-             # 首帧逻辑（仅执行一次）
-            if not first_frame_handled:
-                logger.info("检测到第一帧，执行首次初始化操作。")
-                # 1️. 自动生成保存路径
-                now = datetime.now()
-                timestamp = now.strftime('%Y%m%d_%H%M%S')
-                save_dir = Path(f'data/alert_videos/pavement/video_{timestamp}')
-                save_dir.mkdir(parents=True, exist_ok=True)
-
-                # 2. 路面病害告警
-                video_id = create_alert_video('road',f'video_{timestamp}', str(save_dir), 0, 0)
-
-                frame_count = 0  # 重置帧计数
-                alert_count = 0  # 重置告警计数
-
-                first_frame_handled = True
-
-            frame_count += 1     # 帧计数
-            # 调用服务层进行单帧图像检测
-            result = detect_single_image(image_data)
-            if frame_index is not None:
-                result['frame_index'] = frame_index
-
-            # 根据detect_single_image的返回结果发送给客户端
-            emit('frame_result', result)
-            if result.get('status') == 'success':
-                logger.info(f"视频帧检测完成，检测到 {len(result.get('detections', []))} 个对象。")
-                if len(result.get('detections', [])) > 0:
-                    for detection in result['detections']:
-                        alert_count += 1
-                        save_alert_frame(
-                            'road',
-                            result['annotated_image'],
-                            detection['confidence'],
-                            video_id,
-                            frame_index + 1,
-                            detection['class']
-                        )
-            else:
-                logger.warning(f"视频帧检测失败: {result.get('message')}")
-            
-            # 更新帧数
-            update_alert_video_frame_count('road',video_id, frame_count, alert_count)
-
-        except Exception as e:
-            logger.exception(f"处理视频帧时发生未预期错误: {str(e)}") # 使用logger.exception 打印完整堆栈
-            emit('frame_result', {'status': 'error', 'message': f'处理失败: {str(e)}', 'detections': [], 'annotated_image': None})
+        _get_session(request.sid).submit(data)
 
     def handle_video_stream_end(data: dict):
         """
         处理视频流结束信号。
-        之前会通知客户端视频处理已完成，现在不再发送stream_complete信号，由前端自行判断。
+        会话中已排队的帧处理完毕后重置该客户端的计数，下一帧将作为新视频的首帧。
         """
         logger.info('收到视频流结束信号，视频流处理完成。')
-        nonlocal first_frame_handled  # 允许修改外部变量
-        first_frame_handled = False  # 重置闭包变量
-        # emit('stream_complete', {'message': '视频处理完成'})  # 已删除
+        session = manager.get(request.sid)
+        if session is not None:
+            session.end_stream()
+
+    def handle_video_stats(data: dict = None):
+        """返回当前客户端会话的统计信息（帧数、告警数、丢帧数、近重复帧跳过率等）。"""
+        session = manager.get(request.sid)
+        emit('stream_stats', session.stats() if session is not None else {})
+
+    def handle_disconnect(sid: str):
+        """客户端断开时释放其会话。"""
+        manager.close(sid)
 
     return {
         'video_frame': handle_video_frame,
-        'video_stream_end': handle_video_stream_end
+        'video_stream_end': handle_video_stream_end,
+        'video_stats': handle_video_stats,
+        'disconnect': handle_disconnect
     }
@@ -23,6 +23,41 @@ class Config:
 
     # ... 其他配置 ...
 
+    # 路面病害检测配置
+    PAVEMENT_BACKEND = os.environ.get('PAVEMENT_BACKEND', 'torch')  # 推理后端：torch / onnx / openvino / onnx-int8（首次使用时自动导出）
+    PAVEMENT_INT8_CALIBRATION_DIR = os.environ.get('PAVEMENT_INT8_CALIBRATION_DIR', 'data/calibration')  # INT8 量化校准图片目录
+    ALERT_WRITER_QUEUE_SIZE = int(os.environ.get('ALERT_WRITER_QUEUE_SIZE', 256))  # 等待写入的告警帧上限
+    ALERT_WRITER_BATCH_SIZE = int(os.environ.get('ALERT_WRITER_BATCH_SIZE', 32))  # 每次提交写入的最大告警帧数
+    ALERT_WRITER_FLUSH_INTERVAL = float(os.environ.get('ALERT_WRITER_FLUSH_INTERVAL', 0.5))  # 计数合并提交的最长间隔（秒）
+    PAVEMENT_DECODE_MIN_SIDE = int(os.environ.get('PAVEMENT_DECODE_MIN_SIDE', 640))  # JPEG 降分辨率解码的目标长边（0 关闭）
+    FACE_DECODE_MIN_SIDE = int(os.environ.get('FACE_DECODE_MIN_SIDE', 960))  # 人脸识别/活体检测降分辨率解码的最小长边（0 关闭）
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 512))  # 每类推理结果缓存的条目上限（0 关闭）
+    RESULT_CACHE_MAX_MB = int(os.environ.get('RESULT_CACHE_MAX_MB', 64))  # 每类推理结果缓存的内存上限（MB）
+    RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 600))  # 缓存条目有效期（秒）
+    PAVEMENT_TILING_MODE = os.environ.get('PAVEMENT_TILING_MODE', 'auto')  # 切片推理：auto（仅高分辨率）/ always / off
+    PAVEMENT_TILING_MIN_SIDE = int(os.environ.get('PAVEMENT_TILING_MIN_SIDE', 2560))  # auto 模式下触发切片的最小长边
+    PAVEMENT_TILE_SIZE = int(os.environ.get('PAVEMENT_TILE_SIZE', 1280))  # 切片边长（像素）
+    PAVEMENT_TILE_OVERLAP = float(os.environ.get('PAVEMENT_TILE_OVERLAP', 0.2))  # 相邻切片重叠比例
+    STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')  # 模型加载时机：eager 启动时 / background 后台 / lazy 首次使用时
+    MODEL_LOADER_THREADS = int(os.environ.get('MODEL_LOADER_THREADS', 4))  # 启动时并行加载模型的线程数
+    MODEL_WAIT_TIMEOUT = float(os.environ.get('MODEL_WAIT_TIMEOUT', 60))  # 请求等待模型后台加载完成的最长时间（秒）
+    PAVEMENT_BATCH_SIZE = int(os.environ.get('PAVEMENT_BATCH_SIZE', 8))  # 批量检测时每次前向推理的帧数
+    BULK_UPLOAD_MAX_IMAGES = int(os.environ.get('BULK_UPLOAD_MAX_IMAGES', 5000))  # 批量图片上传的图片数量上限
+    BULK_UPLOAD_MAX_IMAGE_MB = int(os.environ.get('BULK_UPLOAD_MAX_IMAGE_MB', 32))  # 压缩包内单张图片（解压后）大小上限（MB）
+    PAVEMENT_STREAM_QUEUE_SIZE = int(os.environ.get('PAVEMENT_STREAM_QUEUE_SIZE', 4))  # 每个实时会话的输入队列长度
+    PAVEMENT_STREAM_MAX_IN_FLIGHT = int(os.environ.get('PAVEMENT_STREAM_MAX_IN_FLIGHT', 2))  # 每个会话同时处理的帧数
+    PAVEMENT_SKIP_THRESHOLD = float(os.environ.get('PAVEMENT_SKIP_THRESHOLD', 0.01))  # 近重复帧跳过阈值（平均灰度差，0 关闭）
+    STREAM_TARGET_LATENCY_MS = float(os.environ.get('STREAM_TARGET_LATENCY_MS', 200))  # 实时流自适应画质的端到端延迟目标（毫秒，0 关闭）
+    PAVEMENT_ANNOTATION_CODEC = os.environ.get('PAVEMENT_ANNOTATION_CODEC', 'jpeg')  # 标注图编码格式：jpeg / webp / png
+    PAVEMENT_ANNOTATION_QUALITY = int(os.environ.get('PAVEMENT_ANNOTATION_QUALITY', 80))  # 标注图编码质量（jpeg/webp）
+    FACE_ANN_INDEX = os.environ.get('FACE_ANN_INDEX', 'off')  # 人脸库近似最近邻索引：off 精确比对 / ivf（IVF-Flat）
+    FACE_ANN_MIN_SIZE = int(os.environ.get('FACE_ANN_MIN_SIZE', 10000))  # 人脸库达到该规模才使用近似索引，较小时精确比对更快
+    FACE_ANN_NLIST = int(os.environ.get('FACE_ANN_NLIST', 0))  # IVF 簇数（0 按人脸库规模自动选择，约 4·√N）
+    FACE_ANN_NPROBE = int(os.environ.get('FACE_ANN_NPROBE', 8))  # 每次查询探查的簇数，越大召回越高
+    FACE_ANN_INDEX_PATH = os.environ.get('FACE_ANN_INDEX_PATH', 'data/face_index.npz')  # 索引持久化文件
+    FACE_GALLERY_SNAPSHOT = os.environ.get('FACE_GALLERY_SNAPSHOT', 'on')  # 人脸库加密快照：on 启动时优先从快照加载并在变化后更新 / off
+    FACE_GALLERY_SNAPSHOT_PATH = os.environ.get('FACE_GALLERY_SNAPSHOT_PATH', 'data/face_gallery.snapshot')  # 人脸库加密快照文件
+
     # 日志配置
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO') # 日志级别 (DEBUG, INFO, WARNING, ERROR, CRITICAL)
     LOG_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'logs') # 日志文件存放目录
@@ -127,6 +127,10 @@ class AlertFrame(db.Model):
     confidence = db.Column(db.Float, nullable=False)  # 检测置信度（选第一个目标）
     image_path = db.Column(db.String(512), nullable=False)  # 病害图像路径（带标注图）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # 跨帧跟踪：同一处病害只保存置信度最高的一帧，并记录其出现的首/末帧
+    track_id = db.Column(db.Integer, nullable=True)  # 视频内的病害跟踪ID
+    first_frame_index = db.Column(db.Integer, nullable=True)  # 该病害首次出现的帧
+    last_frame_index = db.Column(db.Integer, nullable=True)  # 该病害最后出现的帧
 
     def to_dict(self):
         return {
@@ -136,6 +140,9 @@ class AlertFrame(db.Model):
             'disease_type': self.disease_type,
             'confidence': self.confidence,
             'image_path': self.image_path,
+            'track_id': self.track_id,
+            'first_frame_index': self.first_frame_index,
+            'last_frame_index': self.last_frame_index,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
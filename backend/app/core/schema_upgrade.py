@@ -0,0 +1,39 @@
+# backend/app/core/schema_upgrade.py
+"""
+启动时的表结构补齐
+db.create_all() 只创建不存在的表，不会给已存在的表添加新列；模型新增列（如 AlertFrame 的跨帧跟踪字段）后，
+旧库上的插入、查询会因 unknown column 失败。本模块对比模型与数据库中的实际列，
+对缺失的可空列执行 ALTER TABLE ... ADD COLUMN；非空且无默认值的列无法自动补齐，只记录错误，需要手动迁移。
+"""
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def add_missing_columns(db) -> List[str]:
+    """补齐所有已存在表中缺失的可空列，返回新增的 '表.列' 列表（需要应用上下文）。"""
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # 新表由 create_all 创建
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if not column.nullable and column.server_default is None:
+                logger.error(f"表 {table.name} 缺少非空列 {column.name}，无法自动添加，请手动迁移")
+                continue
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {engine.dialect.identifier_preparer.quote(table.name)} ADD COLUMN {ddl}"))
+            added.append(f"{table.name}.{column.name}")
+            logger.info(f"已为表 {table.name} 添加列: {ddl}")
+    return added
@@ -1,10 +1,11 @@
 # backend/app/main.py
-from flask import Flask, request, g,send_from_directory
+from flask import Flask, request, g,send_from_directory, Response, jsonify
 from flask_restx import Api
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 
 import os
+import time
 
 
 # 添加上级目录到 Python 路径中，以便导入其他模块
@@ -16,6 +17,7 @@ from app.app_config import DevelopmentConfig, ProductionConfig
 from app.utils.logger import setup_logging, get_logger
 from app.extensions import db
 from app.core.models import User  # 确保模型在 db.create_all 前被导入
+from app.core.schema_upgrade import add_missing_columns
 
 # 导入 Flask-SocketIO
 from flask_socketio import SocketIO, emit
@@ -25,15 +27,25 @@ from .services.face_service import FaceRecognitionService
 
 # 导入告警模块
 from .services.alert_service import create_alert_video, save_alert_frame, update_alert_video_frame_count
+from .services.alert_writer import init_alert_writer
+from .services.quality_controller import face_quality_controller
 
 # 导入JWT相关
 import jwt
 from .core.security import SECRET_KEY
 
-from app.services.liveness_service import liveness_check
-from app.services.pavement_service import set_global_model
-from ultralytics import YOLO
+from app.services.liveness_service import (liveness_check, set_decode_min_side as set_liveness_decode_min_side,
+                                           load_models as load_liveness_models)
+from app.services.model_registry import ModelRegistry, set_model_registry
+from app.services.dlib_models import load_shared_models as load_shared_dlib_models
+from app.services.pavement_service import (set_global_model, set_annotation_renderer, set_tiling_policy, TilingPolicy,
+                                           set_decode_min_side, id2label)
+from app.services.annotation_renderer import AnnotationRenderer
+from app.services.pavement_backends import load_pavement_model_with_backend
 from app.core.models import User
+from app.utils.result_cache import configure_result_caches
+from app.utils.metrics import (render_metrics, instrument_sqlalchemy, CONTENT_TYPE, HTTP_REQUESTS, HTTP_LATENCY,
+                               SOCKET_EVENTS, MODEL_LOAD_SECONDS, MODEL_WARMUP_SECONDS)
 # 根据环境变量选择配置
 env = os.environ.get('FLASK_ENV', 'development')
 if env == 'production':
@@ -67,6 +79,7 @@ CORS(
 )
 
 db.init_app(app)
+instrument_sqlalchemy()  # 记录所有数据库提交的耗时
 
 # 初始化 SocketIO
 socketio = SocketIO(app,
@@ -80,37 +93,101 @@ setup_logging(app)
 # 获取一个应用级别的日志器
 app_logger = get_logger(__name__)
 
+# 启动告警异步写入线程（检测线程只入队，写盘与数据库提交在后台批量完成，退出时自动刷新）
+init_alert_writer(app,
+                  max_queue=app.config.get('ALERT_WRITER_QUEUE_SIZE', 256),
+                  batch_size=app.config.get('ALERT_WRITER_BATCH_SIZE', 32),
+                  flush_interval=app.config.get('ALERT_WRITER_FLUSH_INTERVAL', 0.5))
+
+# 推理结果缓存（重复上传的相同图片直接返回上次结果）
+configure_result_caches(max_entries=app.config.get('RESULT_CACHE_MAX_ENTRIES', 512),
+                        max_bytes=app.config.get('RESULT_CACHE_MAX_MB', 64) * 1024 * 1024,
+                        ttl=app.config.get('RESULT_CACHE_TTL', 600))
+
 # --- 初始化人脸识别服务 ---
 # 将 app.config 传递给服务，以便服务可以获取路径或其他配置
 face_recognition_service = FaceRecognitionService(app.config)
 
-# 初始化路面病害检测模型（全局只加载一次）
-try:
-    model_path = 'data/weights/road_damage.pt'
-    pavement_model = YOLO(model_path)
-    set_global_model(pavement_model)
-    app_logger.info("路面病害检测模型YOLO已全局加载")
-    # ----------- 模型预热 -------------
-    import numpy as np
-    dummy_img = np.zeros((640, 640, 3), dtype=np.uint8)
-    _ = pavement_model(dummy_img)
-    app_logger.info("YOLO模型预热完成")
-    # ----------------------------------
-except Exception as e:
-    set_global_model(None)
-    app_logger.error(f"路面病害检测模型加载失败: {e}")
+# 初始化路面病害标注渲染器（字体与类别标签字形只加载一次）
+set_annotation_renderer(AnnotationRenderer(
+    font_path='data/SimHei.ttf',
+    codec=app.config.get('PAVEMENT_ANNOTATION_CODEC', 'jpeg'),
+    quality=app.config.get('PAVEMENT_ANNOTATION_QUALITY', 80),
+    labels=id2label.values()
+))
+
+# 高分辨率路面图像的切片推理策略（auto 模式下仅对长边超过阈值的图像切片）
+set_tiling_policy(TilingPolicy(
+    mode=app.config.get('PAVEMENT_TILING_MODE', 'auto'),
+    min_side=app.config.get('PAVEMENT_TILING_MIN_SIDE', 2560),
+    tile_size=app.config.get('PAVEMENT_TILE_SIZE', 1280),
+    overlap=app.config.get('PAVEMENT_TILE_OVERLAP', 0.2)
+))
+
+# JPEG 帧按推理所需尺寸降分辨率解码（检测坐标会还原到原图）
+set_decode_min_side(app.config.get('PAVEMENT_DECODE_MIN_SIDE', 640))
+set_liveness_decode_min_side(app.config.get('FACE_DECODE_MIN_SIDE', 960))
 
 # 将服务设置为Flask应用的属性，以便在其他模块中访问
 app.face_recognition_service = face_recognition_service
 
-# 在应用上下文启动时初始化 Dlib 模型和人脸数据库
-# 确保在 WSGI 服务器启动前完成初始化
-with app.app_context():
+
+def load_pavement_subsystem():
+    """加载路面病害检测模型（全局只加载一次）并预热，返回加载与预热耗时。"""
     try:
-        face_recognition_service.initialize_models()
-        app_logger.info("人脸识别服务初始化完成")
+        model_path = 'data/weights/road_damage.pt'
+        requested_backend = app.config.get('PAVEMENT_BACKEND', 'torch')
+        load_start = time.perf_counter()
+        pavement_model, active_backend = load_pavement_model_with_backend(
+            model_path, backend=requested_backend, calibration_dir=app.config.get('PAVEMENT_INT8_CALIBRATION_DIR'))
+        load_seconds = time.perf_counter() - load_start
+        MODEL_LOAD_SECONDS.set(load_seconds, model='pavement')
+        if active_backend != requested_backend.lower():
+            app_logger.warning(f"路面病害检测模型配置的后端 {requested_backend} 不可用，实际使用 {active_backend}")
+        app_logger.info(f"路面病害检测模型YOLO已全局加载（后端: {active_backend}）")
+        # ----------- 模型预热 -------------
+        import numpy as np
+        warmup_start = time.perf_counter()
+        dummy_img = np.zeros((640, 640, 3), dtype=np.uint8)
+        _ = pavement_model(dummy_img, verbose=False)
+        warmup_seconds = time.perf_counter() - warmup_start
+        MODEL_WARMUP_SECONDS.set(warmup_seconds, model='pavement')
+        app_logger.info(f"YOLO模型预热完成（加载 {load_seconds:.2f}s，预热 {warmup_seconds:.2f}s）")
+        # ----------------------------------
+        set_global_model(pavement_model)
+        # 实际后端与回退情况在 /ready 中可见
+        return {'load_seconds': round(load_seconds, 3), 'warmup_seconds': round(warmup_seconds, 3),
+                'backend': active_backend, 'requested_backend': requested_backend,
+                'backend_fallback': active_backend != requested_backend.lower()}
     except Exception as e:
-        app_logger.error(f"人脸识别服务初始化失败: {e}", exc_info=True)
+        set_global_model(None)
+        app_logger.error(f"路面病害检测模型加载失败: {e}")
+        raise
+
+
+def load_face_gallery_subsystem():
+    """读取人脸库（读取数据库需要应用上下文）。"""
+    with app.app_context():
+        result = face_recognition_service.load_face_gallery()
+    app_logger.info("人脸识别服务初始化完成")
+    return result
+
+
+# 各模型子系统按 STARTUP_MODE 加载：eager 启动时全部加载；background 后台加载；lazy 首次使用时加载。
+# eager / background 下互不依赖的模型在线程池中并行加载；dlib 检测器与特征点模型由人脸识别和活体检测共享
+model_registry = ModelRegistry(mode=app.config.get('STARTUP_MODE', 'eager'),
+                               wait_timeout=app.config.get('MODEL_WAIT_TIMEOUT', 60),
+                               max_workers=app.config.get('MODEL_LOADER_THREADS', 4))
+model_registry.register('pavement', load_pavement_subsystem)
+model_registry.register('dlib_shared', load_shared_dlib_models)
+model_registry.register('face', face_recognition_service.load_dlib_models, depends=('dlib_shared',))
+model_registry.register('face_gallery', load_face_gallery_subsystem)
+# DeepFake 检测与活体检测是附加能力：加载失败时降级运行，不影响 /ready
+model_registry.register('deepfake', face_recognition_service.load_deepfake_model, required=False)
+model_registry.register('liveness', load_liveness_models, depends=('dlib_shared',), required=False)
+set_model_registry(model_registry)
+app.model_registry = model_registry
+model_registry.start()
 
 # 测试日志写入
 app_logger.info("测试日志写入：如果你看到这条日志，说明日志文件写入正常！")
@@ -140,13 +217,14 @@ api.add_namespace(logging_alerts_ns)  # 注册日志告警命名空间
 api.add_namespace(user_ns)  # 注册用户管理命名空间
 
 # 获取路面检测的Socket.IO处理器
-pavement_handlers = get_pavement_socketio_handlers()
+pavement_handlers = get_pavement_socketio_handlers(socketio)
 
 # --- SocketIO 事件处理 ---
 @socketio.on('connect')
 def handle_connect():
     # app_logger.info("SocketIO 客户端连接")
     sid = request.sid
+    SOCKET_EVENTS.inc(event='connect')
     app_logger.info(f"SocketIO 客户端连接: {sid}")
     #client_recogn ition_status[sid] = True  # 新连接默认允许识别
 
@@ -154,14 +232,24 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     sid = request.sid
+    SOCKET_EVENTS.inc(event='disconnect')
     app_logger.info(f"SocketIO 客户端断开连接: {sid}")
     client_recognition_status.pop(sid, None)  # 断开时清理状态
+    face_quality_controllers.pop(sid, None)
+    pavement_handlers['disconnect'](sid)  # 释放该客户端的路面检测会话
 
 
 import time
 from collections import defaultdict, deque
 
 recent_results = defaultdict(lambda: deque())
+face_quality_controllers = {}  # sid -> 人脸识别实时流的自适应画质控制器
+
+
+def _get_face_quality(sid):
+    if sid not in face_quality_controllers:
+        face_quality_controllers[sid] = face_quality_controller(app.config.get('STREAM_TARGET_LATENCY_MS', 200))
+    return face_quality_controllers[sid]
 first_frame_processed = defaultdict(lambda: False)  # 用于标记每个客户端的首帧是否已处理
 video_id_map = {}
 
@@ -174,6 +262,7 @@ def handle_face_recognition(data):
     from datetime import datetime
     from pathlib import Path
     sid = request.sid
+    SOCKET_EVENTS.inc(event='face_recognition')
     # 判断该客户端是否允许继续识别
     if not client_recognition_status.get(sid, True):
         # 已标记停止识别，忽略该客户端请求
@@ -182,14 +271,17 @@ def handle_face_recognition(data):
 
     app_logger.info("收到人脸识别请求")
     try:
-        base64_image = data.get('image', '')
+        image_data = data.get('image')  # Base64 字符串或二进制附件
         req_id = data.get('req_id')  # 获取前端发送的 req_id
-        if not base64_image:
+        if not image_data:
             # 没有图像数据，直接返回错误
             emit('face_result', {'success': False, 'message': '没有图像数据', 'req_id': req_id})
             return
-        # 调用人脸识别服务进行处理
-        recognition_results = face_recognition_service.recognize_face(base64_image)
+        # 调用人脸识别服务进行处理（按该客户端当前画质档位决定解码尺寸）
+        start = time.perf_counter()
+        quality = _get_face_quality(sid)
+        decode_min_side = quality.settings['decode_min_side'] if quality is not None else None
+        recognition_results = face_recognition_service.recognize_face(image_data, decode_min_side=decode_min_side)
         if not recognition_results or not isinstance(recognition_results,list):
             # 识别结果异常，直接返回
             emit('face_result', {'success': False, 'message': '识别失败', 'req_id': req_id})
@@ -214,6 +306,9 @@ def handle_face_recognition(data):
             "faces": recognition_results,
             "req_id": req_id
         })
+        if quality is not None and quality.observe((time.perf_counter() - start) * 1000):
+            # 首次识别或画质档位变化时，告知客户端建议的采集分辨率、JPEG 质量与提交间隔
+            emit('stream_control', quality.control_payload())
     except Exception as e:
         app_logger.error(f"人脸识别处理错误: {e}", exc_info=True)
         emit('face_result', {"success": False, "message": str(e), 'req_id': data.get('req_id')})
@@ -229,6 +324,7 @@ client_recognition_status = {}
 @socketio.on('face_recognition_end')
 def handle_face_recognition_end(data):
     sid = request.sid
+    SOCKET_EVENTS.inc(event='face_recognition_end')
     app_logger.info(f"收到客户端 {sid} 的识别结束信号: {data}")
     client_recognition_status[sid] = False  # 标记该客户端停止识别
 
@@ -237,6 +333,7 @@ def handle_face_recognition_end(data):
 @socketio.on('video_frame')
 def handle_video_frame(data):
     """处理路面检测视频帧"""
+    SOCKET_EVENTS.inc(event='video_frame')
     app_logger.info("收到路面检测视频帧")
     pavement_handlers['video_frame'](data)
 
@@ -244,13 +341,22 @@ def handle_video_frame(data):
 @socketio.on('video_stream_end')
 def handle_video_stream_end(data):
     """处理视频流结束"""
+    SOCKET_EVENTS.inc(event='video_stream_end')
     app_logger.info("收到视频流结束信号")
     pavement_handlers['video_stream_end'](data)
 
 
+@socketio.on('video_stats')
+def handle_video_stats(data=None):
+    """查询当前路面检测会话的统计信息"""
+    SOCKET_EVENTS.inc(event='video_stats')
+    pavement_handlers['video_stats'](data)
+
+
 # --- Flask 路由和错误处理保持不变 ---
 @app.before_request
 def log_request_info():
+    g.request_start = time.perf_counter()
     if not request.path.startswith('/ws/'):  # 排除 WebSocket 请求的日志
         app_logger.info(f"请求 {request.method} {request.path} from {request.remote_addr}")
 
@@ -259,9 +365,28 @@ def log_request_info():
 def log_response_info(response):
     if not request.path.startswith('/ws/'):  # 排除 WebSocket 请求的日志
         app_logger.info(f"响应 {request.method} {request.path} with status {response.status_code}")
+    # 按路由模板而不是具体路径统计，避免指标标签无限增长
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=str(response.status_code))
+    start = g.get('request_start')
+    if start is not None:
+        HTTP_LATENCY.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
     return response
 
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus 指标导出"""
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+
+@app.route('/ready')
+def ready():
+    """就绪检查：报告各模型子系统的加载状态，必需的子系统就绪时返回 200，否则返回 503（lazy 模式下未加载的子系统不影响就绪）"""
+    status = model_registry.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
 @app.before_request
 def load_user_from_token():
     auth_header = request.headers.get('Authorization')
@@ -294,12 +419,17 @@ liveness_status = {}
 def handle_liveness_detection(data):
     from flask import request
     sid = request.sid
-    base64_image = data.get('image', '')
-    if not base64_image:
+    SOCKET_EVENTS.inc(event='liveness_detection')
+    image_data = data.get('image')  # Base64 字符串或二进制附件
+    if not image_data:
         emit('liveness_result', {'success': False, 'message': '没有图像数据'})
         return
 
-    progress, next_action, status_dict = liveness_check(base64_image, liveness_status.get(sid, {}))
+    try:
+        progress, next_action, status_dict = liveness_check(image_data, liveness_status.get(sid, {}))
+    except ValueError as e:
+        emit('liveness_result', {'success': False, 'message': str(e)})
+        return
     liveness_status[sid] = status_dict
 
     emit('liveness_result', {
@@ -338,6 +468,8 @@ if __name__ == '__main__':
         try:
             #db.drop_all()  # 清空数据库（仅在开发环境中使用）
             db.create_all()
+            # create_all 不会给已存在的表加列：补齐模型新增的列（如 alert_frames 的跟踪字段）
+            add_missing_columns(db)
             print("当前注册模型表：", db.metadata.tables.keys())
             app_logger.info("数据库连接成功，所有表已创建（或已存在）")
             create_admin_if_not_exists()
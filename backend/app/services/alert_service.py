@@ -1,14 +1,22 @@
 # backend/app/services/alert_service.py
 from pathlib import Path
-import base64
-import io
-from PIL import Image
 from datetime import datetime
 from app.extensions import db
 from app.core.models import AlertVideo, AlertFrame, FaceAlertFrame
+from app.utils.image_io import read_image_bytes
 
 # 还未设计人脸告警相关的模型
 
+def image_extension(data: bytes) -> str:
+    """按文件头判断标注图的编码格式，避免 webp/png 数据被存成 .jpg。"""
+    if data[:3] == b'\xff\xd8\xff':
+        return '.jpg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return '.png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    return '.jpg'
+
 def create_alert_video(db_type: str, video_name: str, save_dir: str, total_frames: int, alert_frame_count: int, user_id: int = None) -> int:
     if db_type == 'road':
         VideoModel = AlertVideo
@@ -26,7 +34,8 @@ def create_alert_video(db_type: str, video_name: str, save_dir: str, total_frame
     db.session.commit()
     return video.id
 
-def save_alert_frame(db_type: str, image_base64: str,confidence: float,video_id: int = 0, frame_index: int = 0,  disease_type: str = None,save_dir0: str = None) -> str:
+def save_alert_frame(db_type: str, image_base64: str,confidence: float,video_id: int = 0, frame_index: int = 0,  disease_type: str = None,save_dir0: str = None,
+                     track_id: int = None, first_frame_index: int = None, last_frame_index: int = None) -> str:
     if db_type == 'road':
         VideoModel = AlertVideo
         FrameModel = AlertFrame
@@ -37,8 +46,8 @@ def save_alert_frame(db_type: str, image_base64: str,confidence: float,video_id:
         
         save_dir = Path(video.save_dir)
         save_dir.mkdir(parents=True, exist_ok=True)
-        filename = f"frame_{frame_index:05d}.jpg"
-        save_path = save_dir / filename
+        # 跟踪模式下每个病害只保存一帧，文件名带上跟踪ID避免同帧多个病害互相覆盖
+        filename = f"frame_{frame_index:05d}" if track_id is None else f"frame_{frame_index:05d}_track_{track_id}"
 
     # 只有单帧检测调用这个
     elif db_type == 'face':
@@ -50,25 +59,19 @@ def save_alert_frame(db_type: str, image_base64: str,confidence: float,video_id:
         
         save_dir = Path(save_dir0)
         save_dir.mkdir(parents=True, exist_ok=True)  # 确保目录存在
-        save_path = save_dir / f"frame_00000.jpg"  # 动态生成文件名
+        filename = "frame_00000"
     else:
         raise ValueError(f"不支持的告警类型: {db_type}")
 
     # 保存图像
-    # 去掉 data:image/jpeg;base64, 这样的前缀（如果有的话）
-    if image_base64.startswith('data:image'):
-        image_base64 = image_base64.split(',', 1)[1]
-
-    # 解码 base64 字符串为字节数据
-    image_data = base64.b64decode(image_base64)
-
-    # 使用 Pillow 打开图像
-    image = Image.open(io.BytesIO(image_data))
-    # 如果是RGBA，先转为RGB
-    if image.mode == 'RGBA':
-        image = image.convert('RGB')
-    # 保存到本地
-    image.save(save_path)
+    # 兼容 data:image/jpeg;base64, 字符串、裸 base64 以及原始图像字节
+    image_data = read_image_bytes(image_base64)
+
+    # 标注图已是编码好的图像，直接写盘，不再解码重新编码
+    # 人脸告警查询接口按固定文件名 frame_00000.jpg 访问
+    ext = '.jpg' if db_type == 'face' else image_extension(image_data)
+    save_path = save_dir / f"{filename}{ext}"
+    save_path.write_bytes(image_data)
     print(f"图像已保存到：{save_path}")
 
     if db_type == 'road':
@@ -78,7 +81,10 @@ def save_alert_frame(db_type: str, image_base64: str,confidence: float,video_id:
         disease_type=disease_type or "未知",
         confidence=confidence,
         image_path=str(save_path),
-        created_at=datetime.utcnow()
+        created_at=datetime.utcnow(),
+        track_id=track_id,
+        first_frame_index=first_frame_index,
+        last_frame_index=last_frame_index
     )
     elif db_type == 'face':
         alert_frame = FrameModel(
@@ -0,0 +1,298 @@
+# backend/app/services/alert_writer.py
+"""
+告警异步持久化
+检测热路径只把告警帧放入有界队列即返回，由后台线程统一完成：
+- 标注图字节直接写盘（不再 base64 解码后用 PIL 重新编码）；
+- AlertFrame / FaceAlertFrame 按批 add_all，一批只提交一次；
+- 视频的帧数/告警数更新按 video_id 合并，只写入最新值。
+进程退出时（atexit）会把队列中剩余的告警全部落盘。
+"""
+import atexit
+import queue
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.extensions import db
+from app.core.models import AlertVideo, AlertFrame, FaceAlertFrame
+from app.utils.image_io import read_image_bytes
+from app.utils.logger import get_logger
+from app.utils.metrics import QUEUE_DEPTH
+from .alert_service import save_alert_frame, update_alert_video_frame_count, update_alert_video, image_extension
+
+logger = get_logger(__name__)
+
+# 队列中表示“请求立即刷新”的标记；flush() 另外放入 threading.Event，写完它之前的内容后置位
+_FLUSH = object()
+
+
+class AlertWriter:
+    """
+    后台告警写入线程。
+    max_queue：等待写入的告警帧上限，队列满时提交方阻塞（告警不丢弃）；
+    batch_size：每次提交最多写入的告警帧数；flush_interval：没有新告警时合并计数的最长等待时间（秒）。
+    """
+
+    def __init__(self, app, max_queue: int = 256, batch_size: int = 32, flush_interval: float = 0.5):
+        self._app = app
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._counts_lock = threading.Lock()
+        self._pending_counts: Dict[int, Dict] = {}
+        self._save_dirs: Dict[int, str] = {}
+        self._stopping = threading.Event()
+        self.written_frames = 0
+        self.failed_frames = 0
+        self.commits = 0
+        self._thread = threading.Thread(target=self._run, name='alert-writer', daemon=True)
+        self._thread.start()
+
+    # ---------------- 提交端（检测线程） ----------------
+
+    def submit_frame(self, db_type: str, image, confidence: float, video_id: int = 0, frame_index: int = 0,
+                     disease_type: str = None, save_dir0: str = None, track_id: int = None,
+                     first_frame_index: int = None, last_frame_index: int = None):
+        """登记一条告警帧，参数与 alert_service.save_alert_frame 一致。"""
+        if db_type not in ('road', 'face'):
+            raise ValueError(f"不支持的告警类型: {db_type}")
+        if db_type == 'face' and save_dir0 is None:
+            raise ValueError("face 类型必须提供有效的 save_dir0 参数")
+        task = {
+            'db_type': db_type, 'image': image, 'confidence': confidence, 'video_id': video_id,
+            'frame_index': frame_index, 'disease_type': disease_type, 'save_dir': save_dir0,
+            'track_id': track_id, 'first_frame_index': first_frame_index, 'last_frame_index': last_frame_index,
+            'created_at': datetime.utcnow(),
+        }
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            logger.warning("告警写入队列已满，等待后台写入...")
+            self._queue.put(task)
+
+    def update_counts(self, video_id: int, total_frames: int = None, alert_frame_count: int = None):
+        """登记视频的帧数/告警数，同一视频只保留最新值，随下一批告警一起提交。"""
+        with self._counts_lock:
+            counts = self._pending_counts.setdefault(video_id, {})
+            if total_frames is not None:
+                counts['total_frames'] = total_frames
+            if alert_frame_count is not None:
+                counts['alert_frame_count'] = alert_frame_count
+
+    def remember_save_dir(self, video_id: int, save_dir: str):
+        """登记视频的告警图目录，写入时无需再查询 AlertVideo。"""
+        self._save_dirs[video_id] = save_dir
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        等待调用前已提交的告警和计数全部处理完毕，返回是否在超时前完成。
+        队列先进先出：后台线程取到本次放入的 Event 时，之前的告警已在同一批或更早的批次中写入。
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = 10.0):
+        """停止后台线程，退出前写完剩余告警。"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._queue.put(_FLUSH)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"告警写入线程未能在 {timeout} 秒内退出，剩余 {self._queue.qsize()} 条告警未写入")
+        else:
+            logger.info(f"告警写入线程已退出，共写入 {self.written_frames} 条告警")
+
+    def stats(self) -> Dict:
+        return {
+            'queue_size': self._queue.qsize(),
+            'pending_videos': len(self._pending_counts),
+            'written_frames': self.written_frames,
+            'failed_frames': self.failed_frames,
+            'commits': self.commits,
+        }
+
+    def _has_pending_counts(self) -> bool:
+        with self._counts_lock:
+            return bool(self._pending_counts)
+
+    # ---------------- 后台线程 ----------------
+
+    def _collect_batch(self):
+        """取出至多 batch_size 条告警，遇到 flush() 的 Event 即截止，返回 (告警列表, 待置位的 Event 列表)。"""
+        batch, waiters = [], []
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return batch, waiters
+        while True:
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+                break
+            if item is not _FLUSH:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                break
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+        return batch, waiters
+
+    def _requeue_counts(self, counts: Dict[int, Dict]):
+        """提交失败时把取出的计数放回，已有更新的同一字段以较新的值为准。"""
+        with self._counts_lock:
+            for video_id, values in counts.items():
+                pending = self._pending_counts.setdefault(video_id, {})
+                for key, value in values.items():
+                    pending.setdefault(key, value)
+
+    def _run(self):
+        while True:
+            batch, waiters = self._collect_batch()
+            with self._counts_lock:
+                counts, self._pending_counts = self._pending_counts, {}
+            failed = False
+            if batch or counts:
+                try:
+                    with self._app.app_context():
+                        self._write(batch, counts)
+                except Exception as e:
+                    failed = True
+                    self.failed_frames += len(batch)
+                    self._requeue_counts(counts)
+                    logger.error(f"批量写入 {len(batch)} 条告警失败: {e}", exc_info=True)
+            for waiter in waiters:
+                waiter.set()
+            if self._stopping.is_set() and self._queue.empty() and (failed or not self._has_pending_counts()):
+                # 退出前提交仍失败时不再重试，避免 stop() 一直等待
+                return
+
+    def _resolve_save_dir(self, task: Dict) -> Optional[Path]:
+        if task['db_type'] == 'face':
+            return Path(task['save_dir'])
+        video_id = task['video_id']
+        save_dir = self._save_dirs.get(video_id)
+        if save_dir is None:
+            video = AlertVideo.query.get(video_id)
+            if not video:
+                return None
+            save_dir = self._save_dirs[video_id] = video.save_dir
+        return Path(save_dir)
+
+    def _write_image(self, task: Dict) -> Optional[str]:
+        save_dir = self._resolve_save_dir(task)
+        if save_dir is None:
+            logger.error(f"告警视频ID {task['video_id']} 不存在，丢弃该告警帧")
+            return None
+        data = read_image_bytes(task['image'])
+        ext = image_extension(data)
+        if task['db_type'] == 'face':
+            # 人脸告警查询接口按固定文件名 frame_00000.jpg 访问（浏览器按内容识别格式）
+            filename = "frame_00000.jpg"
+        elif task['track_id'] is None:
+            filename = f"frame_{task['frame_index']:05d}{ext}"
+        else:
+            # 跟踪模式下每个病害只保存一帧，文件名带上跟踪ID避免同帧多个病害互相覆盖
+            filename = f"frame_{task['frame_index']:05d}_track_{task['track_id']}{ext}"
+        save_dir.mkdir(parents=True, exist_ok=True)
+        save_path = save_dir / filename
+        save_path.write_bytes(data)
+        return str(save_path)
+
+    def _write(self, batch: List[Dict], counts: Dict[int, Dict]):
+        rows = []
+        for task in batch:
+            try:
+                save_path = self._write_image(task)
+            except Exception as e:
+                self.failed_frames += 1
+                logger.error(f"告警图写入失败: {e}", exc_info=True)
+                continue
+            if save_path is None:
+                self.failed_frames += 1
+                continue
+            if task['db_type'] == 'road':
+                rows.append(AlertFrame(
+                    video_id=task['video_id'],
+                    frame_index=task['frame_index'],
+                    disease_type=task['disease_type'] or "未知",
+                    confidence=task['confidence'],
+                    image_path=save_path,
+                    created_at=task['created_at'],
+                    track_id=task['track_id'],
+                    first_frame_index=task['first_frame_index'],
+                    last_frame_index=task['last_frame_index']
+                ))
+            else:
+                rows.append(FaceAlertFrame(
+                    alert_type=task['disease_type'] or "未知",
+                    confidence=task['confidence'],
+                    image_path=task['save_dir'],
+                    created_at=task['created_at']
+                ))
+
+        if rows:
+            db.session.add_all(rows)
+        for video_id, values in counts.items():
+            video = AlertVideo.query.get(video_id)
+            if not video:
+                logger.warning(f"告警视频ID {video_id} 不存在，忽略计数更新")
+                continue
+            for key, value in values.items():
+                setattr(video, key, value)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.commits += 1
+        self.written_frames += len(rows)
+
+
+_alert_writer: Optional[AlertWriter] = None
+
+
+def init_alert_writer(app, max_queue: int = 256, batch_size: int = 32, flush_interval: float = 0.5) -> AlertWriter:
+    """启动全局告警写入线程，并注册进程退出时的刷新。"""
+    global _alert_writer
+    if _alert_writer is None:
+        _alert_writer = AlertWriter(app, max_queue, batch_size, flush_interval)
+        atexit.register(_alert_writer.stop)
+        QUEUE_DEPTH.track(_alert_writer._queue.qsize, queue='alert_writer')
+    return _alert_writer
+
+
+def get_alert_writer() -> Optional[AlertWriter]:
+    return _alert_writer
+
+
+def enqueue_alert_frame(db_type: str, image, confidence: float, video_id: int = 0, frame_index: int = 0,
+                        disease_type: str = None, save_dir0: str = None, track_id: int = None,
+                        first_frame_index: int = None, last_frame_index: int = None):
+    """异步保存告警帧；未启动写入线程时（如离线脚本）退回同步的 save_alert_frame。"""
+    if _alert_writer is None:
+        save_alert_frame(db_type, image, confidence, video_id, frame_index, disease_type, save_dir0,
+                         track_id=track_id, first_frame_index=first_frame_index, last_frame_index=last_frame_index)
+        return
+    _alert_writer.submit_frame(db_type, image, confidence, video_id, frame_index, disease_type, save_dir0,
+                               track_id, first_frame_index, last_frame_index)
+
+
+def enqueue_video_counts(video_id: int, total_frames: int = None, alert_frame_count: int = None):
+    """异步更新告警视频的帧数/告警数；未启动写入线程时同步提交。"""
+    if _alert_writer is None:
+        if total_frames is None:
+            update_alert_video('road', video_id, alert_frame_count)
+        else:
+            update_alert_video_frame_count('road', video_id, total_frames, alert_frame_count)
+        return
+    _alert_writer.update_counts(video_id, total_frames, alert_frame_count)
+
+
+def register_video_dir(video_id: int, save_dir: str):
+    """新建告警视频后登记其目录，供写入线程直接使用。"""
+    if _alert_writer is not None:
+        _alert_writer.remember_save_dir(video_id, save_dir)
@@ -0,0 +1,126 @@
+# backend/app/services/annotation_renderer.py
+"""
+路面病害标注渲染器
+字体只加载一次，类别标签与置信度文字预渲染为灰度字形缓存；
+直接在解码后的 numpy 图像缓冲区上画框、贴字，并按配置的编码格式/质量编码输出。
+"""
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# 编码格式 -> (文件扩展名, MIME 类型)
+_CODECS = {
+    'jpeg': ('.jpg', 'image/jpeg'),
+    'webp': ('.webp', 'image/webp'),
+    'png': ('.png', 'image/png'),
+}
+
+
+class AnnotationRenderer:
+    def __init__(self, font_path: str = 'data/SimHei.ttf', font_size: int = 16,
+                 codec: str = 'jpeg', quality: int = 80, line_width: int = 2,
+                 labels: Iterable[str] = (), max_cached_glyphs: int = 1024):
+        codec = (codec or 'jpeg').lower()
+        if codec == 'jpg':
+            codec = 'jpeg'
+        if codec not in _CODECS:
+            raise ValueError(f"不支持的标注图编码格式: {codec}")
+        self.codec = codec
+        self.quality = int(quality)
+        self.line_width = max(1, int(line_width))
+        self.max_cached_glyphs = max_cached_glyphs
+
+        try:
+            self.font = ImageFont.truetype(str(Path(font_path)), font_size)
+        except Exception:
+            # 没有中文字体时退回 PIL 默认位图字体
+            self.font = ImageFont.load_default()
+
+        self._glyphs: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._glyph_lock = threading.Lock()
+        # 预渲染所有类别标签，运行时只需渲染变化的置信度文字
+        for label in labels:
+            self._glyph(label)
+
+    @property
+    def mime_type(self) -> str:
+        return _CODECS[self.codec][1]
+
+    def _glyph(self, text: str) -> np.ndarray:
+        """返回文字的灰度字形（0~255 的 alpha 掩码），按文字内容缓存。"""
+        with self._glyph_lock:
+            glyph = self._glyphs.get(text)
+            if glyph is not None:
+                self._glyphs.move_to_end(text)
+                return glyph
+
+        left, top, right, bottom = self.font.getbbox(text)
+        canvas = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+        ImageDraw.Draw(canvas).text((-left, -top), text, fill=255, font=self.font)
+        glyph = np.asarray(canvas, dtype=np.uint8)
+
+        with self._glyph_lock:
+            self._glyphs[text] = glyph
+            if len(self._glyphs) > self.max_cached_glyphs:
+                self._glyphs.popitem(last=False)
+        return glyph
+
+    @staticmethod
+    def _blit(image: np.ndarray, mask: np.ndarray, x: int, y: int, color: Tuple[int, int, int]):
+        """按 alpha 掩码把纯色文字混合到 image 的 (x, y) 处，自动裁剪越界部分。"""
+        h, w = image.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + mask.shape[1], w), min(y + mask.shape[0], h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        alpha = mask[y0 - y:y1 - y, x0 - x:x1 - x].astype(np.uint16)[..., None]
+        region = image[y0:y1, x0:x1].astype(np.uint16)
+        color_arr = np.asarray(color, dtype=np.uint16)
+        image[y0:y1, x0:x1] = ((region * (255 - alpha) + color_arr * alpha) // 255).astype(np.uint8)
+
+    def _rectangle(self, image: np.ndarray, bbox: List[float], color: Tuple[int, int, int]):
+        h, w = image.shape[:2]
+        lw = self.line_width
+        x1 = int(np.clip(round(bbox[0]), 0, w - 1))
+        y1 = int(np.clip(round(bbox[1]), 0, h - 1))
+        x2 = int(np.clip(round(bbox[2]), 0, w - 1))
+        y2 = int(np.clip(round(bbox[3]), 0, h - 1))
+        image[y1:min(y1 + lw, y2 + 1), x1:x2 + 1] = color
+        image[max(y2 - lw + 1, y1):y2 + 1, x1:x2 + 1] = color
+        image[y1:y2 + 1, x1:min(x1 + lw, x2 + 1)] = color
+        image[y1:y2 + 1, max(x2 - lw + 1, x1):x2 + 1] = color
+
+    def draw(self, image: np.ndarray, detections: List[Dict], label2color: Dict[str, Tuple[int, int, int]]) -> np.ndarray:
+        """在 RGB 图像缓冲区上原地绘制检测框和“类别 置信度”文字，返回同一个数组。"""
+        for det in detections:
+            bbox = det['bbox']
+            label = det['class']
+            color = label2color.get(label, (255, 0, 0))
+            self._rectangle(image, bbox, color)
+
+            label_glyph = self._glyph(label)
+            conf_glyph = self._glyph(f" {det['confidence']:.2f}")
+            x = int(bbox[0])
+            y = int(bbox[1] - 20) if bbox[1] - 20 > 0 else int(bbox[1] + 2)
+            self._blit(image, label_glyph, x, y, color)
+            self._blit(image, conf_glyph, x + label_glyph.shape[1], y + label_glyph.shape[0] - conf_glyph.shape[0], color)
+        return image
+
+    def encode(self, image: np.ndarray) -> bytes:
+        """将 RGB 图像按配置的格式和质量编码为字节。"""
+        ext = _CODECS[self.codec][0]
+        if self.codec == 'jpeg':
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        elif self.codec == 'webp':
+            params = [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        else:
+            params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+        ok, buffer = cv2.imencode(ext, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), params)
+        if not ok:
+            raise ValueError(f"标注图编码失败: {self.codec}")
+        return buffer.tobytes()
@@ -0,0 +1,68 @@
+# backend/app/services/dlib_models.py
+"""
+进程内共享的 dlib 模型
+人脸识别与活体检测使用同一个正脸检测器和同一个 68 点特征点模型（shape_predictor 约 100MB），
+只加载一次；两者的调用都是只读的，可在多个线程间共享。
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+import numpy as np
+
+from ..utils.logger import get_logger
+from ..utils.metrics import MODEL_LOAD_SECONDS, MODEL_WARMUP_SECONDS
+
+logger = get_logger(__name__)
+
+DLIB_DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'data_dlib'))
+PREDICTOR_PATH = os.path.join(DLIB_DATA_DIR, 'shape_predictor_68_face_landmarks.dat')
+
+_detector = None
+_predictor = None
+_lock = threading.Lock()
+
+
+def load_shared_models() -> Dict:
+    """加载共享的检测器与特征点模型（重复调用直接返回），并用空白图预热，返回加载/预热耗时。"""
+    global _detector, _predictor
+    with _lock:
+        if _detector is not None and _predictor is not None:
+            return {}
+        import dlib
+
+        if not os.path.exists(PREDICTOR_PATH):
+            logger.error(f"Dlib 模型文件未找到: {PREDICTOR_PATH}")
+            raise FileNotFoundError(f"Missing Dlib predictor: {PREDICTOR_PATH}")
+        start = time.perf_counter()
+        detector = dlib.get_frontal_face_detector()
+        predictor = dlib.shape_predictor(PREDICTOR_PATH)
+        load_seconds = time.perf_counter() - start
+        MODEL_LOAD_SECONDS.set(load_seconds, model='dlib_shared')
+
+        # 预热：首次调用会分配 HOG 金字塔缓冲区
+        start = time.perf_counter()
+        blank = np.zeros((240, 320), dtype=np.uint8)
+        detector(blank, 0)
+        predictor(blank, dlib.rectangle(100, 60, 220, 180))
+        warmup_seconds = time.perf_counter() - start
+        MODEL_WARMUP_SECONDS.set(warmup_seconds, model='dlib_shared')
+
+        _detector, _predictor = detector, predictor
+        logger.info(f"共享 Dlib 检测器与特征点模型加载完成（加载 {load_seconds:.2f}s，预热 {warmup_seconds:.2f}s）")
+        return {'load_seconds': round(load_seconds, 3), 'warmup_seconds': round(warmup_seconds, 3)}
+
+
+def get_detector():
+    """共享的正脸检测器，未加载时先加载。"""
+    if _detector is None:
+        load_shared_models()
+    return _detector
+
+
+def get_shape_predictor():
+    """共享的 68 点特征点模型，未加载时先加载。"""
+    if _predictor is None:
+        load_shared_models()
+    return _predictor
@@ -76,19 +76,27 @@ class FaceDatabaseService:
             解密后的128维特征向量，如果不存在则返回None
         """
         try:
-            record = FaceFeature.get_by_name(name)
-            if not record:
+            feature_vector = FaceDatabaseService.load_feature(name)
+            if feature_vector is None:
                 logger.warning(f"未找到 {name} 的人脸特征记录")
                 return None
-            
-            # 解密特征向量
-            feature_vector = aes_encryption.decrypt_feature_vector(record.feature_encrypted)
             logger.info(f"成功获取 {name} 的人脸特征")
             return feature_vector
             
         except Exception as e:
             logger.error(f"获取人脸特征失败: {e}", exc_info=True)
             return None
+
+    @staticmethod
+    def load_feature(name: str) -> Optional[np.ndarray]:
+        """
+        与 get_feature 相同，但只在数据库中确实没有该姓名时返回 None；
+        查询或解密失败时抛出异常，调用方可据此区分“已删除”与“暂时读取失败”。
+        """
+        record = FaceFeature.get_by_name(name)
+        if not record:
+            return None
+        return aes_encryption.decrypt_feature_vector(record.feature_encrypted)
     
     @staticmethod
     def get_all_features(user_id=None) -> List[Tuple[str, np.ndarray]]:
@@ -116,6 +124,24 @@ class FaceDatabaseService:
             logger.error(f"获取所有人脸特征失败: {e}", exc_info=True)
             return []
     
+    @staticmethod
+    def get_fingerprint() -> Optional[str]:
+        """
+        人脸特征表的轻量指纹：一次聚合查询（记录数、最大 ID、最近更新时间、照片总数），不读取、不解密特征。
+        注册（新增或更新平均特征）与删除都会改变指纹，用于判断人脸库快照是否过期；查询失败时返回 None。
+        """
+        try:
+            count, max_id, last_update, photos = db.session.query(
+                db.func.count(FaceFeature.id),
+                db.func.max(FaceFeature.id),
+                db.func.max(FaceFeature.updated_at),
+                db.func.sum(FaceFeature.feature_count),
+            ).one()
+            return f"{count}:{max_id or 0}:{last_update.isoformat() if last_update else ''}:{int(photos or 0)}"
+        except Exception as e:
+            logger.error(f"获取人脸特征表指纹失败: {e}", exc_info=True)
+            return None
+
     @staticmethod
     def delete_feature(name: str) -> bool:
         """
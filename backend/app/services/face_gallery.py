@@ -0,0 +1,152 @@
+# backend/app/services/face_gallery.py
+"""
+向量化的人脸库
+已知人脸的 128D 特征保存为一个连续的 (N, 128) float32 矩阵，并预先计算每行的平方范数；
+一帧中所有人脸与全部已知人脸的欧氏距离用一次矩阵乘法得到：
+    ||q - g||² = ||q||² + ||g||² - 2 q·g
+人脸库较大（数千人）时，识别耗时不再随人数线性增长的 Python 循环而增长。
+注册、删除人脸时按姓名增量插入 / 更新 / 删除（均摊 O(1)），不需要重新读取、解密整个数据库。
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FEATURE_DIM = 128
+
+
+class FaceGallery:
+    """
+    以姓名为键的人脸库：names[i] 对应矩阵第 i 行。
+    矩阵按容量倍增预留空间，删除时用末尾一行填补空位；读写通过同一把锁串行化，
+    查询在持锁期间完成整次矩阵运算并返回姓名，不会读到更新到一半的人脸库。
+    """
+
+    def __init__(self, names: Sequence[str] = (), features=None, copy: bool = True):
+        """copy=False 时直接接管可写的 float32 特征矩阵（如快照解密缓冲区），不再复制。"""
+        names = list(names)
+        if features is None or len(names) == 0:
+            names = []
+            matrix = np.empty((0, FEATURE_DIM), dtype=np.float32)
+        else:
+            matrix = np.array(features, dtype=np.float32, copy=copy or None).reshape(len(names), FEATURE_DIM)
+            if len(set(names)) != len(names):
+                # 重名时保留最后一条（与数据库中每个姓名一条平均特征的约定一致）
+                keep = dict(zip(names, range(len(names))))
+                names, matrix = list(keep), matrix[list(keep.values())]
+        self._names: List[str] = names
+        self._rows: Dict[str, int] = {name: i for i, name in enumerate(names)}
+        self._matrix = matrix
+        self._sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+        self._size = len(names)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[str, np.ndarray]]) -> 'FaceGallery':
+        """由 [(姓名, 特征向量)] 构建，如 FaceDatabaseService.get_all_features() 的返回值。"""
+        pairs = list(pairs)
+        if not pairs:
+            return cls()
+        names = [name for name, _ in pairs]
+        features = np.stack([np.asarray(feature, dtype=np.float32).reshape(FEATURE_DIM) for _, feature in pairs])
+        return cls(names, features)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rows
+
+    @property
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._names)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """当前特征矩阵的副本 (N, 128)。"""
+        with self._lock:
+            return self._matrix[:self._size].copy()
+
+    def snapshot(self) -> Tuple[List[str], np.ndarray]:
+        """同一时刻的 (姓名列表, 特征矩阵副本)。"""
+        with self._lock:
+            return list(self._names), self._matrix[:self._size].copy()
+
+    def get(self, name: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(name)
+            return None if row is None else self._matrix[row].copy()
+
+    def upsert(self, name: str, feature) -> bool:
+        """插入新姓名或覆盖已有姓名的特征，返回是否为新插入。"""
+        vector = np.asarray(feature, dtype=np.float32).reshape(FEATURE_DIM)
+        with self._lock:
+            row = self._rows.get(name)
+            inserted = row is None
+            if inserted:
+                if self._size == len(self._matrix):
+                    capacity = max(16, 2 * len(self._matrix))
+                    matrix = np.empty((capacity, FEATURE_DIM), dtype=np.float32)
+                    matrix[:self._size] = self._matrix[:self._size]
+                    sq_norms = np.empty(capacity, dtype=np.float32)
+                    sq_norms[:self._size] = self._sq_norms[:self._size]
+                    self._matrix, self._sq_norms = matrix, sq_norms
+                row = self._size
+                self._size += 1
+                self._names.append(name)
+                self._rows[name] = row
+            self._matrix[row] = vector
+            self._sq_norms[row] = float(vector @ vector)
+            return inserted
+
+    def remove(self, name: str) -> bool:
+        """删除姓名，末尾一行移到空位；返回是否存在该姓名。"""
+        with self._lock:
+            row = self._rows.pop(name, None)
+            if row is None:
+                return False
+            last = self._size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                moved = self._names[last]
+                self._names[row] = moved
+                self._rows[moved] = row
+            self._names.pop()
+            self._size -= 1
+            return True
+
+    def _distances_locked(self, queries: np.ndarray) -> np.ndarray:
+        matrix = self._matrix[:self._size]
+        q_norms = np.einsum('ij,ij->i', queries, queries)
+        sq = q_norms[:, None] + self._sq_norms[None, :self._size] - 2.0 * (queries @ matrix.T)
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def distances(self, queries: np.ndarray) -> np.ndarray:
+        """queries 为 (M, 128) 或 (128,)，返回 (M, N) 的欧氏距离矩阵（列顺序与 names 一致）。"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            return self._distances_locked(queries)
+
+    def match(self, queries: np.ndarray) -> List[Tuple[Optional[str], float]]:
+        """每个查询的最近已知人脸 [(姓名, 距离)]；人脸库为空时为 (None, inf)。"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            if self._size == 0:
+                return [(None, float('inf'))] * len(queries)
+            dists = self._distances_locked(queries)
+            idx = np.argmin(dists, axis=1)
+            return [(self._names[j], float(dists[i, j])) for i, j in enumerate(idx)]
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[Tuple[str, float]]:
+        """返回距离最近的 k 个身份 [(姓名, 距离)]，按距离升序。"""
+        query = np.atleast_2d(np.asarray(query, dtype=np.float32))
+        with self._lock:
+            if self._size == 0 or k <= 0:
+                return []
+            dists = self._distances_locked(query)[0]
+            k = min(int(k), self._size)
+            top = np.argpartition(dists, k - 1)[:k]
+            top = top[np.argsort(dists[top])]
+            return [(self._names[i], float(dists[i])) for i in top]
@@ -0,0 +1,294 @@
+# backend/app/services/face_index.py
+"""
+人脸库近似最近邻索引（IVF-Flat，纯 NumPy 实现）
+十万级以上的人脸库中，即使是矩阵化的暴力比对，每张人脸也要扫描全部特征。
+IVF（倒排文件）索引先用 k-means 把已知人脸特征划分为 nlist 个簇，查询时只比对离查询最近的 nprobe 个簇，
+扫描量约为人脸库的 nprobe / nlist；簇内保存原始特征（Flat），返回的距离与精确比对一致，只可能漏掉落在未探查簇中的近邻。
+- 支持按姓名增量插入 / 更新 / 删除（注册、删除人脸时无需重建索引）；
+- 可保存为 .npz 文件，重启时直接加载，避免重新训练；
+- 召回率与延迟可用 tools/face_index_eval.py 与精确比对对照测量。
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..utils.logger import get_logger
+from .face_gallery import FEATURE_DIM
+
+logger = get_logger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+
+def auto_nlist(size: int) -> int:
+    """按人脸库规模选择簇数（约 4·√N），至少 1 个。"""
+    return max(1, int(4 * np.sqrt(max(size, 1))))
+
+
+def _sq_distances(queries: np.ndarray, q_norms: np.ndarray, vectors: np.ndarray, v_norms: np.ndarray) -> np.ndarray:
+    return np.maximum(q_norms[:, None] + v_norms[None, :] - 2.0 * (queries @ vectors.T), 0.0)
+
+
+def kmeans(vectors: np.ndarray, k: int, iters: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd k-means，返回 (k, dim) 的簇中心；空簇重新取距离当前中心最远的样本。"""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    v_norms = np.einsum('ij,ij->i', vectors, vectors)
+    for _ in range(iters):
+        c_norms = np.einsum('ij,ij->i', centroids, centroids)
+        dists = _sq_distances(vectors, v_norms, centroids, c_norms)
+        assign = np.argmin(dists, axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            farthest = np.argsort(dists[np.arange(len(vectors)), assign])[::-1][:int(empty.sum())]
+            centroids[empty] = vectors[farthest]
+    return centroids
+
+
+class _InvertedList:
+    """一个簇内的特征：按容量倍增的连续数组，删除时用末尾元素填补空位（O(1)）。"""
+    __slots__ = ('vectors', 'sq_norms', 'names', 'size')
+
+    def __init__(self, dim: int):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.sq_norms = np.empty(0, dtype=np.float32)
+        self.names: List[str] = []
+        self.size = 0
+
+    def append(self, name: str, vector: np.ndarray) -> int:
+        if self.size == len(self.vectors):
+            capacity = max(8, 2 * len(self.vectors))
+            vectors = np.empty((capacity, self.vectors.shape[1]), dtype=np.float32)
+            vectors[:self.size] = self.vectors[:self.size]
+            sq_norms = np.empty(capacity, dtype=np.float32)
+            sq_norms[:self.size] = self.sq_norms[:self.size]
+            self.vectors, self.sq_norms = vectors, sq_norms
+        self.vectors[self.size] = vector
+        self.sq_norms[self.size] = float(vector @ vector)
+        self.names.append(name)
+        self.size += 1
+        return self.size - 1
+
+    def pop(self, slot: int) -> Optional[str]:
+        """删除 slot 处的元素，返回被移动到 slot 的末尾元素的姓名（没有移动时为 None）。"""
+        last = self.size - 1
+        moved = None
+        if slot != last:
+            self.vectors[slot] = self.vectors[last]
+            self.sq_norms[slot] = self.sq_norms[last]
+            self.names[slot] = self.names[last]
+            moved = self.names[slot]
+        self.names.pop()
+        self.size -= 1
+        return moved
+
+
+class IVFFlatIndex:
+    """
+    以姓名为键的 IVF-Flat 索引（与人脸库一致，每个姓名一条平均特征）。
+    nlist：簇数（0 表示训练时按规模自动选择）；nprobe：查询时探查的簇数，越大召回越高、越慢。
+    读写通过同一把锁串行化，单次查询只持锁扫描少量簇。
+    """
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, dim: int = FEATURE_DIM):
+        self.nlist = int(nlist)
+        self.nprobe = max(1, int(nprobe))
+        self.dim = dim
+        self.centroids: Optional[np.ndarray] = None
+        self.c_norms: Optional[np.ndarray] = None
+        self.trained_size = 0  # 训练时的人脸数，规模增长过多时应重新训练
+        self._lists: List[_InvertedList] = []
+        self._where: Dict[str, Tuple[int, int]] = {}  # 姓名 -> (簇编号, 簇内位置)
+        self._lock = threading.RLock()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._where
+
+    def needs_retrain(self, size: int, growth: float = 4.0) -> bool:
+        """未训练，或人脸库规模与训练时相差超过 growth 倍时，簇划分已不均衡，需要重新训练。"""
+        if not self.is_trained:
+            return True
+        base = max(self.trained_size, len(self.centroids))
+        return size > base * growth or size * growth < base
+
+    def train(self, vectors: np.ndarray, iters: int = 20, max_samples: int = 65536, seed: int = 0):
+        """用 k-means 训练簇中心（清空已有内容），样本过多时随机抽取 max_samples 个。"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) == 0:
+            raise ValueError("训练 IVF 索引需要至少一个特征向量")
+        nlist = min(self.nlist or auto_nlist(len(vectors)), len(vectors))
+        sample = vectors
+        if len(vectors) > max_samples:
+            sample = vectors[np.random.default_rng(seed).choice(len(vectors), max_samples, replace=False)]
+        centroids = kmeans(sample, nlist, iters=iters, seed=seed)
+        with self._lock:
+            self.centroids = centroids
+            self.c_norms = np.einsum('ij,ij->i', centroids, centroids)
+            self.trained_size = len(vectors)
+            self._lists = [_InvertedList(self.dim) for _ in range(len(centroids))]
+            self._where = {}
+
+    def build(self, names: Sequence[str], vectors: np.ndarray, **train_kwargs):
+        """训练并插入全部特征。"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        self.train(vectors, **train_kwargs)
+        self.add_many(names, vectors)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        v_norms = np.einsum('ij,ij->i', vectors, vectors)
+        return np.argmin(_sq_distances(vectors, v_norms, self.centroids, self.c_norms), axis=1)
+
+    def add_many(self, names: Sequence[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) == 0:
+            return
+        if not self.is_trained:
+            raise RuntimeError("IVF 索引尚未训练")
+        assign = self._assign(vectors)
+        with self._lock:
+            for name, vector, list_id in zip(names, vectors, assign):
+                self._remove_locked(name)
+                self._where[name] = (int(list_id), self._lists[list_id].append(name, vector))
+
+    def upsert(self, name: str, vector: np.ndarray):
+        """插入新的姓名，或更新已有姓名的特征（可能移动到另一个簇）。"""
+        self.add_many([name], np.asarray(vector, dtype=np.float32).reshape(1, self.dim))
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            return self._remove_locked(name)
+
+    def _remove_locked(self, name: str) -> bool:
+        location = self._where.pop(name, None)
+        if location is None:
+            return False
+        list_id, slot = location
+        moved = self._lists[list_id].pop(slot)
+        if moved is not None:
+            self._where[moved] = (list_id, slot)
+        return True
+
+    def sync(self, names: Sequence[str], vectors: np.ndarray) -> Tuple[int, int]:
+        """
+        与人脸库内容对齐：删除人脸库中已不存在的姓名，插入新姓名与特征发生变化的姓名。
+        返回 (插入/更新数, 删除数)；内容一致时不做任何修改。
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        wanted = dict(zip(names, range(len(names))))
+        with self._lock:
+            stale = [name for name in self._where if name not in wanted]
+            for name in stale:
+                self._remove_locked(name)
+            changed = []
+            for name, row in wanted.items():
+                location = self._where.get(name)
+                if location is None:
+                    changed.append(row)
+                    continue
+                list_id, slot = location
+                if not np.array_equal(self._lists[list_id].vectors[slot], vectors[row]):
+                    changed.append(row)
+            if changed:
+                self.add_many([names[row] for row in changed], vectors[changed])
+        return len(changed), len(stale)
+
+    def search_many(self, queries: np.ndarray, k: int = 1, nprobe: int = None) -> List[List[Tuple[str, float]]]:
+        """每个查询返回探查簇内距离最近的 k 个 [(姓名, 距离)]，按距离升序。"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if k <= 0 or not self.is_trained:
+            return [[] for _ in range(len(queries))]
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        q_norms = np.einsum('ij,ij->i', queries, queries)
+        results = []
+        with self._lock:
+            if not self._where:
+                return [[] for _ in range(len(queries))]
+            c_dists = _sq_distances(queries, q_norms, self.centroids, self.c_norms)
+            probes = np.argpartition(c_dists, nprobe - 1, axis=1)[:, :nprobe]
+            for query, q_norm, probe in zip(queries, q_norms, probes):
+                lists = [self._lists[list_id] for list_id in probe if self._lists[list_id].size]
+                if not lists:
+                    results.append([])
+                    continue
+                vectors = np.concatenate([lst.vectors[:lst.size] for lst in lists])
+                sq_norms = np.concatenate([lst.sq_norms[:lst.size] for lst in lists])
+                dists = np.sqrt(np.maximum(q_norm + sq_norms - 2.0 * (vectors @ query), 0.0))
+                top_k = min(k, len(dists))
+                top = np.argpartition(dists, top_k - 1)[:top_k]
+                top = top[np.argsort(dists[top])]
+                names = [name for lst in lists for name in lst.names]
+                results.append([(names[i], float(dists[i])) for i in top])
+        return results
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: int = None) -> List[Tuple[str, float]]:
+        """与 FaceGallery.search 相同的返回格式。"""
+        return self.search_many(query, k, nprobe)[0]
+
+    def items(self) -> Tuple[List[str], np.ndarray]:
+        """按簇顺序导出全部 (姓名列表, 特征矩阵)。"""
+        with self._lock:
+            names = [name for lst in self._lists for name in lst.names]
+            if not names:
+                return [], np.empty((0, self.dim), dtype=np.float32)
+            vectors = np.concatenate([lst.vectors[:lst.size] for lst in self._lists])
+        return names, vectors
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sizes = [lst.size for lst in self._lists]
+        return {
+            'size': len(self),
+            'nlist': len(sizes),
+            'nprobe': self.nprobe,
+            'trained_size': self.trained_size,
+            'max_list_size': max(sizes) if sizes else 0,
+            'empty_lists': sum(1 for s in sizes if s == 0),
+        }
+
+    def save(self, path: str):
+        """保存为 .npz（先写临时文件再替换，避免并发读取到半个文件）。"""
+        if not self.is_trained:
+            raise RuntimeError("IVF 索引尚未训练，无法保存")
+        names, vectors = self.items()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, version=np.int32(INDEX_FORMAT_VERSION), centroids=self.centroids,
+                 names=np.asarray(names, dtype=str), vectors=vectors,
+                 nprobe=np.int32(self.nprobe), trained_size=np.int64(self.trained_size))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = None) -> 'IVFFlatIndex':
+        """从 .npz 加载：恢复簇中心后重新分配特征（不需要重新训练）。"""
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != INDEX_FORMAT_VERSION:
+                raise ValueError(f"不支持的索引文件版本: {int(data['version'])}")
+            centroids = data['centroids'].astype(np.float32)
+            index = cls(nlist=len(centroids), nprobe=nprobe or int(data['nprobe']), dim=centroids.shape[1])
+            index.centroids = centroids
+            index.c_norms = np.einsum('ij,ij->i', centroids, centroids)
+            index.trained_size = int(data['trained_size'])
+            index._lists = [_InvertedList(index.dim) for _ in range(len(centroids))]
+            index.add_many(data['names'].tolist(), data['vectors'])
+        return index
+
+
+def build_index(names: Sequence[str], vectors: np.ndarray, nlist: int = 0, nprobe: int = 8) -> IVFFlatIndex:
+    index = IVFFlatIndex(nlist=nlist, nprobe=nprobe)
+    index.build(names, vectors)
+    return index
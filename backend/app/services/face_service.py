@@ -1,15 +1,23 @@
 # 人脸识别的核心业务逻辑
 
-import dlib
+# dlib 与 TensorFlow 导入较慢，只在加载模型时导入（见 load_dlib_models / load_deepfake_model）
 import numpy as np
 import cv2
 import os
-import pandas as pd
 import base64
 import json  # 用于处理 base64 解码和编码
 import logging
-import tensorflow as tf
 from .face_db_service import FaceDatabaseService
+from .face_gallery import FaceGallery
+from .face_index import IVFFlatIndex, build_index
+from .gallery_snapshot import SnapshotError, read_snapshot, write_snapshot
+from ..utils.image_io import decode_bgr, decode_bgr_reduced, read_image_bytes
+from ..utils.result_cache import get_result_cache
+from ..utils.metrics import STAGE_LATENCY, MODEL_LOAD_SECONDS, MODEL_WARMUP_SECONDS
+from .model_registry import ensure_model
+from . import dlib_models
+import time
+import threading
 # 获取日志器
 logger = logging.getLogger(__name__)
 # 告警
@@ -17,6 +25,41 @@ from .alert_service import save_alert_frame
 from datetime import datetime
 from pathlib import Path
 
+# 两个 128D 特征的欧氏距离小于该值时认为是同一个人（识别与注册查重共用）
+MATCH_THRESHOLD = 0.4
+
+
+class _CoalescingSaver:
+    """后台写盘：多次 schedule 合并为一次保存（使用最后一次传入的参数），同一时刻只有一个保存线程。"""
+
+    def __init__(self, name, save_fn):
+        self.name = name
+        self.save_fn = save_fn
+        self._lock = threading.Lock()
+        self._pending = None
+        self._thread = None
+
+    def schedule(self, *args):
+        with self._lock:
+            self._pending = args
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._pending is None:
+                    self._thread = None
+                    return
+                args, self._pending = self._pending, None
+            try:
+                self.save_fn(*args)
+            except Exception as e:
+                logger.error(f"{self.name} 保存失败: {e}", exc_info=True)
+
+
 class FaceRecognitionService:
     def __init__(self, app_config_data):
         self.app_config = app_config_data
@@ -24,71 +67,123 @@ class FaceRecognitionService:
         self.predictor = None
         self.face_reco_model = None
         self.deepfake_model = None
-        self.features_known_list = []
-        self.face_name_known_list = []
+        self.gallery = FaceGallery()  # 已知人脸库，(N,128) 特征矩阵，重新加载时整体替换
+        self.gallery_version = 0  # 人脸库每次重新加载时递增，作为识别结果缓存键的一部分
+        self.face_index = None  # 可选的 IVF 近似最近邻索引（FACE_ANN_INDEX=ivf 时与人脸库同步维护）
+        self._index_saver = _CoalescingSaver('face-index-save', self._save_index)
+        self.gallery_source = None  # 人脸库最近一次全量加载的来源：snapshot / database
+        self._snapshot_generation = 0
+        self._snapshot_saver = _CoalescingSaver('face-gallery-snapshot', self._save_gallery_snapshot)
+        self.result_cache = get_result_cache('face')
 
 
     def initialize_models(self):
+        """依次加载 Dlib 模型、人脸库与 DeepFake 模型，失败时记录错误并保持未加载状态（启动时由模型注册表并行加载）。"""
+        try:
+            self.load_dlib_models()
+            self.load_face_gallery()
+        except Exception as e:
+            if isinstance(e, FileNotFoundError):
+                logger.error(f"Dlib 或人脸数据库文件缺失: {e}")
+            else:
+                logger.error(f"初始化 FaceRecognitionService 失败: {e}", exc_info=True)
+        try:
+            self.load_deepfake_model()
+        except Exception as e:
+            logger.error(f"加载deepfake检测模型失败: {e}")
+
+    def load_dlib_models(self) -> dict:
+        """
+        加载 Dlib 人脸特征提取模型，检测器与特征点模型使用与活体检测共享的实例（见 dlib_models）。
+        失败时抛出异常；成功时返回加载与预热耗时。
+        """
+        import dlib
+
         logger.info("正在加载 Dlib 人脸识别模型...")
+        reco_model_path = os.path.join(dlib_models.DLIB_DATA_DIR, 'dlib_face_recognition_resnet_model_v1.dat')
         try:
-            dlib_data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'data_dlib')
-            features_csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data',
-                                             'features_all.csv')
-
-            # 检查 Dlib 模型文件是否存在
-            predictor_path = os.path.join(dlib_data_path, 'shape_predictor_68_face_landmarks.dat')
-            reco_model_path = os.path.join(dlib_data_path, 'dlib_face_recognition_resnet_model_v1.dat')
-            deepfake_model_path = os.path.join(dlib_data_path, 'xception_deepfake_image_5o.h5')
-            if not os.path.exists(predictor_path):
-                logger.error(f"Dlib 模型文件未找到: {predictor_path}")
-                raise FileNotFoundError(f"Missing Dlib predictor: {predictor_path}")
             if not os.path.exists(reco_model_path):
                 logger.error(f"Dlib 模型文件未找到: {reco_model_path}")
                 raise FileNotFoundError(f"Missing Dlib recognition model: {reco_model_path}")
 
-            self.detector = dlib.get_frontal_face_detector()
-            self.predictor = dlib.shape_predictor(predictor_path)
-            self.face_reco_model = dlib.face_recognition_model_v1(reco_model_path)
+            start = time.perf_counter()
+            face_reco_model = dlib.face_recognition_model_v1(reco_model_path)
+            load_seconds = time.perf_counter() - start
+            MODEL_LOAD_SECONDS.set(load_seconds, model='dlib')
+
+            # 预热：对空白人脸区域提取一次特征，完成 ResNet 的首次内存分配
+            start = time.perf_counter()
+            blank = np.zeros((150, 150, 3), dtype=np.uint8)
+            shape = dlib_models.get_shape_predictor()(blank, dlib.rectangle(0, 0, 149, 149))
+            face_reco_model.compute_face_descriptor(blank, shape)
+            warmup_seconds = time.perf_counter() - start
+            MODEL_WARMUP_SECONDS.set(warmup_seconds, model='dlib')
+
+            self.detector = dlib_models.get_detector()
+            self.predictor = dlib_models.get_shape_predictor()
+            self.face_reco_model = face_reco_model
             logger.info("Dlib 模型加载完成。")
-
-            self._load_face_database(features_csv_path)
-        except (FileNotFoundError, Exception) as e:
-            if isinstance(e, FileNotFoundError):
-                logger.error(f"Dlib 或人脸数据库文件缺失: {e}")
-            else:
-                logger.error(f"初始化 FaceRecognitionService 失败: {e}", exc_info=True)
-
+            return {'load_seconds': round(load_seconds, 3), 'warmup_seconds': round(warmup_seconds, 3)}
+        except Exception:
             self.detector = None
             self.predictor = None
             self.face_reco_model = None
-            self.features_known_list = []
-            self.face_name_known_list = []
-        try:
-            self.deepfake_model = tf.keras.models.load_model(deepfake_model_path)
-        except Exception as e:
-            logger.error(f"加载deepfake检测模型失败: {e}")
-            self.deepfake_model = None
+            raise
+
+    def load_face_gallery(self) -> dict:
+        """从数据库读取人脸库（需要应用上下文），返回已知人脸数量。"""
+        self._load_face_database()
+        return {'faces': len(self.gallery), 'source': self.gallery_source,
+                'ann_index': self.face_index.stats() if self.face_index is not None else None}
 
-    def register_face(self, name, base64_image_data, user_id=None):
+    def load_deepfake_model(self) -> dict:
+        """加载 Xception DeepFake 检测模型并预热，失败时抛出异常；成功时返回加载与预热耗时。"""
+        import tensorflow as tf
+
+        deepfake_model_path = os.path.join(dlib_models.DLIB_DATA_DIR, 'xception_deepfake_image_5o.h5')
+        self.deepfake_model = None
+        start = time.perf_counter()
+        model = tf.keras.models.load_model(deepfake_model_path)
+        load_seconds = time.perf_counter() - start
+        MODEL_LOAD_SECONDS.set(load_seconds, model='deepfake')
+
+        # 预热：首次 predict 会构建计算图，耗时远高于之后的调用
+        start = time.perf_counter()
+        model.predict(np.zeros((1, 224, 224, 3), dtype=np.float32), verbose=0)
+        warmup_seconds = time.perf_counter() - start
+        MODEL_WARMUP_SECONDS.set(warmup_seconds, model='deepfake')
+
+        self.deepfake_model = model
+        logger.info(f"DeepFake 检测模型加载完成（加载 {load_seconds:.2f}s，预热 {warmup_seconds:.2f}s）。")
+        return {'load_seconds': round(load_seconds, 3), 'warmup_seconds': round(warmup_seconds, 3)}
+
+    def _ensure_models(self, deepfake: bool = False) -> bool:
+        """按需加载（懒加载 / 后台加载模式），返回 Dlib 模型是否可用。"""
+        if not self.detector or not self.predictor or not self.face_reco_model:
+            ensure_model('face')
+        ensure_model('face_gallery')
+        if deepfake and self.deepfake_model is None:
+            ensure_model('deepfake')
+        return bool(self.detector and self.predictor and self.face_reco_model)
+
+    def register_face(self, name, image_data, user_id=None):
         """
         注册新的人脸到数据库
         Args:
             name: 人名
-            base64_image_data: Base64编码的图像数据
+            image_data: Base64编码的图像数据，或 JPEG/PNG 原始字节
             user_id: 用户ID
         Returns:
             注册结果字典
         """
 
-        if not self.detector or not self.predictor or not self.face_reco_model:
+        if not self._ensure_models():
             logger.error("Dlib 模型未加载。无法执行注册。")
             return {'success': False, 'message': 'Dlib models not loaded.'}
 
         try:
-            # 解析Base64图像
-            header, encoded_image = base64_image_data.split(',')
-            nparr = np.frombuffer(base64.b64decode(encoded_image), np.uint8)
-            img_np = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # 解析图像（Base64 或原始字节）
+            img_np = decode_bgr(image_data)
 
             if img_np is None:
                 return {'success': False, 'message': '无法解码图像数据'}
@@ -106,19 +201,12 @@ class FaceRecognitionService:
                 return {'success': False, 'message': '检测到多个人脸，请只包含一个人脸'}
 
             # 提取人脸特征
-            face = faces[0]
-            shape = self.predictor(img_rgb, face)
-            face_descriptor = self.face_reco_model.compute_face_descriptor(img_rgb, shape)
-            face_descriptor_np = np.array(face_descriptor)
-            #查重，是否已经存在同样的人脸
-            from .face_db_service import FaceDatabaseService
-            all_features = FaceDatabaseService.get_all_features()
+            face_descriptor_np = self._compute_descriptor(img_rgb, faces[0])
+            #查重，是否已经存在同样的人脸（与内存中的人脸库一次矩阵运算比对，取最近的已注册人脸）
             duplicate_name = None
-            for exist_name, exist_feature in all_features:
-                dist = np.linalg.norm(face_descriptor_np - exist_feature)
-                if dist < 0.4:  # 阈值可调整
-                    duplicate_name = exist_name
-                    break
+            nearest_name, nearest_dist = self._match(face_descriptor_np[None, :])[0]
+            if nearest_name is not None and nearest_dist < MATCH_THRESHOLD:  # 阈值可调整
+                duplicate_name = nearest_name
             if duplicate_name:
                 if duplicate_name == name:
                     # 允许注册，后续会走平均特征逻辑
@@ -141,8 +229,8 @@ class FaceRecognitionService:
             #success = FaceDatabaseService.save_feature(name, face_descriptor_np, user_id)
 
             if success:
-                # 重新加载人脸数据库
-                self.reload_face_database()
+                # 只读取该姓名的最新（平均后的）特征，增量更新人脸库
+                self.refresh_face(name)
                 logger.info(f"成功注册人脸: {name}")
                 return {
                     'success': True,
@@ -156,57 +244,232 @@ class FaceRecognitionService:
             logger.error(f"人脸注册失败: {e}", exc_info=True)
             return {'success': False, 'message': f'注册失败: {str(e)}'}
 
-    def _load_face_database(self, path_features_known_csv=None):
-
-        self.features_known_list = []
-        self.face_name_known_list = []
-        
+    def _load_face_database(self, path_features_known_csv=None, use_snapshot: bool = True):
         try:
-            # 从数据库服务获取所有特征
             from .face_db_service import FaceDatabaseService
-            features_data = FaceDatabaseService.get_all_features()
-            
-            for name, feature_vector in features_data:
-                self.face_name_known_list.append(name)
-                self.features_known_list.append(feature_vector.astype(np.float64))
-            
-            logger.info(f"从数据库加载人脸特征完成，已包含 {len(self.features_known_list)} 张已知人脸。")
-            
+            # 快照与数据库指纹一致时直接从加密快照加载（一次解密），否则回退到逐行读取数据库
+            fingerprint = FaceDatabaseService.get_fingerprint() if self._snapshot_enabled() else None
+            gallery = self._load_gallery_snapshot(fingerprint) if use_snapshot and fingerprint is not None else None
+            if gallery is not None:
+                self.gallery, self.gallery_source = gallery, 'snapshot'
+            else:
+                # 从数据库服务获取所有特征，组装为连续的特征矩阵后整体替换（识别线程始终读到完整的人脸库）
+                start = time.perf_counter()
+                features_data = FaceDatabaseService.get_all_features()
+                self.gallery, self.gallery_source = FaceGallery.from_pairs(features_data), 'database'
+                logger.info(f"从数据库加载人脸特征完成，已包含 {len(self.gallery)} 张已知人脸，"
+                            f"耗时 {time.perf_counter() - start:.2f}s。")
+                if fingerprint is not None:
+                    self._snapshot_saver.schedule(fingerprint)
+            self._refresh_index()
+
         except Exception as e:
             logger.error(f"从数据库加载人脸特征失败: {e}", exc_info=True)
-            self.features_known_list = []
-            self.face_name_known_list = []
+            self.gallery = FaceGallery()
+        finally:
+            self._on_gallery_changed()
     
     def reload_face_database(self):
         """
-        重新加载人脸数据库（无参数版本）
+        全量重新加载人脸数据库（读取并解密全部特征，仅用于显式重新同步，不使用快照），并重写快照
         """
-        self._load_face_database()
+        self._load_face_database(use_snapshot=False)
+        return len(self.gallery)
 
-    def _return_euclidean_distance(self, feature_1, feature_2):
+    def refresh_face(self, name: str):
         """
-        计算两个 128D 人脸特征之间的欧式距离。
+        注册、删除人脸后调用：只读取该姓名在数据库中的当前特征，增量插入 / 更新 / 删除人脸库与近似索引中的这一条。
+        数据库中确认没有该姓名时才从人脸库删除；读取失败时保留现有条目，不做任何修改。
         """
-        return np.linalg.norm(feature_1 - feature_2)
-
-    def recognize_face(self, base64_image_data):
+        from .face_db_service import FaceDatabaseService
+        try:
+            feature = FaceDatabaseService.load_feature(name)
+        except Exception as e:
+            logger.error(f"读取 {name} 的人脸特征失败，人脸库保持不变: {e}", exc_info=True)
+            return
+        index = self.face_index
+        if feature is not None:
+            self.gallery.upsert(name, feature)
+            if index is not None:
+                index.upsert(name, feature)
+        else:
+            self.gallery.remove(name)
+            if index is not None:
+                index.remove(name)
+        if index is None or index.needs_retrain(len(self.gallery)):
+            # 尚未建立索引或规模变化过大时重新训练（FACE_ANN_INDEX=off 时直接返回）
+            self._refresh_index()
+        else:
+            self._schedule_index_save()
+        if self._snapshot_enabled():
+            fingerprint = FaceDatabaseService.get_fingerprint()
+            if fingerprint is not None:
+                self._snapshot_saver.schedule(fingerprint)
+        self._on_gallery_changed()
+        logger.info(f"人脸库已增量更新 {name}（{'更新' if feature is not None else '删除'}），当前 {len(self.gallery)} 张已知人脸")
+
+    def _snapshot_enabled(self) -> bool:
+        return str(self.app_config.get('FACE_GALLERY_SNAPSHOT', 'on')).lower() != 'off'
+
+    def _load_gallery_snapshot(self, fingerprint: str):
+        """从加密快照加载人脸库；快照不存在、过期或校验失败时返回 None（由调用方回退到数据库）。"""
+        path = self.app_config.get('FACE_GALLERY_SNAPSHOT_PATH', 'data/face_gallery.snapshot')
+        start = time.perf_counter()
+        try:
+            names, matrix, header = read_snapshot(path, fingerprint)
+        except SnapshotError as e:
+            logger.info(f"人脸库快照不可用，从数据库加载: {e}")
+            return None
+        except Exception as e:
+            logger.warning(f"读取人脸库快照失败，从数据库加载: {e}", exc_info=True)
+            return None
+        self._snapshot_generation = int(header.get('generation', 0))
+        gallery = FaceGallery(names, matrix, copy=False)
+        logger.info(f"从加密快照加载人脸库完成（第 {self._snapshot_generation} 版），已包含 {len(gallery)} 张已知人脸，"
+                    f"耗时 {time.perf_counter() - start:.3f}s。")
+        return gallery
+
+    def _save_gallery_snapshot(self, fingerprint: str):
+        """把当前人脸库写入加密快照，记录写入时的数据库指纹（在后台保存线程中执行）。"""
+        path = self.app_config.get('FACE_GALLERY_SNAPSHOT_PATH', 'data/face_gallery.snapshot')
+        names, matrix = self.gallery.snapshot()
+        self._snapshot_generation += 1
+        write_snapshot(path, names, matrix, fingerprint, generation=self._snapshot_generation)
+        logger.info(f"人脸库加密快照已更新（第 {self._snapshot_generation} 版，{len(names)} 张人脸）: {path}")
+
+    def _on_gallery_changed(self):
+        # 人脸库变化后，之前缓存的识别结果全部失效
+        self.gallery_version += 1
+        self.result_cache.clear()
+
+    def _refresh_index(self):
+        """
+        使近似索引与人脸库一致：首次使用时从索引文件加载，规模变化过大时重新训练，
+        其余情况（全量重新同步）只增量插入 / 删除发生变化的姓名。
+        """
+        if str(self.app_config.get('FACE_ANN_INDEX', 'off')).lower() != 'ivf':
+            self.face_index = None
+            return
+        gallery = self.gallery
+        if len(gallery) == 0:
+            self.face_index = None
+            return
+        index = self.face_index
+        if index is None:
+            index = self._load_index_file()
+        names, matrix = gallery.snapshot()
+        if index is None or index.needs_retrain(len(names)):
+            start = time.perf_counter()
+            index = build_index(names, matrix, nlist=self.app_config.get('FACE_ANN_NLIST', 0),
+                                nprobe=self.app_config.get('FACE_ANN_NPROBE', 8))
+            logger.info(f"人脸库 IVF 索引训练完成: {index.stats()}，耗时 {time.perf_counter() - start:.2f}s")
+            changed = True
+        else:
+            added, removed = index.sync(names, matrix)
+            changed = bool(added or removed)
+            if changed:
+                logger.info(f"人脸库 IVF 索引增量更新: 插入/更新 {added}，删除 {removed}")
+        self.face_index = index
+        if changed:
+            self._schedule_index_save()
+
+    def _schedule_index_save(self):
+        """标记索引需要保存；由后台线程写盘，连续多次更新合并为一次保存。"""
+        self._index_saver.schedule()
+
+    def _load_index_file(self):
+        path = self.app_config.get('FACE_ANN_INDEX_PATH', 'data/face_index.npz')
+        if not os.path.exists(path):
+            return None
+        try:
+            index = IVFFlatIndex.load(path, nprobe=self.app_config.get('FACE_ANN_NPROBE', 8))
+            logger.info(f"已加载人脸库 IVF 索引文件 {path}: {index.stats()}")
+            return index
+        except Exception as e:
+            logger.warning(f"加载人脸库 IVF 索引文件失败，将重新训练: {e}")
+            return None
+
+    def _save_index(self):
+        index = self.face_index
+        if index is not None:
+            index.save(self.app_config.get('FACE_ANN_INDEX_PATH', 'data/face_index.npz'))
+
+    def _use_index(self) -> bool:
+        """人脸库达到 FACE_ANN_MIN_SIZE 时用近似索引，否则精确比对。"""
+        return self.face_index is not None and len(self.gallery) >= self.app_config.get('FACE_ANN_MIN_SIZE', 10000)
+
+    def _match(self, descriptors: np.ndarray):
+        """每个 (M,128) 特征的最近已知人脸，返回 [(姓名, 距离)]，没有已知人脸时为 (None, inf)。"""
+        if self._use_index():
+            return [hits[0] if hits else (None, float('inf'))
+                    for hits in self.face_index.search_many(descriptors, k=1)]
+        return self.gallery.match(descriptors)
+
+    def _compute_descriptor(self, img_rgb, rect) -> np.ndarray:
+        """提取人脸特征点并计算 128D 人脸特征（float32）。"""
+        shape = self.predictor(img_rgb, rect)
+        return np.asarray(self.face_reco_model.compute_face_descriptor(img_rgb, shape), dtype=np.float32)
+
+    def search_face(self, image_data, k: int = 5):
+        """
+        以图搜人：检测图像中最大的人脸，返回人脸库中距离最近的 k 个身份。
+        Returns:
+            {'success', 'bbox', 'matches': [{'name', 'distance', 'is_match'}]} 或 {'success': False, 'message'}
+        """
+        if not self._ensure_models():
+            return {'success': False, 'message': 'Dlib 模型未加载'}
+        img_np, (sx, sy) = decode_bgr_reduced(read_image_bytes(image_data),
+                                              self.app_config.get('FACE_DECODE_MIN_SIDE', 960))
+        if img_np is None:
+            return {'success': False, 'message': '无法解码图像数据'}
+        img_rgb = cv2.cvtColor(img_np, cv2.COLOR_BGR2RGB)
+        faces = self.detector(img_rgb, 0)
+        if len(faces) == 0:
+            return {'success': False, 'message': '未检测到人脸'}
+
+        face = max(faces, key=lambda r: r.width() * r.height())
+        descriptor = self._compute_descriptor(img_rgb, face)
+        with STAGE_LATENCY.time(pipeline='face', stage='search'):
+            matches = (self.face_index if self._use_index() else self.gallery).search(descriptor, k)
+        return {
+            'success': True,
+            'bbox': {"left": int(round(face.left() * sx)), "top": int(round(face.top() * sy)),
+                     "right": int(round(face.right() * sx)), "bottom": int(round(face.bottom() * sy))},
+            'gallery_size': len(self.gallery),
+            'matches': [{'name': name, 'distance': round(dist, 4), 'is_match': dist < MATCH_THRESHOLD}
+                        for name, dist in matches],
+        }
+
+    def recognize_face(self, image_data, decode_min_side: int = None):
         """
-        对 Base64 编码的图像数据进行人脸识别。
+        对图像数据进行人脸识别。
         Args:
-            base64_image_data: 前端发送的 Base64 图像字符串 (包含 'data:image/jpeg;base64,' 前缀)。
+            image_data: 前端发送的 Base64 图像字符串 (包含 'data:image/jpeg;base64,' 前缀)，或 JPEG/PNG 原始字节。
+            decode_min_side: 降分辨率解码的最小长边，None 时使用配置 FACE_DECODE_MIN_SIDE（实时流降档时传入更小的值）。
         Returns:
             一个包含识别结果的列表。
         """
-        if not self.detector or not self.predictor or not self.face_reco_model:
+        if not self._ensure_models(deepfake=True):
             logger.error("Dlib 模型未加载。无法执行识别。")
             return [{"status": "error", "message": "Dlib models not loaded."}]
 
         try:
-            header, encoded_image = base64_image_data.split(',')
-
-            # 解码 Base64 图像
-            nparr = np.frombuffer(base64.b64decode(encoded_image), np.uint8)
-            img_np = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # 同一张图片重复上传（前端重试）时直接返回缓存的识别结果
+            if decode_min_side is None:
+                decode_min_side = self.app_config.get('FACE_DECODE_MIN_SIDE', 960)
+            image_data = read_image_bytes(image_data)
+            cache_key = None
+            if self.result_cache.enabled:
+                cache_key = self.result_cache.make_key(image_data, self.gallery_version, decode_min_side,
+                                                       self.deepfake_model is not None)
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+            # 解码图像（Base64 或原始字节）
+            # 按保守的最小长边降分辨率解码，返回的人脸框再还原到原图坐标
+            with STAGE_LATENCY.time(pipeline='face', stage='decode'):
+                img_np, (sx, sy) = decode_bgr_reduced(image_data, decode_min_side)
 
             if img_np is None:
                 logger.warning("无法解码图像数据。")
@@ -215,62 +478,68 @@ class FaceRecognitionService:
             # 将 BGR 转换为 RGB
             img_rgb = cv2.cvtColor(img_np, cv2.COLOR_BGR2RGB)
 
-            faces = self.detector(img_rgb, 0)  # 0 代表不向上采样
+            with STAGE_LATENCY.time(pipeline='face', stage='detection'):
+                faces = self.detector(img_rgb, 0)  # 0 代表不向上采样
 
             recognition_results = []
             if len(faces) > 0:
+                # 第一遍：逐个人脸做 DeepFake 判断并提取 128D 特征
+                # DeepFake 模型是可选子系统，加载失败（None）时跳过判断，直接做人脸比对
+                candidates = []  # [(人脸序号, dlib 矩形, DeepFake 概率, 特征向量)]
                 for i, d in enumerate(faces):
                     #裁剪人脸区域
                     face_img = img_rgb[d.top():d.bottom(), d.left():d.right()]
                     if face_img.size == 0:
                         continue
-                    face_img_resized = cv2.resize(face_img, (224, 224))
-                    #送入deepfake监测模型
-                    face_img_processed =  tf.keras.applications.xception.preprocess_input(face_img_resized)
-                    pred = self.deepfake_model.predict(np.expand_dims(face_img_processed, axis=0))
-                    # 提取人脸特征点
-                    shape = self.predictor(img_rgb, d)
-                    # 提取 128D 人脸特征
-                    face_descriptor = self.face_reco_model.compute_face_descriptor(img_rgb, shape)
-                    face_descriptor_np = np.array(face_descriptor)  # 转换为 numpy 数组以便计算
-
+                    fake_prob = None
+                    if self.deepfake_model is not None:
+                        face_img_resized = cv2.resize(face_img, (224, 224))
+                        #送入deepfake监测模型
+                        # 等价于 tf.keras.applications.xception.preprocess_input：像素缩放到 [-1, 1]
+                        face_img_processed = face_img_resized.astype(np.float32) / 127.5 - 1.0
+                        with STAGE_LATENCY.time(pipeline='deepfake', stage='inference'):
+                            pred = self.deepfake_model.predict(np.expand_dims(face_img_processed, axis=0))
+                        fake_prob = float(pred[0][0]) if pred is not None else None
+                    descriptor = None
+                    if not (fake_prob is not None and fake_prob > 0.6):
+                        with STAGE_LATENCY.time(pipeline='face', stage='embedding'):
+                            # 提取人脸特征点与 128D 人脸特征
+                            descriptor = self._compute_descriptor(img_rgb, d)
+                    candidates.append((i, d, fake_prob, descriptor))
+
+                # 第二遍：所有非 DeepFake 人脸与整个人脸库一次矩阵运算完成比对（大人脸库走近似索引）
+                match_start = time.perf_counter()
+                real = [c for c in candidates if c[3] is not None]
+                nearest = {}
+                if real:
+                    matches = self._match(np.stack([c[3] for c in real]))
+                    nearest = {c[0]: match for c, match in zip(real, matches) if match[0] is not None}
+                    STAGE_LATENCY.observe(time.perf_counter() - match_start, pipeline='face', stage='match')
+
+                for i, d, fake_prob, descriptor in candidates:
                     min_dist = float('inf')
                     recognized_name = "陌生人"
-                    confidence = 0.0
-
-                    # 先进行DeepFake检测
-                    fake_prob = float(pred[0][0]) if pred is not None else None
-                    is_deepfake = fake_prob is not None and fake_prob > 0.6
-                    
-                    if is_deepfake:
+                    if descriptor is None:
                         # 如果是DeepFake，直接返回deepfake身份
                         recognized_name = "deepfake"
                         confidence = fake_prob if fake_prob is not None else 1.0
                         logger.warning(f"!!! DeepFake警告: 概率: {fake_prob:.4f}，位置: {d.left()},{d.top()},{d.right()},{d.bottom()}")
-
+                    elif i in nearest:
+                        nearest_name, min_dist = nearest[i]
+                        if min_dist < MATCH_THRESHOLD:  # 小于这个距离认为是同一个人
+                            recognized_name = nearest_name
+                        confidence = round(min_dist, 3)
                     else:
-                        # 如果不是DeepFake，进行正常的人脸识别
-                        # 遍历已知人脸库进行比对
-                        if self.features_known_list:
-                            for j, known_feature in enumerate(self.features_known_list):
-                                dist = self._return_euclidean_distance(face_descriptor_np, known_feature)
-                                if dist < min_dist:
-                                    min_dist = dist
-                                    if min_dist < 0.4:  # 设置一个阈值，小于这个距离认为是同一个人
-                                        recognized_name = self.face_name_known_list[j]
-                                    else:
-                                        recognized_name = "陌生人"
-                            confidence = round(min_dist, 3) if min_dist != float('inf') else None
-                        else:
-                            # 没有已知人脸
-                            confidence = 1.0
+                        # 没有已知人脸
+                        confidence = 1.0
 
                     recognition_results.append({
                         "face_id": i,
                         "name": recognized_name,
                         "distance": round(min_dist, 3) if min_dist != float('inf') else None,
                         "confidence": confidence,
-                        "bbox": {"left": d.left(), "top": d.top(), "right": d.right(), "bottom": d.bottom()}
+                        "bbox": {"left": int(round(d.left() * sx)), "top": int(round(d.top() * sy)),
+                                 "right": int(round(d.right() * sx)), "bottom": int(round(d.bottom() * sy))}
                     })
                     logger.info(
                         f"检测到人脸: {recognized_name} (距离: {min_dist:.3f}, 置信度: {confidence:.3f})"
@@ -280,6 +549,8 @@ class FaceRecognitionService:
                 logger.info("未检测到人脸。")
                 recognition_results.append({"name": "未检测到人脸", "status": "no_face", "confidence": None})
 
+            if cache_key is not None:
+                self.result_cache.put(cache_key, recognition_results)
             return recognition_results
 
         except Exception as e:
@@ -0,0 +1,130 @@
+# backend/app/services/gallery_snapshot.py
+"""
+加密的人脸库快照文件
+启动时从数据库逐行读取 FaceFeature、逐条 base64 解码并 AES 解密，耗时随人数和数据库往返次数线性增长。
+快照把整个人脸库（姓名与 (N,128) float32 特征矩阵）保存为一个 AES-CBC 加密文件：
+启动时用 mmap 映射文件，一次解密整个密文到预先分配的缓冲区，特征矩阵是该缓冲区上的零拷贝 float32 视图，无逐行处理。
+文件结构（小端）：
+    MAGIC(8) | 头部长度 uint32 | 头部 JSON | 密文 | HMAC-SHA256(32)
+头部为明文（格式版本、快照代数、数据库指纹、人数、维度、IV 等，不含姓名）；
+密文为 特征矩阵字节 + 姓名 JSON（零填充到 16 字节的倍数），HMAC 覆盖之前的全部内容。
+数据库指纹（见 FaceDatabaseService.get_fingerprint）与快照头部不一致时快照视为过期，由调用方回退到数据库加载。
+"""
+import hmac
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.crypto import aes_encryption
+from .face_gallery import FEATURE_DIM
+
+MAGIC = b'FGSNAP01'
+SNAPSHOT_FORMAT = 1
+_HEADER_LEN = struct.Struct('<I')
+_MAC_SIZE = 32
+_BLOCK = 16
+
+
+class SnapshotError(ValueError):
+    """快照不存在、已过期或无法校验 / 解密。"""
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b'\0' * (-len(data) % _BLOCK)
+
+
+def write_snapshot(path: str, names: List[str], matrix: np.ndarray, fingerprint: str,
+                   generation: int = 1, encryption=aes_encryption) -> Dict:
+    """加密写入快照（先写临时文件再替换），返回头部信息。"""
+    matrix = np.ascontiguousarray(np.asarray(matrix, dtype='<f4').reshape(len(names), FEATURE_DIM))
+    names_bytes = json.dumps(list(names), ensure_ascii=False).encode('utf-8')
+    plaintext = matrix.tobytes() + _pad(names_bytes)  # 特征矩阵每行 512 字节，本身是 16 的倍数
+    iv = os.urandom(_BLOCK)
+    ciphertext = encryption.new_cbc_cipher(iv).encrypt(plaintext)
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'generation': int(generation),
+        'created_at': time.time(),
+        'fingerprint': fingerprint,
+        'count': len(names),
+        'dim': FEATURE_DIM,
+        'names_bytes': len(names_bytes),
+        'iv': iv.hex(),
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    prefix = MAGIC + _HEADER_LEN.pack(len(header_bytes)) + header_bytes
+    mac = encryption.new_mac()
+    mac.update(prefix)
+    mac.update(ciphertext)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(prefix)
+        f.write(ciphertext)
+        f.write(mac.digest())
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_header(path: str) -> Dict:
+    """只读取明文头部（不解密），文件不存在或格式不符时抛出 SnapshotError。"""
+    if not os.path.exists(path):
+        raise SnapshotError(f"快照文件不存在: {path}")
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + _HEADER_LEN.size)
+        if len(prefix) < len(MAGIC) + _HEADER_LEN.size or not prefix.startswith(MAGIC):
+            raise SnapshotError("不是人脸库快照文件")
+        (header_len,) = _HEADER_LEN.unpack(prefix[len(MAGIC):])
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    if header.get('format') != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"不支持的快照格式版本: {header.get('format')}")
+    header['_offset'] = len(prefix) + header_len
+    return header
+
+
+def read_snapshot(path: str, fingerprint: Optional[str] = None,
+                  encryption=aes_encryption) -> Tuple[List[str], np.ndarray, Dict]:
+    """
+    读取并解密快照，返回 (姓名列表, (N,128) float32 特征矩阵, 头部)。
+    fingerprint 不为 None 且与快照记录的数据库指纹不一致时抛出 SnapshotError（快照已过期），不做解密。
+    返回的特征矩阵是解密缓冲区上的视图（可写，由调用方持有），不再逐行复制。
+    """
+    header = read_header(path)
+    if fingerprint is not None and header.get('fingerprint') != fingerprint:
+        raise SnapshotError(f"快照已过期（快照指纹 {header.get('fingerprint')}，数据库指纹 {fingerprint}）")
+    count, dim, names_len = int(header['count']), int(header['dim']), int(header['names_bytes'])
+    if dim != FEATURE_DIM:
+        raise SnapshotError(f"快照特征维度 {dim} 与 {FEATURE_DIM} 不符")
+    matrix_bytes = count * dim * 4
+    cipher_len = matrix_bytes + names_len + (-names_len % _BLOCK)
+    start = header['_offset']
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if len(mm) != start + cipher_len + _MAC_SIZE:
+            raise SnapshotError("快照文件长度与头部不符（文件不完整）")
+        # 所有 memoryview 切片都在 with 中显式释放，否则 mmap 关闭时会因仍有导出的指针而抛出 BufferError
+        with memoryview(mm) as view:
+            mac = encryption.new_mac()
+            with view[:start + cipher_len] as signed:
+                mac.update(signed)
+            with view[start + cipher_len:] as digest:
+                valid = hmac.compare_digest(mac.digest(), bytes(digest))
+            if not valid:
+                raise SnapshotError("快照校验失败（文件被修改或加密密钥不同）")
+            # pycryptodome 的 output 只接受 bytearray 或可写的 memoryview
+            buffer = np.empty(cipher_len, dtype=np.uint8)
+            with view[start:start + cipher_len] as ciphertext, memoryview(buffer) as output:
+                encryption.new_cbc_cipher(bytes.fromhex(header['iv'])).decrypt(ciphertext, output=output)
+
+    matrix = buffer[:matrix_bytes].view('<f4').reshape(count, dim)
+    names = json.loads(buffer[matrix_bytes:matrix_bytes + names_len].tobytes().decode('utf-8'))
+    if len(names) != count:
+        raise SnapshotError("快照姓名数与特征数不符")
+    return names, matrix, header
+
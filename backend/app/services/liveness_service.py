@@ -1,9 +1,9 @@
-import dlib
 import numpy as np
 import cv2
-import base64
-from scipy.spatial import distance as dist
-import os
+from ..utils.image_io import decode_bgr_reduced
+from ..utils.metrics import STAGE_LATENCY
+from .model_registry import ensure_model
+from . import dlib_models
 
 # 68点模型索引
 LEFT_EYE = list(range(42, 48))
@@ -13,17 +13,34 @@ NOSE = list(range(27, 36))
 JAW = list(range(0, 17))
 LEFT_EYEBROW = list(range(22, 27))
 
+# 与人脸识别共享同一个 dlib 检测器和特征点模型（见 dlib_models），在首次使用或启动时的 load_models 中绑定
+detector = None
+predictor = None
 
-CUR_DIR = os.path.dirname(os.path.abspath(__file__))
-predictor_path = os.path.abspath(os.path.join(CUR_DIR, '..', '..', 'data', 'data_dlib', 'shape_predictor_68_face_landmarks.dat'))
-detector = dlib.get_frontal_face_detector()
-predictor = dlib.shape_predictor(predictor_path)
+# 降分辨率解码的最小长边：人脸需要保留足够像素，取值比路面检测保守，0 表示按原分辨率解码
+_decode_min_side = 960
+
+
+def set_decode_min_side(min_side: int):
+    global _decode_min_side
+    _decode_min_side = int(min_side or 0)
+
+
+def load_models():
+    """绑定共享的 dlib 人脸检测器与 68 点特征点模型（尚未加载时由 dlib_models 加载一次）。"""
+    global detector, predictor
+    detector = dlib_models.get_detector()
+    predictor = dlib_models.get_shape_predictor()
+
+
+def _euclidean(a, b) -> float:
+    return float(np.linalg.norm(np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)))
 
 
 def eye_aspect_ratio(eye):
-    A = dist.euclidean(eye[1], eye[5])
-    B = dist.euclidean(eye[2], eye[4])
-    C = dist.euclidean(eye[0], eye[3])
+    A = _euclidean(eye[1], eye[5])
+    B = _euclidean(eye[2], eye[4])
+    C = _euclidean(eye[0], eye[3])
     return (A + B) / (2.0 * C)
 
 def mouth_aspect_ratio(mouth):
@@ -33,21 +50,21 @@ def mouth_aspect_ratio(mouth):
     return (A + B) / (2.0 * C)
 
 def nose_jaw_distance(nose, jaw):
-    face_left1 = dist.euclidean(nose[0], jaw[0])
-    face_right1 = dist.euclidean(nose[0], jaw[16])
-    face_left2 = dist.euclidean(nose[3], jaw[2])
-    face_right2 = dist.euclidean(nose[3], jaw[14])
+    face_left1 = _euclidean(nose[0], jaw[0])
+    face_right1 = _euclidean(nose[0], jaw[16])
+    face_left2 = _euclidean(nose[3], jaw[2])
+    face_right2 = _euclidean(nose[3], jaw[14])
     return (face_left1, face_right1, face_left2, face_right2)
 
 def eyebrow_jaw_distance(leftEyebrow, jaw):
-    eyebrow_left = dist.euclidean(leftEyebrow[2], jaw[0])
-    eyebrow_right = dist.euclidean(leftEyebrow[2], jaw[16])
-    left_right = dist.euclidean(jaw[0], jaw[16])
+    eyebrow_left = _euclidean(leftEyebrow[2], jaw[0])
+    eyebrow_right = _euclidean(leftEyebrow[2], jaw[16])
+    left_right = _euclidean(jaw[0], jaw[16])
     return (eyebrow_left, eyebrow_right, left_right)
 
 # 活体检测主函数
 
-def liveness_check(base64_image, status):
+def liveness_check(image_data, status):
     # 阈值
     EYE_AR_THRESH = 0.27
     EYE_AR_CONSEC_FRAMES = 2
@@ -64,16 +81,27 @@ def liveness_check(base64_image, status):
     nod_flag = status.get('nod_flag', 0)
     TOTAL_NOD = status.get('TOTAL_NOD', 0)
 
-    # 解码图片
-    header, encoded = base64_image.split(',')
-    nparr = np.frombuffer(base64.b64decode(encoded), np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if predictor is None and not ensure_model('liveness'):
+        # 未登记到模型注册表（如离线脚本）时直接加载
+        try:
+            load_models()
+        except Exception as e:
+            raise ValueError(f"活体检测模型加载失败: {e}")
+
+    # 解码图片（Base64 或原始字节）
+    with STAGE_LATENCY.time(pipeline='liveness', stage='decode'):
+        frame, (sx, sy) = decode_bgr_reduced(image_data, _decode_min_side)
+    if frame is None:
+        raise ValueError("无法解码图像数据")
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-    rects = detector(gray, 0)
+    with STAGE_LATENCY.time(pipeline='liveness', stage='detection'):
+        rects = detector(gray, 0)
     for rect in rects:
-        shape = predictor(gray, rect)
-        shape = np.array([[p.x, p.y] for p in shape.parts()])
+        with STAGE_LATENCY.time(pipeline='liveness', stage='landmarks'):
+            shape = predictor(gray, rect)
+        # 关键点还原到原图坐标，摇头/点头判断中的像素阈值不受解码缩放影响
+        shape = np.array([[p.x * sx, p.y * sy] for p in shape.parts()])
 
         leftEye = shape[LEFT_EYE]
         rightEye = shape[RIGHT_EYE]
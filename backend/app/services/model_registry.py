@@ -0,0 +1,204 @@
+# backend/app/services/model_registry.py
+"""
+模型子系统注册表
+路面检测（pavement）、人脸识别（face）、DeepFake 检测（deepfake）、活体检测（liveness）各自登记一个加载函数，
+按启动模式决定何时加载：
+- eager：启动时依次加载全部模型，加载完成后才开始服务（原有行为）；
+- background：启动后立即开始服务，模型在后台线程中加载；
+- lazy：某个子系统第一次被使用时才加载。
+eager / background 模式下互不依赖的子系统在加载线程池中并行加载，冷启动耗时取决于最慢的模型而不是所有模型之和；
+有依赖的子系统（如人脸识别依赖共享的 dlib 特征点模型）先加载其依赖。
+业务代码在使用模型前调用 ensure(name)：模型未加载时按需加载，正在后台加载时等待完成。
+各子系统的状态、加载与预热耗时由 /ready 接口对外报告。
+就绪判定只看必需的子系统（required=True）：eager / background 模式下需全部加载完成；
+lazy 模式下尚未使用（未加载）的子系统不影响就绪，只有加载失败才不就绪（否则探针永远不放流量，懒加载永远不会触发）。
+可选子系统（如 DeepFake 检测）加载失败时服务降级运行，记入 degraded，不影响就绪。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from ..utils.logger import get_logger
+from ..utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+STARTUP_EAGER = 'eager'
+STARTUP_BACKGROUND = 'background'
+STARTUP_LAZY = 'lazy'
+STARTUP_MODES = (STARTUP_EAGER, STARTUP_BACKGROUND, STARTUP_LAZY)
+
+STATUS_PENDING = 'pending'
+STATUS_LOADING = 'loading'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+_STATUS_CODES = {STATUS_PENDING: 0, STATUS_LOADING: 1, STATUS_READY: 2, STATUS_FAILED: -1}
+MODEL_STATUS = REGISTRY.gauge('model_status', '模型子系统状态（0 未加载 / 1 加载中 / 2 就绪 / -1 失败）', ('model',))
+
+
+class _Subsystem:
+    def __init__(self, name: str, loader: Callable[[], Optional[Dict]], depends: Sequence[str] = (),
+                 required: bool = True):
+        self.name = name
+        self.loader = loader
+        self.depends = tuple(depends)
+        self.required = required
+        self.status = STATUS_PENDING
+        self.error: Optional[str] = None
+        self.total_seconds: Optional[float] = None  # 本子系统加载与预热的总耗时（不含等待依赖的时间）
+        self.details: Dict = {}  # loader 返回的附加信息（如 load_seconds / warmup_seconds）
+        self.lock = threading.Lock()  # 串行化同一子系统的加载
+        self.done = threading.Event()
+
+
+class ModelRegistry:
+    """
+    loader 加载成功时正常返回（可返回耗时等附加信息的字典），失败时抛出异常（状态记为 failed，不会自动重试）。
+    wait_timeout：ensure() 等待后台加载完成的最长时间（秒）；max_workers：并行加载的线程数。
+    """
+
+    def __init__(self, mode: str = STARTUP_EAGER, wait_timeout: float = 60.0, max_workers: int = 4):
+        mode = (mode or STARTUP_EAGER).lower()
+        if mode not in STARTUP_MODES:
+            raise ValueError(f"不支持的启动模式: {mode}，可选: {', '.join(STARTUP_MODES)}")
+        self.mode = mode
+        self.wait_timeout = wait_timeout
+        self.max_workers = max(1, int(max_workers))
+        self._subsystems: Dict[str, _Subsystem] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def register(self, name: str, loader: Callable[[], Optional[Dict]], depends: Sequence[str] = (),
+                 required: bool = True):
+        """
+        登记子系统；depends 中的子系统会在其之前加载，加载失败时该子系统也记为失败。
+        required=False 的子系统加载失败时服务降级运行，不影响 /ready。
+        """
+        with self._lock:
+            self._subsystems[name] = _Subsystem(name, loader, depends, required)
+        MODEL_STATUS.track(lambda: _STATUS_CODES[self._subsystems[name].status], model=name)
+
+    def names(self):
+        with self._lock:
+            return list(self._subsystems)
+
+    def load(self, name: str) -> bool:
+        """同步加载（已加载或已失败时直接返回），返回是否就绪。"""
+        subsystem = self._subsystems.get(name)
+        if subsystem is None:
+            return False
+        # 依赖在获取本子系统的锁之前加载，避免与并行加载的其他线程互相等待
+        failed = [dep for dep in subsystem.depends if not self.load(dep)]
+        with subsystem.lock:
+            if subsystem.status in (STATUS_READY, STATUS_FAILED):
+                return subsystem.status == STATUS_READY
+            subsystem.status = STATUS_LOADING
+            logger.info(f"开始加载模型子系统: {name}")
+            start = time.perf_counter()
+            try:
+                if failed:
+                    raise RuntimeError(f"依赖的子系统加载失败: {', '.join(failed)}")
+                subsystem.details = subsystem.loader() or {}
+                subsystem.status = STATUS_READY
+            except Exception as e:
+                subsystem.status = STATUS_FAILED
+                subsystem.error = str(e)
+                logger.error(f"模型子系统 {name} 加载失败: {e}", exc_info=True)
+            subsystem.total_seconds = round(time.perf_counter() - start, 3)
+            subsystem.done.set()
+            logger.info(f"模型子系统 {name} 加载结束（{subsystem.status}），耗时 {subsystem.total_seconds}s")
+            return subsystem.status == STATUS_READY
+
+    def load_all(self, names: Iterable[str] = None) -> float:
+        """在加载线程池中并行加载，全部结束后返回总耗时（秒）。"""
+        names = list(names or self.names())
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(names) or 1),
+                                thread_name_prefix='model-loader') as pool:
+            list(pool.map(self.load, names))
+        elapsed = time.perf_counter() - start
+        serial = sum(self._subsystems[name].total_seconds or 0.0 for name in names)
+        logger.info(f"模型并行加载完成，总耗时 {elapsed:.2f}s（各子系统耗时之和 {serial:.2f}s）")
+        return elapsed
+
+    def start_background(self, names: Iterable[str] = None) -> threading.Thread:
+        """在后台线程中并行加载，立即返回。"""
+        names = list(names or self.names())
+        thread = threading.Thread(target=self.load_all, args=(names,), name='model-loader', daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        """按启动模式开始加载。"""
+        if self.mode == STARTUP_EAGER:
+            self.load_all()
+        elif self.mode == STARTUP_BACKGROUND:
+            self.start_background()
+        logger.info(f"模型启动模式: {self.mode}")
+
+    def wait_all(self, timeout: float = None) -> bool:
+        """等待所有已开始加载的子系统结束（懒加载模式下未被使用的子系统不等待），返回是否全部就绪。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in self.names():
+            subsystem = self._subsystems[name]
+            if subsystem.status == STATUS_PENDING and self.mode == STARTUP_LAZY:
+                continue
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            subsystem.done.wait(remaining)
+        return self.status()['ready']
+
+    def _is_ready(self, subsystem: _Subsystem) -> bool:
+        """单个必需子系统是否满足就绪条件（与 wait_all 一致：lazy 模式下未加载视为可用）。"""
+        if subsystem.status == STATUS_READY:
+            return True
+        return self.mode == STARTUP_LAZY and subsystem.status in (STATUS_PENDING, STATUS_LOADING)
+
+    def ensure(self, name: str, timeout: float = None) -> bool:
+        """
+        确保子系统可用：未加载时在当前线程加载；正在（后台）加载时等待，最多 timeout 秒。
+        未登记的子系统（如离线脚本直接设置模型）返回 False，由调用方按原有逻辑判断模型是否可用。
+        """
+        subsystem = self._subsystems.get(name)
+        if subsystem is None:
+            return False
+        if subsystem.status == STATUS_READY:
+            return True
+        if subsystem.status == STATUS_PENDING:
+            # 懒加载模式，或后台模式下该子系统还在排队：直接在当前线程加载，不必等前面的模型
+            return self.load(name)
+        subsystem.done.wait(self.wait_timeout if timeout is None else timeout)
+        return subsystem.status == STATUS_READY
+
+    def status(self) -> Dict:
+        with self._lock:
+            subsystems = list(self._subsystems.values())
+        models = {
+            s.name: {'status': s.status, 'error': s.error, 'total_seconds': s.total_seconds,
+                     'depends': list(s.depends), 'required': s.required, **s.details}
+            for s in subsystems
+        }
+        return {
+            'mode': self.mode,
+            'ready': all(self._is_ready(s) for s in subsystems if s.required),
+            'degraded': [s.name for s in subsystems if not s.required and s.status == STATUS_FAILED],
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'models': models,
+        }
+
+
+_registry = ModelRegistry()
+
+
+def set_model_registry(registry: ModelRegistry):
+    global _registry
+    _registry = registry
+
+
+def get_model_registry() -> ModelRegistry:
+    return _registry
+
+
+def ensure_model(name: str, timeout: float = None) -> bool:
+    return _registry.ensure(name, timeout)
@@ -0,0 +1,313 @@
+# backend/app/services/pavement_backends.py
+"""
+路面病害模型的推理后端
+- torch：直接加载 .pt 权重，PyTorch eager 推理；
+- onnx：导出为 ONNX，由 ONNX Runtime 在 CPU 上推理；
+- openvino：导出为 OpenVINO IR，由 OpenVINO 在 CPU 上推理；
+- onnx-int8：在 ONNX 导出结果上用本地路面图片做静态 INT8 量化（QDQ），由 ONNX Runtime 推理。
+非 torch 后端在首次使用时自动导出，产物缓存在权重文件旁边（权重更新后会重新导出）。
+所有后端都通过 Ultralytics 的 YOLO 对象加载，前处理（letterbox）与后处理（NMS、坐标还原）完全一致，
+pavement_service 中的调用方式无需区分后端。
+"""
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from ..utils.logger import get_logger
+from ..utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+# 实际生效的后端为 1；requested 与 active 不一致说明发生了回退（如缺少 onnxruntime / openvino）
+PAVEMENT_BACKEND_INFO = REGISTRY.gauge('pavement_backend_info', '路面病害检测模型配置的与实际使用的推理后端',
+                                       ('requested', 'active'))
+
+BACKEND_TORCH = 'torch'
+BACKEND_ONNX = 'onnx'
+BACKEND_OPENVINO = 'openvino'
+BACKEND_ONNX_INT8 = 'onnx-int8'
+BACKENDS = (BACKEND_TORCH, BACKEND_ONNX, BACKEND_OPENVINO, BACKEND_ONNX_INT8)
+
+_IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def exported_artifact_path(weights_path, backend: str) -> Path:
+    """导出产物的缓存位置（与 Ultralytics 导出的默认命名一致）。"""
+    weights_path = Path(weights_path)
+    if backend == BACKEND_ONNX:
+        return weights_path.with_suffix('.onnx')
+    if backend == BACKEND_OPENVINO:
+        return weights_path.parent / f'{weights_path.stem}_openvino_model'
+    if backend == BACKEND_ONNX_INT8:
+        return weights_path.parent / f'{weights_path.stem}_int8.onnx'
+    return weights_path
+
+
+def _is_stale(artifact: Path, weights_path: Path) -> bool:
+    if not artifact.exists():
+        return True
+    return artifact.stat().st_mtime < weights_path.stat().st_mtime
+
+
+def export_model(weights_path, backend: str, imgsz: int = 640) -> Path:
+    """将 .pt 权重导出为指定后端的格式，返回导出产物路径。"""
+    from ultralytics import YOLO
+
+    weights_path = Path(weights_path)
+    logger.info(f"正在将 {weights_path} 导出为 {backend} 格式...")
+    # dynamic=True 保留可变的 batch 维度，批量推理时可以一次送入多帧
+    exported = YOLO(str(weights_path)).export(format=backend, imgsz=imgsz, dynamic=True, half=False)
+    artifact = Path(exported) if exported else exported_artifact_path(weights_path, backend)
+    logger.info(f"模型导出完成: {artifact}")
+    return artifact
+
+
+def list_images(folder, limit: int = None) -> List[Path]:
+    """列出目录下的图片文件（按文件名排序）。"""
+    folder = Path(folder)
+    if not folder.is_dir():
+        raise FileNotFoundError(f"图片目录不存在: {folder}")
+    images = sorted(p for p in folder.rglob('*') if p.suffix.lower() in _IMAGE_SUFFIXES)
+    return images[:limit] if limit else images
+
+
+def _letterbox_tensor(image_path: Path, imgsz: int) -> np.ndarray:
+    """与 Ultralytics 前处理一致的 letterbox：等比缩放、灰边填充、归一化为 1x3xHxW float32。"""
+    import cv2
+
+    img = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"无法读取图片: {image_path}")
+    h, w = img.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    resized = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = resized
+    rgb = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)
+    return np.ascontiguousarray(rgb.transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def quantize_onnx_int8(weights_path, calibration_dir, imgsz: int = 640, max_images: int = 200) -> Path:
+    """
+    用本地路面图片目录做校准，将 FP32 ONNX 模型静态量化为 INT8（QDQ 格式，权重按通道量化）。
+    量化后的模型保留 FP32 模型的元数据（类别名、stride、imgsz），可直接由 Ultralytics 加载。
+    """
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    weights_path = Path(weights_path)
+    fp32_path = exported_artifact_path(weights_path, BACKEND_ONNX)
+    if _is_stale(fp32_path, weights_path):
+        fp32_path = export_model(weights_path, BACKEND_ONNX, imgsz)
+
+    images = list_images(calibration_dir, max_images)
+    if not images:
+        raise ValueError(f"校准目录中没有图片: {calibration_dir}")
+    input_name = ort.InferenceSession(str(fp32_path), providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class _RoadImageReader(CalibrationDataReader):
+        def __init__(self):
+            self._iter = iter(images)
+
+        def get_next(self):
+            for path in self._iter:
+                try:
+                    return {input_name: _letterbox_tensor(path, imgsz)}
+                except ValueError as e:
+                    logger.warning(f"跳过校准图片: {e}")
+            return None
+
+    int8_path = exported_artifact_path(weights_path, BACKEND_ONNX_INT8)
+    logger.info(f"使用 {len(images)} 张图片校准 INT8 量化: {fp32_path} -> {int8_path}")
+    quantize_static(str(fp32_path), str(int8_path), _RoadImageReader(),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+    # 拷贝 Ultralytics 写入的元数据，否则加载时无法得到类别名等信息
+    fp32_model = onnx.load(str(fp32_path))
+    int8_model = onnx.load(str(int8_path))
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, str(int8_path))
+    logger.info(f"INT8 量化完成: {int8_path}")
+    return int8_path
+
+
+def load_pavement_model(weights_path, backend: str = BACKEND_TORCH, imgsz: int = 640, calibration_dir=None,
+                        strict: bool = False):
+    """
+    按指定后端加载路面病害检测模型。
+    onnx-int8 后端在量化模型不存在时使用 calibration_dir 中的图片现场校准量化。
+    导出或加载失败时记录错误并回退到 PyTorch 后端，保证服务可用；strict=True 时不回退，直接抛出异常
+    （对比评估等必须确认实际使用了指定后端的场景）。
+    """
+    return load_pavement_model_with_backend(weights_path, backend, imgsz, calibration_dir, strict)[0]
+
+
+def load_pavement_model_with_backend(weights_path, backend: str = BACKEND_TORCH, imgsz: int = 640,
+                                     calibration_dir=None, strict: bool = False) -> Tuple[object, str]:
+    """同 load_pavement_model，同时返回实际使用的后端（回退时为 torch），并记录到 pavement_backend_info 指标。"""
+    from ultralytics import YOLO
+
+    backend = (backend or BACKEND_TORCH).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的推理后端: {backend}，可选: {', '.join(BACKENDS)}")
+
+    weights_path = Path(weights_path)
+    if backend == BACKEND_TORCH:
+        model = YOLO(str(weights_path))
+        PAVEMENT_BACKEND_INFO.set(1, requested=backend, active=BACKEND_TORCH)
+        return model, BACKEND_TORCH
+
+    try:
+        artifact = exported_artifact_path(weights_path, backend)
+        if _is_stale(artifact, weights_path):
+            if backend == BACKEND_ONNX_INT8:
+                if not calibration_dir:
+                    raise ValueError("INT8 模型不存在且未配置校准图片目录")
+                artifact = quantize_onnx_int8(weights_path, calibration_dir, imgsz)
+            else:
+                artifact = export_model(weights_path, backend, imgsz)
+        model = YOLO(str(artifact), task='detect')
+        logger.info(f"路面病害检测模型使用 {backend} 后端: {artifact}")
+        PAVEMENT_BACKEND_INFO.set(1, requested=backend, active=backend)
+        return model, backend
+    except Exception as e:
+        if strict:
+            raise
+        logger.error(f"{backend} 后端加载失败，回退到 PyTorch: {e}", exc_info=True)
+        model = YOLO(str(weights_path))
+        PAVEMENT_BACKEND_INFO.set(1, requested=backend, active=BACKEND_TORCH)
+        return model, BACKEND_TORCH
+
+
+# ---------------- FP32 / INT8 对比报告 ----------------
+
+def _rss_mb() -> float:
+    """当前进程常驻内存（MB），用于估算模型加载占用。"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _artifact_size_mb(path: Path) -> float:
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob('*') if p.is_file()) / 1024 / 1024
+    return path.stat().st_size / 1024 / 1024 if path.exists() else 0.0
+
+
+def _predict(model, image_path: Path, conf: float):
+    start = time.perf_counter()
+    result = model(str(image_path), conf=conf, verbose=False)[0]
+    latency_ms = (time.perf_counter() - start) * 1000
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return latency_ms, np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=int)
+    return latency_ms, boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int)
+
+
+def _pairwise_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _latency_summary(latencies: List[float]) -> Dict:
+    arr = np.asarray(latencies, dtype=np.float64)
+    return {
+        'mean_ms': round(float(arr.mean()), 2),
+        'p50_ms': round(float(np.percentile(arr, 50)), 2),
+        'p95_ms': round(float(np.percentile(arr, 95)), 2),
+    }
+
+
+def compare_models(weights_path, image_dir, candidate_backend: str = BACKEND_ONNX_INT8,
+                   calibration_dir=None, conf: float = 0.30, iou_threshold: float = 0.5,
+                   max_images: int = None, imgsz: int = 640) -> Dict:
+    """
+    在同一批图片上对比 FP32（PyTorch）与候选后端（默认 INT8）的延迟、内存和检测一致性。
+    一致性以 FP32 结果为参考：按 IoU 贪心匹配框，统计召回/精确率、匹配框平均 IoU 和类别一致率。
+    """
+    images = list_images(image_dir, max_images)
+    if not images:
+        raise ValueError(f"评估目录中没有图片: {image_dir}")
+
+    rss_before = _rss_mb()
+    reference = load_pavement_model(weights_path, BACKEND_TORCH, imgsz)
+    rss_reference = _rss_mb()
+    # 候选后端不允许回退：否则缺少 onnxruntime 等依赖时会变成 FP32 与 FP32 对比，得到虚假的一致率与加速比
+    try:
+        candidate = load_pavement_model(weights_path, candidate_backend, imgsz, calibration_dir, strict=True)
+    except Exception as e:
+        raise RuntimeError(f"候选后端 {candidate_backend} 加载失败: {e}") from e
+    rss_candidate = _rss_mb()
+
+    # 预热，排除首次推理的初始化开销
+    _predict(reference, images[0], conf)
+    _predict(candidate, images[0], conf)
+
+    ref_latency, cand_latency, ious = [], [], []
+    ref_total = cand_total = matched = class_matched = 0
+    for path in images:
+        t_ref, ref_boxes, ref_cls = _predict(reference, path, conf)
+        t_cand, cand_boxes, cand_cls = _predict(candidate, path, conf)
+        ref_latency.append(t_ref)
+        cand_latency.append(t_cand)
+        ref_total += len(ref_boxes)
+        cand_total += len(cand_boxes)
+
+        iou = _pairwise_iou(ref_boxes, cand_boxes)
+        used = set()
+        for i in range(len(ref_boxes)):
+            order = np.argsort(-iou[i]) if iou.shape[1] else []
+            for j in order:
+                if j in used or iou[i, j] < iou_threshold:
+                    continue
+                used.add(j)
+                matched += 1
+                ious.append(float(iou[i, j]))
+                class_matched += int(ref_cls[i] == cand_cls[j])
+                break
+
+    return {
+        'images': len(images),
+        'candidate_backend': candidate_backend,
+        'latency': {
+            'fp32': _latency_summary(ref_latency),
+            'candidate': _latency_summary(cand_latency),
+            'speedup': round(float(np.mean(ref_latency) / max(np.mean(cand_latency), 1e-9)), 2),
+        },
+        'memory_mb': {
+            'fp32_load_rss': round(rss_reference - rss_before, 1),
+            'candidate_load_rss': round(rss_candidate - rss_reference, 1),
+            'fp32_artifact': round(_artifact_size_mb(weights_path), 1),
+            'candidate_artifact': round(_artifact_size_mb(exported_artifact_path(weights_path, candidate_backend)), 1),
+        },
+        'agreement': {
+            'iou_threshold': iou_threshold,
+            'fp32_boxes': ref_total,
+            'candidate_boxes': cand_total,
+            'matched_boxes': matched,
+            'recall_vs_fp32': round(matched / ref_total, 4) if ref_total else 1.0,
+            'precision_vs_fp32': round(matched / cand_total, 4) if cand_total else 1.0,
+            'mean_matched_iou': round(float(np.mean(ious)), 4) if ious else None,
+            'class_match_rate': round(class_matched / matched, 4) if matched else None,
+        },
+    }
@@ -1,20 +1,27 @@
 # backend/app/services/pavement_service.py
 
 from pathlib import Path
-import torch
-from PIL import Image, ImageDraw, ImageFont
 import io
 import base64
+import math
 import os
 import numpy as np
-from typing import List, Dict
-from ultralytics import YOLO
+from typing import List, Dict, Iterable, Iterator
 import logging
+import threading
+import cv2
 
 # 设置ultralytics的日志级别为WARNING，减少不必要的输出
 logging.getLogger("ultralytics").setLevel(logging.WARNING)
 
-from ..services.alert_service import save_alert_frame, update_alert_video, create_alert_video
+from ..services.alert_service import create_alert_video
+from .alert_writer import enqueue_alert_frame, enqueue_video_counts, register_video_dir
+from .video_ingest_service import iter_video_frames, probe_video, SAMPLE_FPS
+from .annotation_renderer import AnnotationRenderer
+from ..utils.image_io import decode_rgb, decode_rgb_reduced, read_image_bytes
+from ..utils.result_cache import get_result_cache
+from ..utils.metrics import STAGE_LATENCY, FRAMES_SKIPPED
+from .model_registry import ensure_model
 from datetime import datetime
 from ..extensions import db
 
@@ -47,158 +54,797 @@ label2color = {
 
 # 新增全局模型管理接口
 _global_model = None
+_model_version = 0  # 每次替换模型时递增，作为结果缓存键的一部分
+# Ultralytics 模型对象内部带有预测器状态，不是线程安全的；
+# 多个会话/工作线程并发时，只串行化前向推理，解码、标注、编码仍可并行
+_model_lock = threading.Lock()
+_annotation_renderer = None
+_tiling_policy = None
+# 降分辨率解码的目标长边（与模型输入尺寸一致），0 表示总是按原分辨率解码
+_decode_min_side = 640
 
 def set_global_model(model):
-    global _global_model
+    global _global_model, _model_version
     _global_model = model
+    _model_version += 1
+    # 模型（权重/后端）变化后之前缓存的检测结果全部失效
+    get_result_cache('pavement').clear()
 
 def get_global_model():
+    if _global_model is None:
+        # 懒加载 / 后台加载模式下首次使用时加载（或等待后台加载完成）
+        ensure_model('pavement')
     return _global_model
 
 
-def draw_detections(image, detections):
-    draw = ImageDraw.Draw(image)
-    for det in detections:
-        bbox = det['bbox']
-        label = det['class']
-        conf = det['confidence']
-        color = label2color.get(label, (255, 0, 0))
-        draw.rectangle(bbox, outline=color, width=2)
-        text = f"{label} {conf:.2f}"
-        from pathlib import Path
-        font_path = Path("data/SimHei.ttf")
+def supports_dynamic_imgsz() -> bool:
+    """
+    当前模型能否按请求改变推理输入尺寸。
+    PyTorch 权重（Ultralytics 加载 .pt 时保留 ckpt）可以；导出的 ONNX/OpenVINO 等为固定输入形状，不可以。
+    """
+    return getattr(_global_model, 'ckpt', None) is not None
+
+
+def set_annotation_renderer(renderer):
+    global _annotation_renderer
+    _annotation_renderer = renderer
+
+def get_annotation_renderer():
+    """获取标注渲染器；未显式配置时按默认参数创建一次（字体、标签字形只加载一次）。"""
+    global _annotation_renderer
+    if _annotation_renderer is None:
+        _annotation_renderer = AnnotationRenderer(labels=id2label.values())
+    return _annotation_renderer
+
+
+def set_tiling_policy(policy):
+    global _tiling_policy
+    _tiling_policy = policy
+
+def set_decode_min_side(min_side: int):
+    global _decode_min_side
+    _decode_min_side = int(min_side or 0)
+
+def get_tiling_policy():
+    """获取切片推理策略；未显式配置时使用默认的自适应策略。"""
+    global _tiling_policy
+    if _tiling_policy is None:
+        _tiling_policy = TilingPolicy()
+    return _tiling_policy
+
+
+# 推理置信度阈值与默认批大小
+CONF_THRESHOLD = 0.30
+DEFAULT_BATCH_SIZE = 8
+
+# 标注图渲染策略：总是渲染 / 仅在有检测结果时渲染（用于保存告警帧） / 从不渲染
+RENDER_ALWAYS = 'always'
+RENDER_DETECTIONS = 'detections'
+RENDER_NEVER = 'never'
+
+
+def should_return_image(frame_index, annotate_every: int) -> bool:
+    """
+    标注图返回间隔：annotate_every=N 时每 N 帧返回一次标注图，0 表示只返回检测列表。
+    """
+    if annotate_every is None:
+        return True
+    if annotate_every <= 0:
+        return False
+    if not isinstance(frame_index, int):
+        return True
+    return frame_index % annotate_every == 0
+
+
+def resolve_annotate_every(response_mode, annotate_every) -> int:
+    """
+    将请求中的 response_mode / annotate_every 统一为标注图返回间隔。
+    显式给出的 annotate_every 优先；否则 detections 模式为 0（不返回），full 模式为 1（每帧返回）。
+    annotate_every 不是整数或为负数时抛出 ValueError（客户端传入的值，调用方转为错误响应）。
+    """
+    if annotate_every is not None:
         try:
-            font = ImageFont.truetype(str(font_path), 16)
-        except:
-            font = None
+            value = int(annotate_every)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"annotate_every 必须为非负整数，收到: {annotate_every!r}") from None
+        if value < 0:
+            raise ValueError("annotate_every 不能为负数")
+        return value
+    return 0 if response_mode == 'detections' else 1
+
 
-        x, y = bbox[0], bbox[1] - 20 if bbox[1] - 20 > 0 else bbox[1] + 2
-        draw.text((x, y), text, fill=color, font=font)
-    return image
+# 近重复帧阈值上限：平均灰度差超过 20% 已是明显的画面变化，再大的阈值会让过滤退化为“几乎总是跳过”
+MAX_SKIP_THRESHOLD = 0.2
 
 
-def detect_single_image(base64_image: str) -> Dict:
+def resolve_skip_threshold(skip_threshold) -> float:
+    """
+    校验客户端传入的近重复帧阈值（见 FrameSkipGate），截断到 [0, MAX_SKIP_THRESHOLD]，负数视为 0（关闭过滤）。
+    非数值或 NaN 时抛出 ValueError。
+    """
+    try:
+        value = float(skip_threshold)
+    except (TypeError, ValueError):
+        raise ValueError(f"skip_threshold 必须为数值，收到: {skip_threshold!r}") from None
+    if math.isnan(value):
+        raise ValueError("skip_threshold 不能为 NaN")
+    return min(max(value, 0.0), MAX_SKIP_THRESHOLD)
+
+
+def _needs_render(render: str, detections: List[Dict]) -> bool:
+    return render == RENDER_ALWAYS or (render == RENDER_DETECTIONS and bool(detections))
+
+
+def decode_image(image_data) -> np.ndarray:
+    """
+    将图像载荷（data URL / base64 字符串 / JPEG、PNG 原始字节 / 上传文件）解码为可写的 numpy 数组（RGB）。
+    已解码的 RGB numpy 数组（如服务端视频抽帧）直接返回。
+    """
+    if isinstance(image_data, np.ndarray):
+        return image_data
+    return decode_rgb(image_data)
+
+
+def decode_frame(image_data):
+    """
+    解码待推理的帧，返回 (RGB 数组, (sx, sy))。
+    模型输入只有 640，JPEG 帧直接在 DCT 域缩小解码到长边不小于 _decode_min_side；
+    需要切片推理的高分辨率帧保留原分辨率。sx/sy 用于把检测坐标还原到原图。
+    缩小的图像只用于推理；标注图与告警帧按原分辨率渲染（见 _source_image）。
+    """
+    if isinstance(image_data, np.ndarray):
+        return image_data, (1.0, 1.0)
+    policy = get_tiling_policy()
+    keep_full = (lambda w, h: policy.windows(h, w) is not None) if policy is not None else None
+    return decode_rgb_reduced(image_data, _decode_min_side, keep_full)
+
+
+def _source_image(image_data, image_np: np.ndarray, scale) -> np.ndarray:
+    """
+    用于渲染标注图的原分辨率图像：未缩小解码时直接复用推理用的数组，
+    否则重新全分辨率解码（只有需要渲染的帧才付出这次解码）。
+    """
+    if scale[0] == 1.0 and scale[1] == 1.0:
+        return image_np
+    with STAGE_LATENCY.time(pipeline='pavement', stage='decode'):
+        return decode_image(image_data)
+
+
+def rescale_detections(detections: List[Dict], scale) -> List[Dict]:
+    """将解码图坐标系下的检测框还原到原图坐标（返回新的列表，不修改入参）。"""
+    sx, sy = scale
+    if sx == 1.0 and sy == 1.0:
+        return detections
+    return [dict(det, bbox=[round(det['bbox'][0] * sx, 2), round(det['bbox'][1] * sy, 2),
+                            round(det['bbox'][2] * sx, 2), round(det['bbox'][3] * sy, 2)])
+            for det in detections]
+
+
+def extract_detections(result, names) -> List[Dict]:
+    """
+    从单张图像的 YOLO 推理结果中提取检测框。
+    一次性将整张图的 xyxy/conf/cls 拷贝到 CPU，避免逐框同步。
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+
+    xyxy = boxes.xyxy.cpu().numpy()
+    confs = boxes.conf.cpu().numpy()
+    classes = boxes.cls.cpu().numpy().astype(int)
+
+    detections = []
+    for (x1, y1, x2, y2), conf, cls in zip(xyxy, confs, classes):
+        # 从模型的类别名称获取标签
+        label_key = names[int(cls)]
+        # 直接使用原始坐标，无需缩放
+        detections.append({
+            'class': id2label.get(label_key, label_key),
+            'confidence': round(float(conf), 3),
+            'bbox': [round(float(x1), 2), round(float(y1), 2), round(float(x2), 2), round(float(y2), 2)]
+        })
+    return detections
+
+
+# ---------------- 切片推理 ----------------
+
+TILING_OFF = 'off'
+TILING_AUTO = 'auto'
+TILING_ALWAYS = 'always'
+
+
+def _tile_starts(length: int, tile: int, step: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)  # 最后一块贴齐边缘，保证覆盖整幅图像
+    return starts
+
+
+class TilingPolicy:
+    """
+    高分辨率图像的切片推理策略。
+    整幅 4K 图像缩放到模型输入尺寸后，细小裂缝（D00/D10）只剩一两个像素宽而漏检；
+    切片后每块以接近原始分辨率送入模型，整图仍作为一块参与推理，保证大面积病害不被切断。
+    - mode=auto：仅当长边 >= min_side 时切片；always：总是切片；off：关闭；
+    - tile_size / overlap：切片边长（像素）与相邻切片的重叠比例；
+    - nms_iou / nms_ios：跨切片合并时的 IoU 阈值和“交集占小框比例”阈值，
+      后者用于去掉被切片边界截断、完全落在完整框内的半截框。
+    """
+
+    def __init__(self, mode: str = TILING_AUTO, min_side: int = 2560, tile_size: int = 1280, overlap: float = 0.2,
+                 include_full_frame: bool = True, nms_iou: float = 0.5, nms_ios: float = 0.8):
+        mode = (mode or TILING_OFF).lower()
+        if mode not in (TILING_OFF, TILING_AUTO, TILING_ALWAYS):
+            raise ValueError(f"不支持的切片模式: {mode}")
+        if not 0 <= overlap < 1:
+            raise ValueError("切片重叠比例必须在 [0, 1) 之间")
+        self.mode = mode
+        self.min_side = int(min_side)
+        self.tile_size = int(tile_size)
+        self.overlap = float(overlap)
+        self.include_full_frame = include_full_frame
+        self.nms_iou = nms_iou
+        self.nms_ios = nms_ios
+
+    def windows(self, height: int, width: int):
+        """返回切片窗口列表 [(x1, y1, x2, y2)]；不需要切片时返回 None。"""
+        if self.mode == TILING_OFF:
+            return None
+        if self.mode == TILING_AUTO and max(height, width) < self.min_side:
+            return None
+        tile = min(self.tile_size, max(height, width))
+        if tile >= height and tile >= width:
+            return None
+        step = max(1, int(tile * (1 - self.overlap)))
+        windows = [(x, y, min(x + tile, width), min(y + tile, height))
+                   for y in _tile_starts(height, tile, step)
+                   for x in _tile_starts(width, tile, step)]
+        if self.include_full_frame:
+            windows.append((0, 0, width, height))
+        return windows
+
+
+def merge_detections(detections: List[Dict], iou_threshold: float = 0.5, ios_threshold: float = 0.8) -> List[Dict]:
+    """
+    跨切片的类别内 NMS：按置信度从高到低保留检测框，
+    同类别中与已保留框 IoU >= iou_threshold 或交集占自身面积 >= ios_threshold 的框被抑制。
+    """
+    if len(detections) <= 1:
+        return detections
+
+    boxes = np.asarray([det['bbox'] for det in detections], dtype=np.float32)
+    scores = np.asarray([det['confidence'] for det in detections], dtype=np.float32)
+    labels = np.asarray([det['class'] for det in detections])
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+
+    suppressed = np.zeros(len(detections), dtype=bool)
+    keep = []
+    for i in np.argsort(-scores, kind='stable'):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        w = np.clip(np.minimum(boxes[i, 2], boxes[:, 2]) - np.maximum(boxes[i, 0], boxes[:, 0]), 0, None)
+        h = np.clip(np.minimum(boxes[i, 3], boxes[:, 3]) - np.maximum(boxes[i, 1], boxes[:, 1]), 0, None)
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas - inter, 1e-9)
+        ios = inter / np.maximum(np.minimum(areas[i], areas), 1e-9)
+        suppressed |= (labels == labels[i]) & ((iou >= iou_threshold) | (ios >= ios_threshold))
+    return [detections[i] for i in sorted(keep)]
+
+
+def _shift_detections(detections: List[Dict], dx: int, dy: int) -> List[Dict]:
+    if dx == 0 and dy == 0:
+        return detections
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        det['bbox'] = [round(x1 + dx, 2), round(y1 + dy, 2), round(x2 + dx, 2), round(y2 + dy, 2)]
+    return detections
+
+
+def run_batch_inference(images_np: List[np.ndarray], imgsz: int = None) -> List[List[Dict]]:
+    """
+    对一组图像执行一次批量前向推理，返回与输入顺序一致的检测结果列表。
+    需要切片的高分辨率图像展开为多块切片，与其他图像一起放入同一次批量推理，再合并回原图坐标。
+    imgsz 指定推理输入尺寸（实时流自适应降档时使用），模型不支持可变输入尺寸时忽略。
+    """
+    model = get_global_model()
+    if model is None:
+        raise RuntimeError('模型未加载，无法进行检测')
+    if not images_np:
+        return []
+
+    policy = get_tiling_policy()
+    inputs = []
+    layout = []  # 每张原图对应的 (切片窗口列表或 None, 在 inputs 中的起始位置)
+    for image_np in images_np:
+        windows = policy.windows(*image_np.shape[:2]) if policy is not None else None
+        layout.append((windows, len(inputs)))
+        if windows is None:
+            inputs.append(image_np)
+        else:
+            inputs.extend(np.ascontiguousarray(image_np[y1:y2, x1:x2]) for x1, y1, x2, y2 in windows)
+
+    options = {'imgsz': imgsz} if imgsz and supports_dynamic_imgsz() else {}
+    # 传入列表时 Ultralytics 会将整组图像拼成一个 batch 做一次前向推理
+    with _model_lock, STAGE_LATENCY.time(pipeline='pavement', stage='inference'):
+        results = model(inputs, conf=CONF_THRESHOLD, verbose=False, **options)
+    with STAGE_LATENCY.time(pipeline='pavement', stage='box_extraction'):
+        per_input = [extract_detections(result, model.names) for result in results]
+
+    outputs = []
+    for windows, start in layout:
+        if windows is None:
+            outputs.append(per_input[start])
+            continue
+        merged = []
+        for offset, (x1, y1, _, _) in enumerate(windows):
+            merged.extend(_shift_detections(per_input[start + offset], x1, y1))
+        outputs.append(merge_detections(merged, policy.nms_iou, policy.nms_ios))
+    return outputs
+
+
+def _encode_annotated(image_np: np.ndarray, detections: List[Dict]) -> str:
+    """在解码缓冲区上原地绘制检测结果并编码，返回不带前缀的 base64 字符串。"""
+    renderer = get_annotation_renderer()
+    with STAGE_LATENCY.time(pipeline='pavement', stage='annotation'):
+        renderer.draw(image_np, detections, label2color)
+    with STAGE_LATENCY.time(pipeline='pavement', stage='encode'):
+        encoded = renderer.encode(image_np)
+    with STAGE_LATENCY.time(pipeline='pavement', stage='base64_encode'):
+        return base64.b64encode(encoded).decode()
+
+
+def _read_frame_bytes(image_data):
+    """把上传的帧载荷（data URL / base64 / 文件对象）转为原始图像字节；服务端抽帧的 numpy 帧原样返回。"""
+    if isinstance(image_data, np.ndarray):
+        return image_data
+    with STAGE_LATENCY.time(pipeline='pavement', stage='base64_decode'):
+        return read_image_bytes(image_data)
+
+
+class FrameSkipGate:
+    """
+    推理前的近重复帧过滤：将帧缩成小尺寸灰度图，与上一张实际推理过的帧比较平均像素差，
+    差异低于 threshold（0~1）时跳过推理、复用上一次的检测结果（例如车辆停在路口时的长串相同画面）。
+    连续跳过 max_consecutive_skips 帧后强制推理一次，避免画面缓慢变化时结果一直不更新。
+    threshold <= 0 表示关闭过滤。
+    """
+
+    def __init__(self, threshold: float = 0.01, thumb_size=(32, 32), max_consecutive_skips: int = 15):
+        self.threshold = float(threshold)
+        self.thumb_size = thumb_size
+        self.max_consecutive_skips = max_consecutive_skips
+        self._lock = threading.Lock()
+        self._last_thumb = None
+        self._last_detections: List[Dict] = []
+        self._consecutive_skips = 0
+        self.total_frames = 0
+        self.skipped_frames = 0
+
+    def _thumbnail(self, image_np: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+        return cv2.resize(gray, self.thumb_size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def check(self, image_np: np.ndarray):
+        """
+        判断该帧是否可以跳过推理。
+        返回 (缩略图, 可复用的检测结果)；检测结果为 None 表示需要推理，推理后调用 remember()。
+        """
+        thumb = self._thumbnail(image_np) if self.threshold > 0 else None
+        with self._lock:
+            self.total_frames += 1
+            if (thumb is not None and self._last_thumb is not None
+                    and self._consecutive_skips < self.max_consecutive_skips
+                    and float(np.mean(np.abs(thumb - self._last_thumb))) / 255.0 < self.threshold):
+                self._consecutive_skips += 1
+                self.skipped_frames += 1
+                FRAMES_SKIPPED.inc()
+                return thumb, [dict(det) for det in self._last_detections]
+        return thumb, None
+
+    def remember(self, thumb: np.ndarray, detections: List[Dict]):
+        """记录最近一次实际推理的帧与检测结果。"""
+        with self._lock:
+            self._last_thumb = thumb
+            self._last_detections = [dict(det) for det in detections]
+            self._consecutive_skips = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'skip_threshold': self.threshold,
+                'skipped_frames': self.skipped_frames,
+                'skip_ratio': round(self.skipped_frames / self.total_frames, 4) if self.total_frames else 0.0,
+            }
+
+
+def detect_single_image(image_data, render: str = RENDER_ALWAYS, skip_gate: FrameSkipGate = None,
+                        imgsz: int = None) -> Dict:
+    """
+    单帧检测。image_data 可以是 base64 字符串或原始图像字节；render 控制是否生成标注图（见 RENDER_*），不渲染时 annotated_image 为 None。
+    传入 skip_gate 时先做近重复帧判断，被跳过的帧复用上一次的检测结果并标记 reused=True。
+    imgsz 为推理输入尺寸，None 表示使用模型默认值。
+    """
     model = get_global_model()
     if model is None:
         return {'status': 'error', 'message': '模型未加载，无法进行检测', 'detections': [], 'annotated_image': None}
 
     try:
-        if not base64_image.startswith('data:image'):
-            raise ValueError("不是有效的 Base64 图像格式")
-
-        _, encoded = base64_image.split(',', 1)
-        image_bytes = base64.b64decode(encoded)
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        image_np = np.array(image)
-
-        # 使用YOLOv11进行推理，设置置信度阈值，关闭verbose输出
-        results = model(image_np, conf=0.30, verbose=False)
-
-        # 获取检测结果
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    # 获取边界框坐标
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    # 获取置信度并转换为Python原生float类型
-                    conf = float(box.conf[0].cpu().numpy().item())
-                    # 获取类别
-                    cls = int(box.cls[0].cpu().numpy().item())
-
-                    # 从模型的类别名称获取标签
-                    label_key = model.names[cls]
-
-                    # 直接使用原始坐标，无需缩放
-                    detections.append({
-                        'class': id2label.get(label_key, label_key),
-                        'confidence': round(conf, 3),
-                        'bbox': [round(float(x1), 2), round(float(y1), 2), round(float(x2), 2), round(float(y2), 2)]
-                    })
-
-        annotated = draw_detections(image.copy(), detections)
-        buffered = io.BytesIO()
-        annotated.save(buffered, format="JPEG")
-        annotated_image_base64 = base64.b64encode(buffered.getvalue()).decode()
-
-        return {'status': 'success', 'detections': detections, 'annotated_image': annotated_image_base64}
+        image_data = _read_frame_bytes(image_data)
+        with STAGE_LATENCY.time(pipeline='pavement', stage='decode'):
+            image_np, scale = decode_frame(image_data)
+
+        reused = None
+        if skip_gate is not None:
+            thumb, reused = skip_gate.check(image_np)
+        if reused is None:
+            # 使用YOLOv11进行推理，设置置信度阈值，关闭verbose输出
+            detections = run_batch_inference([image_np], imgsz=imgsz)[0]
+            if skip_gate is not None:
+                skip_gate.remember(thumb, detections)
+        else:
+            detections = reused
+        # 返回的坐标统一为原图坐标，标注图也画在原分辨率图像上（告警帧即保存该标注图）
+        detections = rescale_detections(detections, scale)
+        annotated_image_base64 = None
+        if _needs_render(render, detections):
+            annotated_image_base64 = _encode_annotated(_source_image(image_data, image_np, scale), detections)
+
+        return {'status': 'success', 'detections': detections, 'annotated_image': annotated_image_base64,
+                'reused': reused is not None}
 
     except Exception as e:
         print(f"[ERROR] 检测失败: {str(e)}")
         return {'status': 'error', 'message': f'检测失败: {str(e)}', 'detections': [], 'annotated_image': None}
 
 
-def detect_batch_images(base64_images: List[str]) -> List[Dict]:
+def _frame_error(frame_index: int, error: Exception) -> Dict:
+    print(f"[ERROR] 批量检测中第 {frame_index} 帧处理失败: {str(error)}")
+    return {
+        'frame_index': frame_index,
+        'detections': [],
+        'image_base64': None,
+        'status': 'error',
+        'message': f'第{frame_index}帧处理失败: {str(error)}'
+    }
+
+
+def _cache_params() -> tuple:
+    """影响检测结果与标注图的全部参数，作为结果缓存键的一部分。"""
+    policy = get_tiling_policy()
+    renderer = get_annotation_renderer()
+    tiling = (policy.mode, policy.min_side, policy.tile_size, policy.overlap) if policy is not None else None
+    return _model_version, CONF_THRESHOLD, _decode_min_side, tiling, renderer.codec, renderer.quality
+
+
+def iter_batch_detections(images: Iterable, batch_size: int = DEFAULT_BATCH_SIZE,
+                          annotate_every: int = 1) -> Iterator[Dict]:
+    """
+    批量检测引擎：按顺序解码帧，凑满 batch_size 帧后做一次批量推理，
+    再按 frame_index 逐帧产出结果。
+    标注图只在按 annotate_every 需要返回、或该帧有检测结果（需保存告警帧）时渲染，且按原分辨率渲染。
+    解码失败的帧单独产出错误结果，不影响同批其他帧。
+    上传的图像按内容哈希查询结果缓存，重复上传的帧不再解码和推理（服务端抽帧的 numpy 帧不走缓存）。
+    """
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+    cache = get_result_cache('pavement')
+    params = _cache_params()
+    pending = []  # [(frame_index, 推理用numpy数组, 原图/解码图尺寸比, 缓存键, 命中的缓存结果, 原始图像数据)]
+
+    def flush():
+        fresh = [item for item in pending if item[4] is None]
+        error = None
+        fresh_detections = {}
+        try:
+            batch_detections = run_batch_inference([item[1] for item in fresh]) if fresh else []
+            fresh_detections = {item[0]: dets for item, dets in zip(fresh, batch_detections)}
+        except Exception as e:
+            error = e
+
+        mime_type = get_annotation_renderer().mime_type
+        for frame_index, image_np, scale, key, cached, source in pending:
+            if cached is not None:
+                yield dict(cached, frame_index=frame_index, status='success', cached=True)
+                continue
+            if error is not None:
+                yield _frame_error(frame_index, error)
+                continue
+            detections = rescale_detections(fresh_detections[frame_index], scale)
+            try:
+                image_base64 = None
+                if detections or should_return_image(frame_index, annotate_every):
+                    image = _source_image(source, image_np, scale)
+                    image_base64 = f"data:{mime_type};base64," + _encode_annotated(image, detections)
+                if key is not None:
+                    cache.put(key, {'detections': detections, 'image_base64': image_base64})
+                yield {'frame_index': frame_index, 'detections': detections,
+                       'image_base64': image_base64, 'status': 'success'}
+            except Exception as e:
+                yield _frame_error(frame_index, e)
+
+    for i, image_data in enumerate(images):
+        key = cached = None
+        try:
+            if not isinstance(image_data, np.ndarray):
+                image_data = _read_frame_bytes(image_data)
+                if cache.enabled:
+                    key = cache.make_key(image_data, *params)
+                    hit = cache.get(key)
+                    # 无检测结果的帧可能没有缓存标注图，此时若需要回传标注图则重新计算
+                    if hit is not None and (hit['image_base64'] is not None or not should_return_image(i, annotate_every)):
+                        if not hit['detections'] and not should_return_image(i, annotate_every):
+                            hit['image_base64'] = None
+                        cached = hit
+            if cached is None:
+                with STAGE_LATENCY.time(pipeline='pavement', stage='decode'):
+                    image_np, scale = decode_frame(image_data)
+        except Exception as e:
+            yield _frame_error(i, ValueError(f"第 {i} 帧不是有效的图像: {e}"))
+            continue
+
+        if cached is not None:
+            pending.append((i, None, None, key, cached, None))
+        else:
+            pending.append((i, image_np, scale, key, None, image_data))
+        if len(pending) >= batch_size:
+            yield from flush()
+            pending = []
+
+    if pending:
+        yield from flush()
+
+
+# ---------------- 跨帧病害跟踪 ----------------
+
+def _box_iou(a: List[float], b: List[float]) -> float:
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter <= 0:
+        return 0.0
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _centroid_distance(a: List[float], b: List[float]) -> float:
+    """两框中心距离，按 a 框对角线长度归一化。"""
+    ax, ay = (a[0] + a[2]) / 2, (a[1] + a[3]) / 2
+    bx, by = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+    diag = max(((a[2] - a[0]) ** 2 + (a[3] - a[1]) ** 2) ** 0.5, 1.0)
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5 / diag
+
+
+class DefectTrack:
+    """一处持续出现的病害：记录首/末帧和置信度最高的一帧（只保留这一帧的标注图）。"""
+
+    def __init__(self, track_id: int, label: str, bbox: List[float], frame_index: int, confidence: float, image):
+        self.track_id = track_id
+        self.last_update = 0  # 最近一次匹配成功时跟踪器的更新序号
+        self.label = label
+        self.bbox = bbox
+        self.first_frame_index = frame_index
+        self.last_frame_index = frame_index
+        self.hits = 1
+        self.best_confidence = confidence
+        self.best_frame_index = frame_index
+        self.best_bbox = bbox
+        self.best_image = image
+
+    def update(self, bbox: List[float], frame_index: int, confidence: float, image):
+        self.bbox = bbox
+        self.last_frame_index = max(self.last_frame_index, frame_index)
+        self.first_frame_index = min(self.first_frame_index, frame_index)
+        self.hits += 1
+        if confidence > self.best_confidence:
+            self.best_confidence = confidence
+            self.best_frame_index = frame_index
+            self.best_bbox = bbox
+            self.best_image = image
+
+
+class DefectTracker:
+    """
+    基于 IoU / 中心点距离的多目标跟踪器，为每处持续出现的病害分配跟踪ID。
+    同类别内按 IoU 从高到低贪心匹配，IoU 不足时退回中心点距离匹配（车辆行驶时病害框会平移）；
+    连续 max_missed 次更新未再出现的轨迹视为结束，由调用方持久化其最佳帧。
+    丢失计数按更新次数而非帧号计算，因此帧号可以是源视频帧号（抽帧后不连续）。
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, centroid_threshold: float = 0.6, max_missed: int = 5):
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold
+        self.max_missed = max_missed
+        self._tracks: Dict[int, DefectTrack] = {}
+        self._next_id = 1
+        self._updates = 0
+
+    @property
+    def active_count(self) -> int:
+        return len(self._tracks)
+
+    def update(self, frame_index: int, detections: List[Dict], image=None) -> List[DefectTrack]:
+        """
+        用一帧的检测结果更新轨迹，并在每个检测结果中写入 track_id。
+        image 为该帧的标注图（仅在成为某条轨迹的最佳帧时被保留）。
+        返回本次结束的轨迹列表。
+        """
+        self._updates += 1
+        candidates = []
+        for t_id, track in self._tracks.items():
+            for d_idx, det in enumerate(detections):
+                if det['class'] != track.label:
+                    continue
+                iou = _box_iou(track.bbox, det['bbox'])
+                if iou >= self.iou_threshold:
+                    candidates.append((1.0 + iou, t_id, d_idx))
+                else:
+                    dist = _centroid_distance(track.bbox, det['bbox'])
+                    if dist <= self.centroid_threshold:
+                        candidates.append((1.0 - dist, t_id, d_idx))
+
+        matched_tracks, matched_dets = set(), set()
+        for _, t_id, d_idx in sorted(candidates, reverse=True):
+            if t_id in matched_tracks or d_idx in matched_dets:
+                continue
+            matched_tracks.add(t_id)
+            matched_dets.add(d_idx)
+            det = detections[d_idx]
+            self._tracks[t_id].update(det['bbox'], frame_index, det['confidence'], image)
+            self._tracks[t_id].last_update = self._updates
+            det['track_id'] = t_id
+
+        for d_idx, det in enumerate(detections):
+            if d_idx in matched_dets:
+                continue
+            track = DefectTrack(self._next_id, det['class'], det['bbox'], frame_index, det['confidence'], image)
+            track.last_update = self._updates
+            self._tracks[track.track_id] = track
+            det['track_id'] = track.track_id
+            self._next_id += 1
+
+        finished = [track for track in self._tracks.values()
+                    if self._updates - track.last_update > self.max_missed]
+        for track in finished:
+            del self._tracks[track.track_id]
+        return finished
+
+    def flush(self) -> List[DefectTrack]:
+        """结束全部轨迹（视频流结束时调用）。"""
+        finished = list(self._tracks.values())
+        self._tracks.clear()
+        return finished
+
+
+def persist_tracks(tracks: List[DefectTrack], video_id: int) -> int:
+    """每条轨迹只保存置信度最高的一帧告警图（交给后台写入线程异步落盘），返回保存的条数。"""
+    saved = 0
+    for track in tracks:
+        if track.best_image is None:
+            continue
+        enqueue_alert_frame('road', track.best_image, track.best_confidence, video_id, track.best_frame_index,
+                            track.label, track_id=track.track_id,
+                            first_frame_index=track.first_frame_index, last_frame_index=track.last_frame_index)
+        saved += 1
+    return saved
+
+
+def _new_alert_video(video_name: str = None, total_frames: int = 0) -> int:
+    """为一次批量/视频文件检测创建告警视频记录及其图片目录。"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    save_dir = Path(f'data/alert_videos/video_{timestamp}')
+    save_dir.mkdir(parents=True, exist_ok=True)
+    video_id = create_alert_video('road', video_name or f'video_{timestamp}', str(save_dir), total_frames, 0, None)
+    register_video_dir(video_id, str(save_dir))
+    return video_id
+
+
+def iter_batch_results(images: Iterable, batch_size: int = DEFAULT_BATCH_SIZE, annotate_every: int = 1,
+                       total_frames: int = 0, summary: Dict = None) -> Iterator[Dict]:
+    """
+    批量检测的流式版本：逐帧产出带 track_id 的检测结果，同时完成病害跟踪与告警持久化。
+    只在内存中保留当前批次和活跃轨迹的最佳帧，内存占用与总帧数无关。
+    summary（可选）在结束时写入 video_id / frame_count / alert_count；
+    调用方提前关闭生成器（如客户端断开）时，已处理部分的轨迹与计数仍会保存。
+    """
+    if get_global_model() is None:
+        raise RuntimeError('模型未加载，无法进行检测')
+
+    video_id = _new_alert_video(total_frames=total_frames)
+    tracker = DefectTracker()
+    frame_count = alert_count = 0
+    if summary is not None:
+        summary['video_id'] = video_id
+    try:
+        for frame_result in iter_batch_detections(images, batch_size, annotate_every):
+            with STAGE_LATENCY.time(pipeline='pavement', stage='persistence'):
+                alert_count += _track_frame_alerts(tracker, frame_result, video_id, annotate_every)
+            frame_count += 1
+            yield frame_result
+    finally:
+        with STAGE_LATENCY.time(pipeline='pavement', stage='persistence'):
+            alert_count += persist_tracks(tracker.flush(), video_id)
+        enqueue_video_counts(video_id, frame_count, alert_count)
+        if summary is not None:
+            summary.update(frame_count=frame_count, alert_count=alert_count)
+
+
+def detect_batch_images(images: List, batch_size: int = DEFAULT_BATCH_SIZE,
+                        annotate_every: int = 1) -> List[Dict]:
     model = get_global_model()
     if model is None:
         return [{'frame_index': i, 'detections': [], 'image_base64': None, 'status': 'error', 'message': '模型未加载'}
-                for i in range(len(base64_images))]
-
-    now = datetime.now()
-    timestamp = now.strftime('%Y%m%d_%H%M%S')
-    save_dir = Path(f'data/alert_videos/video_{timestamp}')
-    save_dir.mkdir(parents=True, exist_ok=True)
-    video_id = create_alert_video('road', f'video_{timestamp}', str(save_dir), len(base64_images), 0, None)
-    alert_count = 0
-    results = []
-
-    for i, base64_str in enumerate(base64_images):
-        try:
-            if not base64_str.startswith('data:image'):
-                raise ValueError(f"第 {i} 帧不是有效的 Base64 图像。")
-
-            _, encoded = base64_str.split(',', 1)
-            image_bytes = base64.b64decode(encoded)
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-            image_np = np.array(image)
-
-            # 使用YOLOv11进行推理，设置置信度阈值，关闭verbose输出
-            result_batch = model(image_np, conf=0.30, verbose=False)
-            detections = []
-
-            for result in result_batch:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # 获取边界框坐标
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        # 获取置信度并转换为Python原生float类型
-                        conf = float(box.conf[0].cpu().numpy().item())
-                        # 获取类别
-                        cls = int(box.cls[0].cpu().numpy().item())
-
-                        # 从模型的类别名称获取标签
-                        label_key = model.names[cls]
-
-                        # 直接使用原始坐标，无需缩放
-                        detections.append({
-                            'class': id2label.get(label_key, label_key),
-                            'confidence': round(conf, 3),
-                            'bbox': [round(float(x1), 2), round(float(y1), 2), round(float(x2), 2), round(float(y2), 2)]
-                        })
-
-            annotated = draw_detections(image.copy(), detections)
-            buffered = io.BytesIO()
-            annotated.save(buffered, format="JPEG")
-            image_base64 = "data:image/jpeg;base64," + base64.b64encode(buffered.getvalue()).decode()
-
-            if detections:
-                alert_count += 1
-                first = detections[0]
-                save_alert_frame('road', video_id, i, image_base64, first['confidence'], first['class'], first['bbox'])
-
-            results.append({'frame_index': i, 'detections': detections, 'image_base64': image_base64})
-
-        except Exception as e:
-            print(f"[ERROR] 批量检测中第 {i} 帧处理失败: {str(e)}")
-            results.append({
-                'frame_index': i,
-                'detections': [],
-                'image_base64': None,
-                'status': 'error',
-                'message': f'第{i}帧处理失败: {str(e)}'
-            })
-
-    update_alert_video('road', video_id, alert_count)
-    return results
\ No newline at end of file
+                for i in range(len(images))]
+    return list(iter_batch_results(images, batch_size, annotate_every, total_frames=len(images)))
+
+
+def _track_frame_alerts(tracker: DefectTracker, frame_result: Dict, video_id: int, annotate_every: int,
+                        frame_index: int = None) -> int:
+    """
+    用该帧检测结果更新病害跟踪，保存已结束轨迹的最佳帧；
+    按 annotate_every 不需要回传的标注图从结果中移除。返回本次保存的告警条数。
+    """
+    if frame_index is None:
+        frame_index = frame_result['frame_index']
+    saved = 0
+    if frame_result.get('status') == 'success':
+        finished = tracker.update(frame_index, frame_result['detections'], frame_result['image_base64'])
+        saved = persist_tracks(finished, video_id)
+    if not should_return_image(frame_result['frame_index'], annotate_every):
+        # 仅检测列表模式：告警帧的标注图只落盘，不回传客户端
+        frame_result['image_base64'] = None
+    return saved
+
+
+def iter_video_file_results(video_path: str, video_name: str, sample_mode: str = SAMPLE_FPS,
+                            target_fps: float = 2.0, stride: int = 10, scene_threshold: float = 0.12,
+                            max_frames: int = None, batch_size: int = DEFAULT_BATCH_SIZE, annotate_every: int = 1,
+                            summary: Dict = None) -> Iterator[Dict]:
+    """
+    服务端视频检测的流式版本：流式解码视频并抽帧，抽出的帧直接送入批量检测引擎，逐帧产出结果。
+    结果中 frame_index 为抽帧序号，source_frame_index / timestamp 对应源视频中的位置。
+    summary（可选）写入 video（源视频信息）/ video_id / frame_count / alert_count。
+    """
+    if get_global_model() is None:
+        raise RuntimeError('模型未加载，无法进行检测')
+
+    info = probe_video(video_path)
+    video_id = _new_alert_video(video_name)
+    if summary is not None:
+        summary.update(video=info, video_id=video_id)
+
+    # 抽帧生成器按顺序产出，记录每个抽帧序号对应的源帧位置
+    positions = {}
+
+    def sampled_frames():
+        frames = iter_video_frames(video_path, sample_mode, target_fps, stride, scene_threshold, max_frames)
+        for ordinal, (source_index, frame_time, frame_rgb) in enumerate(frames):
+            positions[ordinal] = (source_index, frame_time)
+            yield frame_rgb
+
+    tracker = DefectTracker()
+    frame_count = alert_count = 0
+    try:
+        for frame_result in iter_batch_detections(sampled_frames(), batch_size, annotate_every):
+            source_index, frame_time = positions.pop(frame_result['frame_index'], (None, None))
+            frame_result['source_frame_index'] = source_index
+            frame_result['timestamp'] = round(frame_time, 3) if frame_time is not None else None
+            alert_count += _track_frame_alerts(tracker, frame_result, video_id, annotate_every,
+                                               frame_index=source_index)
+            frame_count += 1
+            yield frame_result
+    finally:
+        alert_count += persist_tracks(tracker.flush(), video_id)
+        enqueue_video_counts(video_id, frame_count, alert_count)
+        if summary is not None:
+            summary.update(frame_count=frame_count, alert_count=alert_count)
+
+
+def detect_video_file(video_path: str, video_name: str, sample_mode: str = SAMPLE_FPS, target_fps: float = 2.0,
+                      stride: int = 10, scene_threshold: float = 0.12, max_frames: int = None,
+                      batch_size: int = DEFAULT_BATCH_SIZE, annotate_every: int = 1) -> Dict:
+    """服务端视频检测，一次性返回全部抽帧结果（见 iter_video_file_results）。"""
+    summary = {}
+    frames = list(iter_video_file_results(video_path, video_name, sample_mode, target_fps, stride, scene_threshold,
+                                          max_frames, batch_size, annotate_every, summary))
+    return {'video': summary['video'], 'video_id': summary['video_id'], 'frames': frames}
@@ -0,0 +1,354 @@
+# backend/app/services/pavement_stream_service.py
+"""
+路面检测实时视频流的会话管理
+每个 Socket.IO 客户端（sid）拥有独立的会话：独立的帧/告警计数、有界输入队列和专属工作线程，
+多个摄像头同时推流时互不干扰，也不会阻塞 Socket.IO 的事件循环。
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from .pavement_service import (detect_single_image, should_return_image, resolve_annotate_every,
+                               resolve_skip_threshold, DefectTracker, FrameSkipGate, persist_tracks,
+                               RENDER_ALWAYS, RENDER_DETECTIONS)
+from .alert_service import create_alert_video
+from .quality_controller import pavement_quality_controller
+from .alert_writer import enqueue_video_counts, register_video_dir
+from ..utils.logger import get_logger
+from ..utils.metrics import FRAMES_DROPPED
+
+logger = get_logger(__name__)
+
+# 队列中表示“视频流结束”的标记
+_STREAM_END = object()
+
+
+class PavementStreamSession:
+    """
+    单个客户端的路面检测会话。
+    - realtime=True（默认）：队列满时丢弃最旧的帧（latest-frame-wins），保证实时画面不积压；
+    - realtime=False：队列满时阻塞提交方，逐帧无损处理（离线视频分析）。
+    - annotate_every=N：每 N 帧回传一次标注图，0 表示只回传检测列表（标注图仍会为告警帧生成并落盘）。
+    同一处病害在连续帧中由 DefectTracker 归为一条轨迹，只在轨迹结束时保存置信度最高的一帧，
+    alert_count 即为该视频中不同病害的数量。
+    - skip_threshold：近重复帧过滤阈值（见 FrameSkipGate），客户端可在帧数据中按会话调整，0 表示关闭。
+    - target_latency_ms：自适应画质的延迟目标（见 AdaptiveQualityController），0 表示关闭。
+      降档时推理输入尺寸、标注图回传间隔和跳过阈值取档位值与客户端设置中更省资源的一方，
+      档位变化时发送 stream_control 事件告知客户端建议的采集分辨率与 JPEG 质量。
+    """
+
+    def __init__(self, sid: str, app, emit_fn: Callable[[str, Dict], None],
+                 max_queue: int = 4, max_in_flight: int = 2, skip_threshold: float = 0.0,
+                 target_latency_ms: float = 0.0):
+        self.sid = sid
+        self._app = app
+        self._emit = emit_fn
+        self.max_queue = max(1, int(max_queue))
+        self.realtime = True
+        self.annotate_every = 1
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._draining = False  # 处理结束标记时，等待在途帧全部完成
+        self._in_flight = 0
+        self._sequence = 0  # 客户端未提供 frame_index 时使用的自增序号
+
+        # 会话级状态（受 _state_lock 保护）
+        self._state_lock = threading.Lock()
+        self.video_id = None
+        self.frame_count = 0
+        self.alert_count = 0
+        self.dropped_count = 0
+        self.tracker = DefectTracker()
+        self.skip_gate = FrameSkipGate(skip_threshold)
+        self.base_skip_threshold = self.skip_gate.threshold  # 客户端/配置设定的阈值，降档时在此基础上提高
+        self.quality = pavement_quality_controller(target_latency_ms)
+
+        self._workers = []
+        for i in range(max(1, int(max_in_flight))):
+            worker = threading.Thread(target=self._run, name=f'pavement-stream-{sid}-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    # ---------------- 提交端（Socket.IO 事件线程） ----------------
+
+    def submit(self, data: Dict):
+        """将一帧放入会话队列，返回后立即释放事件处理线程。"""
+        if 'realtime' in data:
+            self.realtime = bool(data.get('realtime'))
+        if 'mode' in data or 'annotate_every' in data:
+            try:
+                self.annotate_every = resolve_annotate_every(data.get('mode'), data.get('annotate_every'))
+            except ValueError as e:
+                self._reject(data, str(e))
+                return
+        if data.get('skip_threshold') is not None:
+            try:
+                self.base_skip_threshold = resolve_skip_threshold(data['skip_threshold'])
+            except ValueError as e:
+                self._reject(data, str(e))
+                return
+            self.skip_gate.threshold = self.base_skip_threshold
+
+        dropped = None
+        with self._cond:
+            if self._closed:
+                return
+            # 记录到达时间，端到端延迟包含排队等待
+            data = dict(data, _received_at=time.perf_counter())
+            if data.get('frame_index') is None:
+                data['frame_index'] = self._sequence
+            self._sequence += 1
+
+            if self.realtime:
+                # 背压时丢弃最旧的一帧，保留最新画面
+                if len(self._queue) >= self.max_queue:
+                    dropped = self._pop_oldest_frame()
+            else:
+                while len(self._queue) >= self.max_queue and not self._closed:
+                    self._cond.wait()
+            self._queue.append(data)
+            self._cond.notify_all()
+
+        if dropped is not None:
+            with self._state_lock:
+                self.dropped_count += 1
+            FRAMES_DROPPED.inc()
+            logger.info(f"会话 {self.sid} 队列已满，丢弃第 {dropped.get('frame_index')} 帧")
+            self._emit('frame_dropped', {'frame_index': dropped.get('frame_index')})
+
+    def _reject(self, data: Dict, message: str):
+        """帧参数非法：不进入队列，直接回送错误结果，会话保持原有设置。"""
+        logger.warning(f"会话 {self.sid} 收到非法帧参数: {message}")
+        self._emit('frame_result', {'status': 'error', 'message': message, 'detections': [], 'annotated_image': None,
+                                    'frame_index': data.get('frame_index')})
+
+    def end_stream(self):
+        """视频流结束：在队列中排入结束标记，待此前的帧处理完后重置会话状态。"""
+        with self._cond:
+            if self._closed:
+                return
+            self._queue.append(_STREAM_END)
+            self._cond.notify_all()
+
+    def close(self):
+        """客户端断开：丢弃未处理的帧、停止工作线程，并保存仍在跟踪中的病害。"""
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cond.notify_all()
+        try:
+            with self._app.app_context():
+                self._finish_tracks()
+        except Exception as e:
+            logger.error(f"会话 {self.sid} 关闭时保存病害轨迹失败: {e}", exc_info=True)
+
+    def stats(self) -> Dict:
+        with self._state_lock:
+            stats = {
+                'frame_count': self.frame_count,
+                'alert_count': self.alert_count,
+                'active_tracks': self.tracker.active_count,
+                'dropped_count': self.dropped_count,
+                'queue_size': len(self._queue),
+            }
+        stats.update(self.skip_gate.stats())
+        if self.quality is not None:
+            stats.update(self.quality.stats())
+        return stats
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._queue)
+
+    def _pop_oldest_frame(self):
+        for item in self._queue:
+            if item is not _STREAM_END:
+                self._queue.remove(item)
+                return item
+        return None
+
+    # ---------------- 工作线程 ----------------
+
+    def _next_item(self):
+        with self._cond:
+            while not self._closed and (self._draining or not self._queue):
+                self._cond.wait()
+            if self._closed:
+                return None
+            item = self._queue.popleft()
+            if item is _STREAM_END:
+                self._draining = True
+                while self._in_flight > 0 and not self._closed:
+                    self._cond.wait()
+            else:
+                self._in_flight += 1
+            self._cond.notify_all()
+            return item
+
+    def _run(self):
+        while True:
+            item = self._next_item()
+            if item is None:
+                return
+            if item is _STREAM_END:
+                try:
+                    with self._app.app_context():
+                        self._reset_stream()
+                except Exception as e:
+                    logger.error(f"会话 {self.sid} 结束视频流时保存病害轨迹失败: {e}", exc_info=True)
+                with self._cond:
+                    self._draining = False
+                    self._cond.notify_all()
+                continue
+            try:
+                with self._app.app_context():
+                    self._process_frame(item)
+            except Exception as e:
+                logger.exception(f"处理视频帧时发生未预期错误: {str(e)}")
+                self._emit('frame_result', {'status': 'error', 'message': f'处理失败: {str(e)}',
+                                            'detections': [], 'annotated_image': None,
+                                            'frame_index': item.get('frame_index')})
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _ensure_video(self) -> int:
+        """首帧时创建告警视频记录（每个视频流仅执行一次）。"""
+        with self._state_lock:
+            if self.video_id is None:
+                logger.info(f"会话 {self.sid} 检测到第一帧，执行首次初始化操作。")
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                save_dir = Path(f'data/alert_videos/pavement/video_{timestamp}_{self.sid[:8]}')
+                save_dir.mkdir(parents=True, exist_ok=True)
+                self.video_id = create_alert_video('road', f'video_{timestamp}', str(save_dir), 0, 0)
+                register_video_dir(self.video_id, str(save_dir))
+                self.frame_count = 0
+                self.alert_count = 0
+                self.tracker = DefectTracker()
+            return self.video_id
+
+    def _effective_settings(self):
+        """按当前画质档位计算 (推理输入尺寸, 标注图回传间隔)，并同步跳过阈值。"""
+        if self.quality is None:
+            return None, self.annotate_every
+        settings = self.quality.settings
+        self.skip_gate.threshold = max(self.base_skip_threshold, settings['skip_threshold']) \
+            if self.base_skip_threshold > 0 else 0.0
+        annotate_every = self.annotate_every
+        if annotate_every > 0:
+            annotate_every = max(annotate_every, settings['annotate_every'])
+        return settings['imgsz'], annotate_every
+
+    def _observe_latency(self, data: Dict):
+        """记录该帧的端到端延迟；档位变化（或会话首帧）时发送 stream_control。"""
+        if self.quality is None:
+            return
+        latency_ms = (time.perf_counter() - data['_received_at']) * 1000
+        if self.quality.observe(latency_ms):
+            payload = self.quality.control_payload()
+            logger.info(f"会话 {self.sid} 平滑延迟 {payload['latency_ms']}ms，画质档位为第 {payload['level']} 档")
+            self._emit('stream_control', payload)
+
+    def _process_frame(self, data: Dict):
+        frame_index = data.get('frame_index')
+        video_id = self._ensure_video()
+
+        imgsz, annotate_every = self._effective_settings()
+        return_image = should_return_image(frame_index, annotate_every)
+        result = detect_single_image(data.get('image'), render=RENDER_ALWAYS if return_image else RENDER_DETECTIONS,
+                                     skip_gate=self.skip_gate, imgsz=imgsz)
+        result['frame_index'] = frame_index
+
+        detections = result.get('detections', [])
+        finished = []
+        with self._state_lock:
+            self.frame_count += 1
+            if result.get('status') == 'success':
+                # 跟踪器会在每个检测结果中写入 track_id，随结果一并发回客户端
+                finished = self.tracker.update(frame_index, detections, result.get('annotated_image'))
+
+        payload = result if return_image else dict(result, annotated_image=None)
+        self._emit('frame_result', payload)
+        self._observe_latency(data)
+
+        if result.get('status') == 'success':
+            logger.info(f"会话 {self.sid} 第 {frame_index} 帧检测完成，检测到 {len(detections)} 个对象。")
+        else:
+            logger.warning(f"视频帧检测失败: {result.get('message')}")
+
+        saved = persist_tracks(finished, video_id)
+        with self._state_lock:
+            self.alert_count += saved
+            frame_count, alert_count = self.frame_count, self.alert_count
+        # 计数更新由后台写入线程按视频合并，不再每帧提交一次
+        enqueue_video_counts(video_id, frame_count, alert_count)
+
+    def _finish_tracks(self):
+        """结束当前视频的全部病害轨迹并保存其最佳帧。"""
+        with self._state_lock:
+            video_id = self.video_id
+            finished = self.tracker.flush()
+        if video_id is None:
+            return
+        saved = persist_tracks(finished, video_id)
+        with self._state_lock:
+            self.alert_count += saved
+            frame_count, alert_count = self.frame_count, self.alert_count
+        if saved:
+            enqueue_video_counts(video_id, frame_count, alert_count)
+
+    def _reset_stream(self):
+        logger.info(f"会话 {self.sid} 视频流处理完成。")
+        self._finish_tracks()
+        self._emit('stream_stats', self.stats())
+        with self._state_lock:
+            self.video_id = None
+            self.frame_count = 0
+            self.alert_count = 0
+
+
+class PavementSessionManager:
+    """按 sid 管理路面检测会话。"""
+
+    def __init__(self):
+        self._sessions: Dict[str, PavementStreamSession] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, sid: str, app, emit_fn: Callable[[str, Dict], None],
+                      max_queue: int = 4, max_in_flight: int = 2, skip_threshold: float = 0.0,
+                      target_latency_ms: float = 0.0) -> PavementStreamSession:
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                session = PavementStreamSession(sid, app, emit_fn, max_queue, max_in_flight, skip_threshold,
+                                                target_latency_ms)
+                self._sessions[sid] = session
+                logger.info(f"创建路面检测会话: {sid}")
+            return session
+
+    def session_count(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def queued_frames(self) -> int:
+        """所有会话排队等待处理的帧数之和。"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return sum(session.queue_size for session in sessions)
+
+    def get(self, sid: str) -> Optional[PavementStreamSession]:
+        with self._lock:
+            return self._sessions.get(sid)
+
+    def close(self, sid: str):
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        if session is not None:
+            session.close()
+            logger.info(f"关闭路面检测会话: {sid}")
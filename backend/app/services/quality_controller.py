@@ -0,0 +1,134 @@
+# backend/app/services/quality_controller.py
+"""
+实时视频流的自适应画质控制
+每个客户端会话一个控制器：持续观察端到端延迟（服务端收到帧到结果发出，含排队时间），
+平滑后的延迟持续高于目标时逐级降档（减小推理输入尺寸、降低标注图回传频率、提高近重复帧跳过阈值），
+持续低于目标时逐级恢复；档位变化时通过 stream_control 事件告知客户端建议的采集分辨率与 JPEG 质量，
+让共享 CPU 服务器上的多路实时画面保持响应，而不是延迟无限增长。
+"""
+import threading
+from typing import Dict, Optional, Sequence
+
+from ..utils.metrics import REGISTRY
+
+QUALITY_CHANGES = REGISTRY.counter('stream_quality_changes_total', '实时流自适应画质档位调整次数',
+                                   ('pipeline', 'direction'))
+
+# 路面检测档位：imgsz 为 None 表示使用模型默认输入尺寸；annotate_every / skip_threshold 为下限，
+# 客户端自己要求的更稀疏的回传或更高的跳过阈值保持不变
+PAVEMENT_LEVELS = (
+    {'imgsz': None, 'annotate_every': 1, 'skip_threshold': 0.0, 'capture_width': 1280, 'capture_height': 720, 'jpeg_quality': 0.8},
+    {'imgsz': 512, 'annotate_every': 2, 'skip_threshold': 0.015, 'capture_width': 960, 'capture_height': 540, 'jpeg_quality': 0.7},
+    {'imgsz': 416, 'annotate_every': 3, 'skip_threshold': 0.02, 'capture_width': 854, 'capture_height': 480, 'jpeg_quality': 0.6},
+    {'imgsz': 320, 'annotate_every': 5, 'skip_threshold': 0.03, 'capture_width': 640, 'capture_height': 360, 'jpeg_quality': 0.5},
+)
+
+# 人脸识别档位：decode_min_side 为 None 表示使用配置 FACE_DECODE_MIN_SIDE；
+# frame_interval_ms 为建议客户端两次提交之间的最小间隔（人脸识别由客户端逐帧等待结果，跳帧在客户端完成）
+FACE_LEVELS = (
+    {'decode_min_side': None, 'frame_interval_ms': 0, 'capture_width': 1280, 'capture_height': 720, 'jpeg_quality': 0.85},
+    {'decode_min_side': 720, 'frame_interval_ms': 100, 'capture_width': 960, 'capture_height': 540, 'jpeg_quality': 0.75},
+    {'decode_min_side': 540, 'frame_interval_ms': 250, 'capture_width': 640, 'capture_height': 480, 'jpeg_quality': 0.65},
+    {'decode_min_side': 480, 'frame_interval_ms': 500, 'capture_width': 640, 'capture_height': 360, 'jpeg_quality': 0.6},
+)
+
+
+class AdaptiveQualityController:
+    """
+    按延迟目标在若干画质档位间切换（档位 0 为最高画质）。
+    - 延迟用指数滑动平均（alpha）平滑，避免单帧抖动引起频繁切换；
+    - 平滑延迟连续 degrade_after 帧高于 target_ms * degrade_ratio 时降一档，
+      连续 recover_after 帧低于 target_ms * recover_ratio 时升一档（恢复比降档更保守）；
+    - 每次切换后重新计数，给新档位留出生效时间。
+    """
+
+    def __init__(self, pipeline: str, levels: Sequence[Dict], target_ms: float = 200.0, alpha: float = 0.2,
+                 degrade_ratio: float = 1.25, recover_ratio: float = 0.6,
+                 degrade_after: int = 3, recover_after: int = 15):
+        if not levels:
+            raise ValueError("画质档位不能为空")
+        self.pipeline = pipeline
+        self.levels = tuple(levels)
+        self.target_ms = float(target_ms)
+        self.alpha = alpha
+        self.degrade_ratio = degrade_ratio
+        self.recover_ratio = recover_ratio
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.level = 0
+        self.latency_ms: Optional[float] = None
+        self.changes = 0
+        self._over = 0
+        self._under = 0
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> Dict:
+        """当前档位的参数。"""
+        return self.levels[self.level]
+
+    def observe(self, latency_ms: float) -> bool:
+        """记录一帧的端到端延迟（毫秒）。首次观测或档位发生变化时返回 True，调用方据此发送 stream_control。"""
+        with self._lock:
+            if self.latency_ms is None:
+                self.latency_ms = float(latency_ms)
+                return True
+            self.latency_ms += self.alpha * (float(latency_ms) - self.latency_ms)
+
+            if self.latency_ms > self.target_ms * self.degrade_ratio:
+                self._over += 1
+                self._under = 0
+            elif self.latency_ms < self.target_ms * self.recover_ratio:
+                self._under += 1
+                self._over = 0
+            else:
+                self._over = self._under = 0
+
+            if self._over >= self.degrade_after and self.level < len(self.levels) - 1:
+                return self._switch(self.level + 1, 'down')
+            if self._under >= self.recover_after and self.level > 0:
+                return self._switch(self.level - 1, 'up')
+            return False
+
+    def _switch(self, level: int, direction: str) -> bool:
+        self.level = level
+        self.changes += 1
+        self._over = self._under = 0
+        QUALITY_CHANGES.inc(pipeline=self.pipeline, direction=direction)
+        return True
+
+    def control_payload(self) -> Dict:
+        """stream_control 事件内容：当前档位、延迟以及建议客户端采用的采集分辨率与 JPEG 质量。"""
+        with self._lock:
+            settings = self.settings
+            payload = {
+                'pipeline': self.pipeline,
+                'level': self.level,
+                'max_level': len(self.levels) - 1,
+                'target_latency_ms': self.target_ms,
+                'latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+                'capture_width': settings['capture_width'],
+                'capture_height': settings['capture_height'],
+                'jpeg_quality': settings['jpeg_quality'],
+            }
+            if 'frame_interval_ms' in settings:
+                payload['frame_interval_ms'] = settings['frame_interval_ms']
+            return payload
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'quality_level': self.level,
+                'quality_changes': self.changes,
+                'latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            }
+
+
+def pavement_quality_controller(target_ms: float) -> Optional[AdaptiveQualityController]:
+    """创建路面检测会话的控制器，target_ms <= 0 表示关闭自适应。"""
+    return AdaptiveQualityController('pavement', PAVEMENT_LEVELS, target_ms) if target_ms > 0 else None
+
+
+def face_quality_controller(target_ms: float) -> Optional[AdaptiveQualityController]:
+    """创建人脸识别会话的控制器，target_ms <= 0 表示关闭自适应。"""
+    return AdaptiveQualityController('face', FACE_LEVELS, target_ms) if target_ms > 0 else None
@@ -0,0 +1,99 @@
+# backend/app/services/video_ingest_service.py
+"""
+服务端视频解码与抽帧
+使用 cv2.VideoCapture 流式读取视频文件，按目标帧率 / 固定步长 / 场景变化抽取帧，
+整段视频不会一次性载入内存。不需要的帧只 grab() 不 retrieve()：FFmpeg 后端下 grab() 仍会解码该帧
+（帧间压缩的视频无法跳过解码），省下的只是 retrieve() 中的像素格式转换与拷贝。
+"""
+from typing import Dict, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+SAMPLE_FPS = 'fps'
+SAMPLE_STRIDE = 'stride'
+SAMPLE_SCENE = 'scene'
+SAMPLE_MODES = (SAMPLE_FPS, SAMPLE_STRIDE, SAMPLE_SCENE)
+
+# 场景变化检测时使用的缩略图尺寸
+_SCENE_THUMB_SIZE = (64, 36)
+
+
+def probe_video(video_path: str) -> Dict:
+    """读取视频的基本信息（帧率、总帧数、分辨率）。"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("无法打开视频文件")
+    try:
+        return {
+            'fps': float(cap.get(cv2.CAP_PROP_FPS) or 0.0),
+            'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0),
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0),
+        }
+    finally:
+        cap.release()
+
+
+def _scene_thumb(frame_bgr: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, _SCENE_THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def iter_video_frames(video_path: str, mode: str = SAMPLE_FPS, target_fps: float = 2.0, stride: int = 10,
+                      scene_threshold: float = 0.12, max_frames: Optional[int] = None
+                      ) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    流式抽帧生成器，逐个产出 (源视频帧序号, 时间戳秒, RGB numpy 数组)。
+    - fps：按 target_fps 均匀抽帧（源帧率未知时按 25fps 估计）；
+    - stride：每 stride 帧取一帧；
+    - scene：与上一张抽取帧的缩略灰度图平均差异超过 scene_threshold（0~1）时取帧，首帧总是保留。
+    """
+    if mode not in SAMPLE_MODES:
+        raise ValueError(f"不支持的抽帧方式: {mode}")
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("无法打开视频文件")
+
+    source_fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0) or 25.0
+    if mode == SAMPLE_FPS:
+        if target_fps <= 0:
+            raise ValueError("target_fps 必须大于 0")
+        step = max(source_fps / target_fps, 1.0)
+    elif mode == SAMPLE_STRIDE:
+        if stride <= 0:
+            raise ValueError("stride 必须为正整数")
+        step = float(stride)
+    else:
+        step = 1.0
+
+    frame_index = -1
+    next_keep = 0.0
+    emitted = 0
+    last_thumb = None
+    try:
+        while max_frames is None or emitted < max_frames:
+            # grab() 仍会解码（FFmpeg 后端），跳过的帧只省去 retrieve() 的颜色转换与拷贝
+            if not cap.grab():
+                break
+            frame_index += 1
+            if mode != SAMPLE_SCENE and frame_index < next_keep:
+                continue
+
+            ok, frame_bgr = cap.retrieve()
+            if not ok or frame_bgr is None:
+                continue
+
+            if mode == SAMPLE_SCENE:
+                thumb = _scene_thumb(frame_bgr)
+                if last_thumb is not None and float(np.mean(np.abs(thumb - last_thumb))) / 255.0 < scene_threshold:
+                    continue
+                last_thumb = thumb
+            else:
+                next_keep += step
+
+            emitted += 1
+            yield frame_index, frame_index / source_fps, cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+    finally:
+        cap.release()
@@ -4,6 +4,8 @@ AES加密解密工具模块
 """
 import os
 import base64
+import hashlib
+import hmac
 import numpy as np
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
@@ -66,6 +68,18 @@ class AESEncryption:
             logger.error(f"解密失败: {e}")
             raise
     
+    def new_cbc_cipher(self, iv: bytes):
+        """
+        以派生密钥和指定 IV 创建 AES-CBC 加解密对象，用于整块大数据（如人脸库快照）一次性加解密。
+        调用方负责保证数据长度为 16 的倍数，可通过 output 参数直接解密到预先分配的缓冲区。
+        """
+        return AES.new(self.derived_key, AES.MODE_CBC, iv)
+
+    def new_mac(self):
+        """以派生密钥导出的独立密钥创建 HMAC-SHA256，用于校验加密文件未被篡改或使用了不同的密钥。"""
+        mac_key = hashlib.sha256(self.derived_key + b'face-gallery-mac').digest()
+        return hmac.new(mac_key, digestmod=hashlib.sha256)
+
     def encrypt_numpy_array(self, array: np.ndarray) -> str:
         """
         加密numpy数组
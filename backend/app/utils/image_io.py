@@ -0,0 +1,111 @@
+# backend/app/utils/image_io.py
+"""
+统一的图像输入层
+所有入口（Socket.IO 事件、REST JSON、multipart 文件）接收到的图像都经过这里转换为原始字节，
+既兼容 data:image/...;base64, 字符串，也支持直接传输 JPEG/PNG 二进制，省去 base64 的体积膨胀与额外解码拷贝。
+"""
+import base64
+import binascii
+import io
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def read_image_bytes(payload) -> bytes:
+    """
+    将各种形式的图像载荷转换为原始图像字节。
+    支持：data URL 字符串、裸 base64 字符串、bytes/bytearray/memoryview（Socket.IO 二进制附件）、
+    以及带 read() 的文件对象（如 werkzeug 的 FileStorage）。
+    """
+    if payload is None:
+        raise ValueError("图像数据为空")
+    if isinstance(payload, (bytes, bytearray)):
+        data = bytes(payload)
+    elif isinstance(payload, memoryview):
+        data = payload.tobytes()
+    elif isinstance(payload, str):
+        encoded = payload.split(',', 1)[1] if payload.startswith('data:') else payload
+        try:
+            data = base64.b64decode(encoded)
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"不是有效的 Base64 图像格式: {e}")
+    elif hasattr(payload, 'read'):
+        data = payload.read()
+    else:
+        raise ValueError(f"不支持的图像数据类型: {type(payload).__name__}")
+
+    if not data:
+        raise ValueError("图像数据为空")
+    return data
+
+
+def decode_rgb(payload) -> np.ndarray:
+    """解码为可写的 RGB numpy 数组（PIL 解码，路面检测使用）。"""
+    image = Image.open(io.BytesIO(read_image_bytes(payload))).convert("RGB")
+    return np.array(image)
+
+
+def decode_bgr(payload):
+    """解码为 BGR numpy 数组（OpenCV 解码，人脸识别/活体检测使用），解码失败返回 None。"""
+    nparr = np.frombuffer(read_image_bytes(payload), np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+# ---------------- 降分辨率解码 ----------------
+# JPEG 可以在 DCT 域直接按 1/2、1/4、1/8 缩小解码，解码耗时和内存都随之下降。
+# 以下函数返回 (图像, (sx, sy))，sx/sy 为原图与解码图的尺寸比，检测坐标乘以它即可还原到原图。
+
+_CV2_REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def is_jpeg(data: bytes) -> bool:
+    return data[:3] == b'\xff\xd8\xff'
+
+
+def reduction_factor(width: int, height: int, min_side: Optional[int]) -> int:
+    """在 1/2/4/8 中选取最大的缩小倍数，使解码后的长边不小于 min_side。"""
+    if not min_side or min_side <= 0:
+        return 1
+    factor = 1
+    while factor < 8 and max(width, height) / (factor * 2) >= min_side:
+        factor *= 2
+    return factor
+
+
+def decode_rgb_reduced(payload, min_side: Optional[int],
+                       keep_full: Callable[[int, int], bool] = None) -> Tuple[np.ndarray, Tuple[float, float]]:
+    """
+    按目标尺寸降分辨率解码为 RGB 数组（PIL draft），长边不小于 min_side。
+    只对 JPEG 生效；keep_full(width, height) 返回 True 时按原分辨率解码（如需要切片推理的高分辨率图像）。
+    """
+    image = Image.open(io.BytesIO(read_image_bytes(payload)))
+    width, height = image.size
+    if image.format == 'JPEG' and not (keep_full and keep_full(width, height)):
+        factor = reduction_factor(width, height, min_side)
+        if factor > 1:
+            image.draft('RGB', (width // factor, height // factor))
+    rgb = np.array(image.convert("RGB"))
+    return rgb, (width / rgb.shape[1], height / rgb.shape[0])
+
+
+def decode_bgr_reduced(payload, min_side: Optional[int]) -> Tuple[Optional[np.ndarray], Tuple[float, float]]:
+    """按目标尺寸降分辨率解码为 BGR 数组（cv2.IMREAD_REDUCED_*），解码失败返回 (None, (1, 1))。"""
+    data = read_image_bytes(payload)
+    flag = cv2.IMREAD_COLOR
+    size = None
+    if min_side and is_jpeg(data):
+        try:
+            size = Image.open(io.BytesIO(data)).size  # 只解析文件头
+        except Exception:
+            size = None
+        if size is not None:
+            flag = _CV2_REDUCED_FLAGS.get(reduction_factor(size[0], size[1], min_side), cv2.IMREAD_COLOR)
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if image is None:
+        return None, (1.0, 1.0)
+    if flag == cv2.IMREAD_COLOR:
+        return image, (1.0, 1.0)
+    return image, (size[0] / image.shape[1], size[1] / image.shape[0])
@@ -0,0 +1,238 @@
+# backend/app/utils/metrics.py
+"""
+进程内指标注册表（Prometheus 文本格式）
+提供 Counter / Gauge / Histogram 三种指标，由 /metrics 路由统一导出，供 Prometheus 抓取后做看板与告警。
+常用指标在本模块末尾集中定义，业务模块直接导入使用，避免各处重复注册。
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# 默认延迟分桶（秒），覆盖 1ms ~ 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.label_names}，实际为 {tuple(labels)}")
+        return tuple(labels[name] for name in self.label_names)
+
+    def _header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数器。"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        lines = self._header()
+        lines.extend(f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                     for key, value in items)
+        return lines
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值；也可以用 track() 注册回调，在抓取时读取（如队列长度）。"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, label_names)
+        self._callbacks: Dict[Tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def track(self, fn: Callable[[], float], **labels):
+        """抓取时调用 fn() 获取当前值。"""
+        key = self._key(labels)
+        with self._lock:
+            self._callbacks[key] = fn
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = dict(self._values)
+            callbacks = list(self._callbacks.items())
+        for key, fn in callbacks:
+            try:
+                items[key] = float(fn())
+            except Exception:
+                continue
+        lines = self._header()
+        lines.extend(f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                     for key, value in items.items())
+        return lines
+
+
+class Histogram(_Metric):
+    """分桶直方图，用于延迟分布（单位：秒）。"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：with HISTOGRAM.time(stage='decode'): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state['counts']), state['sum'], state['count']) for key, state in self._values.items()]
+        lines = self._header()
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, label_names, **kwargs)
+            elif not isinstance(metric, cls) or metric.label_names != tuple(label_names):
+                raise ValueError(f"指标 {name} 已以不同的类型或标签注册")
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+def instrument_sqlalchemy():
+    """监听所有 SQLAlchemy 会话的提交，记录提交耗时。"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    @event.listens_for(Session, 'before_commit')
+    def _before_commit(session):
+        session.info['_metrics_commit_start'] = time.perf_counter()
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(session):
+        start = session.info.pop('_metrics_commit_start', None)
+        if start is not None:
+            DB_COMMIT_LATENCY.observe(time.perf_counter() - start)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _after_rollback(session):
+        session.info.pop('_metrics_commit_start', None)
+
+
+# ---------------- 常用指标 ----------------
+
+HTTP_REQUESTS = REGISTRY.counter('http_requests_total', 'HTTP 请求数', ('method', 'endpoint', 'status'))
+HTTP_LATENCY = REGISTRY.histogram('http_request_duration_seconds', 'HTTP 请求处理耗时', ('method', 'endpoint'))
+SOCKET_EVENTS = REGISTRY.counter('socketio_events_total', 'Socket.IO 事件数', ('event',))
+STAGE_LATENCY = REGISTRY.histogram('pipeline_stage_duration_seconds', '检测流水线各阶段耗时',
+                                   ('pipeline', 'stage'))
+QUEUE_DEPTH = REGISTRY.gauge('queue_depth', '内部队列当前长度', ('queue',))
+FRAMES_DROPPED = REGISTRY.counter('pavement_frames_dropped_total', '实时路面检测因背压丢弃的帧数')
+FRAMES_SKIPPED = REGISTRY.counter('pavement_frames_skipped_total', '近重复帧过滤跳过推理的帧数')
+MODEL_LOAD_SECONDS = REGISTRY.gauge('model_load_seconds', '模型加载耗时（不含预热）', ('model',))
+MODEL_WARMUP_SECONDS = REGISTRY.gauge('model_warmup_seconds', '模型预热（首次推理）耗时', ('model',))
+DB_COMMIT_LATENCY = REGISTRY.histogram('db_commit_duration_seconds', '数据库提交耗时')
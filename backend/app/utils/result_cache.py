@@ -0,0 +1,158 @@
+# backend/app/utils/result_cache.py
+"""
+按内容哈希缓存推理结果
+同一张图片被重复上传（前端重试、用户重复提交）时直接返回上一次的检测/识别结果，不再重复推理。
+键为图像原始字节的 blake2b 摘要加上模型版本、阈值等影响结果的参数；
+容量同时受条目数和估算内存限制（LRU 淘汰），条目超过 TTL 自动失效；
+模型权重或人脸库变化时由调用方 clear() 整体失效。
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from .metrics import REGISTRY
+
+_CACHE_HITS = REGISTRY.counter('result_cache_hits_total', '推理结果缓存命中次数', ('cache',))
+_CACHE_MISSES = REGISTRY.counter('result_cache_misses_total', '推理结果缓存未命中次数', ('cache',))
+_CACHE_BYTES = REGISTRY.gauge('result_cache_bytes', '推理结果缓存估算占用内存', ('cache',))
+_CACHE_ENTRIES = REGISTRY.gauge('result_cache_entries', '推理结果缓存条目数', ('cache',))
+_CACHE_HIT_RATIO = REGISTRY.gauge('result_cache_hit_ratio', '推理结果缓存命中率（进程启动以来）', ('cache',))
+
+
+def _estimate_size(value) -> int:
+    """粗略估算结果对象占用的字节数（字符串/字节按长度计，其余按固定开销计）。"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value) + 48
+    if isinstance(value, dict):
+        return 64 + sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(_estimate_size(v) for v in value)
+    return 24
+
+
+class ResultCache:
+    def __init__(self, name: str, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024, ttl: float = 600.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (过期时间, 估算大小, 值)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        _CACHE_BYTES.track(lambda: self._bytes, cache=name)
+        _CACHE_ENTRIES.track(lambda: len(self._entries), cache=name)
+        _CACHE_HIT_RATIO.track(lambda: self.stats()['hit_rate'], cache=name)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def configure(self, max_entries: int = None, max_bytes: int = None, ttl: float = None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = int(max_entries)
+            if max_bytes is not None:
+                self.max_bytes = int(max_bytes)
+            if ttl is not None:
+                self.ttl = float(ttl)
+            self._evict()
+
+    @staticmethod
+    def make_key(data: bytes, *params) -> str:
+        """图像字节摘要 + 影响结果的参数（模型版本、阈值等）。"""
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        return digest + '|' + '|'.join(str(p) for p in params)
+
+    def get(self, key: str):
+        """命中时返回结果的深拷贝（调用方可以放心修改），未命中或已过期返回 None。"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                _CACHE_MISSES.inc(cache=self.name)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _CACHE_HITS.inc(cache=self.name)
+            value = entry[2]
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value):
+        if not self.enabled:
+            return
+        value = copy.deepcopy(value)
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+
+
+_caches: Dict[str, ResultCache] = {}
+_caches_lock = threading.Lock()
+_cache_defaults: Dict = {}
+
+
+def get_result_cache(name: str) -> ResultCache:
+    """按名称获取（不存在时创建）结果缓存，如 'pavement'、'face'。"""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = ResultCache(name, **_cache_defaults)
+        return cache
+
+
+def configure_result_caches(max_entries: int = None, max_bytes: int = None, ttl: float = None):
+    """统一设置所有结果缓存（含之后创建的）的容量与 TTL，max_entries 为 0 表示关闭缓存。"""
+    with _caches_lock:
+        for key, value in (('max_entries', max_entries), ('max_bytes', max_bytes), ('ttl', ttl)):
+            if value is not None:
+                _cache_defaults[key] = value
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.configure(max_entries, max_bytes, ttl)
+
+
+def result_cache_stats() -> Dict[str, Dict]:
+    with _caches_lock:
+        caches = list(_caches.items())
+    return {name: cache.stats() for name, cache in caches}
@@ -0,0 +1,105 @@
+# backend/app/utils/upload_images.py
+"""
+批量图片上传的输入源
+multipart 上传的文件由 werkzeug 写入临时文件（超过阈值即落盘），这里只保存文件对象，
+在检测引擎需要下一帧时才读取对应图片的字节，整批图片不会同时驻留内存。
+支持两种形式：多个图片文件（按上传顺序），或单个 zip / tar（含 .tar.gz 等）压缩包：
+zip 可随机访问，按成员路径排序；tar 按成员在包内的顺序（压缩的 tar 只能顺序解压，见 _open_archive）。
+"""
+import tarfile
+import zipfile
+from pathlib import PurePosixPath
+from typing import Iterator, List
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+class UploadError(ValueError):
+    """上传内容不合法（格式不支持、图片过多或单张过大）。"""
+
+
+def is_archive(filename: str) -> bool:
+    return bool(filename) and filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_image_member(name: str) -> bool:
+    path = PurePosixPath(name)
+    # 跳过隐藏文件与 macOS 打包产生的 __MACOSX 元数据
+    if any(part.startswith('.') or part == '__MACOSX' for part in path.parts):
+        return False
+    return path.suffix.lower() in IMAGE_SUFFIXES
+
+
+class UploadedImages:
+    """
+    可迭代的上传图片序列，len() 为图片总数，迭代时逐张产出原始字节。
+    max_images：图片数量上限；max_image_bytes：单张图片（解压后）大小上限，防止压缩包炸弹。
+    """
+
+    def __init__(self, files: List = None, archive=None, max_images: int = 5000, max_image_bytes: int = 32 * 1024 * 1024):
+        self.max_image_bytes = max_image_bytes
+        self._files = [f for f in (files or []) if f and f.filename]
+        self._archive = None
+        self._members = []
+        if archive is not None and archive.filename:
+            if self._files:
+                raise UploadError("图片文件与压缩包只能二选一")
+            self._open_archive(archive)
+        count = len(self)
+        if count == 0:
+            raise UploadError("没有可检测的图片")
+        if count > max_images:
+            raise UploadError(f"图片数量 {count} 超过上限 {max_images}")
+
+    def _open_archive(self, archive):
+        filename = archive.filename.lower()
+        stream = archive.stream
+        try:
+            if filename.endswith('.zip'):
+                self._archive = zipfile.ZipFile(stream)
+                infos = [info for info in self._archive.infolist() if not info.is_dir() and _is_image_member(info.filename)]
+                sizes = {info.filename: info.file_size for info in infos}
+                self._members = sorted(info.filename for info in infos)
+            elif filename.endswith(ARCHIVE_SUFFIXES):
+                # getmembers() 需要顺序读完整个包才能拿到成员表（压缩的 tar 即完整解压一遍）。
+                # .tar.gz/.bz2/.xz 的解压流只能向前 seek，向后 seek 会从头重新解压，
+                # 若按路径排序读取，每张图都可能回退重解压，总耗时 O(n²)；因此按包内顺序（offset_data 递增）读取
+                self._archive = tarfile.open(fileobj=stream, mode='r:*')
+                infos = [info for info in self._archive.getmembers() if info.isfile() and _is_image_member(info.name)]
+                sizes = {info.name: info.size for info in infos}
+                self._members = sorted(infos, key=lambda info: info.offset_data)
+            else:
+                raise UploadError(f"不支持的压缩包格式: {archive.filename}")
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            raise UploadError(f"压缩包无法解析: {e}")
+        oversized = [name for name, size in sizes.items() if size > self.max_image_bytes]
+        if oversized:
+            raise UploadError(f"压缩包中的图片 {oversized[0]} 超过单张大小上限")
+
+    def __len__(self) -> int:
+        return len(self._members) if self._archive is not None else len(self._files)
+
+    @property
+    def names(self) -> List[str]:
+        if isinstance(self._archive, tarfile.TarFile):
+            return [info.name for info in self._members]
+        if self._archive is not None:
+            return list(self._members)
+        return [f.filename for f in self._files]
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._archive is None:
+            for f in self._files:
+                yield f.read()
+        elif isinstance(self._archive, zipfile.ZipFile):
+            for name in self._members:
+                yield self._archive.read(name)
+        else:
+            for info in self._members:
+                with self._archive.extractfile(info) as member:
+                    yield member.read()
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
@@ -0,0 +1,71 @@
+# backend/tests/test_face_recognize.py
+"""DeepFake 模型（可选子系统）未加载时的人脸识别测试（在 backend 目录下运行 python -m pytest tests）。"""
+import cv2
+import numpy as np
+import pytest
+
+from app.services.face_gallery import FEATURE_DIM, FaceGallery
+from app.services.face_service import FaceRecognitionService
+
+
+class _Rect:
+    """与 dlib.rectangle 相同的取值接口。"""
+
+    def __init__(self, left, top, right, bottom):
+        self._box = (left, top, right, bottom)
+
+    def left(self):
+        return self._box[0]
+
+    def top(self):
+        return self._box[1]
+
+    def right(self):
+        return self._box[2]
+
+    def bottom(self):
+        return self._box[3]
+
+
+class _FakeRecoModel:
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+
+    def compute_face_descriptor(self, img_rgb, shape):
+        return self.descriptor
+
+
+def _jpeg():
+    image = np.full((120, 160, 3), 128, dtype=np.uint8)
+    ok, buf = cv2.imencode('.jpg', image)
+    return buf.tobytes()
+
+
+@pytest.fixture
+def service():
+    known = np.random.default_rng(0).normal(size=FEATURE_DIM).astype(np.float32) * 0.1
+    svc = FaceRecognitionService({'FACE_DECODE_MIN_SIDE': 0, 'FACE_ANN_INDEX': 'off'})
+    svc.result_cache.configure(max_entries=0)
+    svc.detector = lambda img, upsample: [_Rect(20, 20, 80, 90)]
+    svc.predictor = lambda img, rect: None
+    svc.face_reco_model = _FakeRecoModel(known)
+    svc.gallery = FaceGallery(['张三'], known[None, :])
+    assert svc.deepfake_model is None
+    return svc, known
+
+
+def test_recognize_without_deepfake_model_matches(service):
+    svc, _ = service
+    results = svc.recognize_face(_jpeg())
+    assert len(results) == 1
+    assert 'status' not in results[0]
+    assert results[0]['name'] == '张三'
+    assert results[0]['distance'] == 0.0
+
+
+def test_recognize_without_deepfake_model_stranger(service):
+    svc, known = service
+    svc.face_reco_model = _FakeRecoModel(known + 1.0)
+    results = svc.recognize_face(_jpeg())
+    assert results[0]['name'] == '陌生人'
+    assert 'status' not in results[0]
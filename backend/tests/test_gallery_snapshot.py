@@ -0,0 +1,66 @@
+# backend/tests/test_gallery_snapshot.py
+"""人脸库加密快照的写入 / 读取往返测试（在 backend 目录下运行 python -m pytest tests）。"""
+import numpy as np
+import pytest
+
+from app.services.face_gallery import FEATURE_DIM, FaceGallery
+from app.services.gallery_snapshot import SnapshotError, read_snapshot, write_snapshot
+from app.utils.crypto import AESEncryption
+
+
+@pytest.fixture
+def gallery_data():
+    rng = np.random.default_rng(0)
+    names = [f'用户{i}' for i in range(257)]
+    return names, rng.normal(size=(len(names), FEATURE_DIM)).astype(np.float32)
+
+
+def test_round_trip(tmp_path, gallery_data):
+    names, matrix = gallery_data
+    path = str(tmp_path / 'gallery.snapshot')
+    write_snapshot(path, names, matrix, 'fp-1', generation=3)
+
+    loaded_names, loaded_matrix, header = read_snapshot(path, 'fp-1')
+
+    assert loaded_names == names
+    assert np.array_equal(loaded_matrix, matrix)
+    assert header['generation'] == 3
+    # 返回的矩阵可被人脸库直接接管并增量修改
+    gallery = FaceGallery(loaded_names, loaded_matrix, copy=False)
+    gallery.upsert('新用户', matrix[0])
+    assert gallery.remove(names[5])
+    assert len(gallery) == len(names)
+
+
+def test_empty_gallery_round_trip(tmp_path):
+    path = str(tmp_path / 'gallery.snapshot')
+    write_snapshot(path, [], np.empty((0, FEATURE_DIM), dtype=np.float32), 'fp-0')
+    names, matrix, _ = read_snapshot(path, 'fp-0')
+    assert names == [] and matrix.shape == (0, FEATURE_DIM)
+
+
+def test_stale_fingerprint_rejected(tmp_path, gallery_data):
+    names, matrix = gallery_data
+    path = str(tmp_path / 'gallery.snapshot')
+    write_snapshot(path, names, matrix, 'fp-1')
+    with pytest.raises(SnapshotError, match='过期'):
+        read_snapshot(path, 'fp-2')
+
+
+def test_tampered_file_rejected(tmp_path, gallery_data):
+    names, matrix = gallery_data
+    path = tmp_path / 'gallery.snapshot'
+    write_snapshot(str(path), names, matrix, 'fp-1')
+    data = bytearray(path.read_bytes())
+    data[-100] ^= 0x01
+    path.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError, match='校验失败'):
+        read_snapshot(str(path), 'fp-1')
+
+
+def test_different_key_rejected(tmp_path, gallery_data):
+    names, matrix = gallery_data
+    path = str(tmp_path / 'gallery.snapshot')
+    write_snapshot(path, names, matrix, 'fp-1')
+    with pytest.raises(SnapshotError):
+        read_snapshot(path, 'fp-1', encryption=AESEncryption(key='another-key', salt='another-salt'))
@@ -0,0 +1,2 @@
+# backend/tools
+# 离线运维工具（在 backend 目录下以 python -m tools.<name> 运行）
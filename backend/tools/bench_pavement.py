@@ -0,0 +1,309 @@
+# backend/tools/bench_pavement.py
+"""
+路面检测流水线分阶段基准测试（纯 CPU，不需要网络）
+
+在 backend 目录下运行：
+    python -m tools.bench_pavement --weights data/weights/road_damage.pt --output bench.json
+    python -m tools.bench_pavement --images data/eval --resolutions 1280x720,1920x1080 --iterations 50
+
+直接调用服务入口单帧检测（detect_single_image）与批量检测（detect_batch_images），测量整体帧率，
+并记录服务内部各计时点（STAGE_LATENCY）的耗时：base64 解码（base64_decode）、图像解码（decode）、模型推理、
+检测框提取、标注绘制、图像编码（encode，JPEG/WebP）、base64 编码（base64_encode），以及告警持久化入队。
+告警与线上一样交给后台写入线程异步落盘，另报告每组测量结束后写入线程的排空耗时。
+合成图像使用固定随机种子生成，结果可重复；输出每个阶段的 p50/p95/p99（毫秒）以及整体帧率（JSON），
+用于优化前后对比和回归检查。告警持久化写入临时目录中的 SQLite 数据库，不会触碰业务数据库。
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+# 与 pavement_service 中 STAGE_LATENCY 的 stage 标签一致（含持久化）
+STAGES = ('base64_decode', 'decode', 'inference', 'box_extraction', 'annotation', 'encode', 'base64_encode',
+          'persistence')
+
+DEFAULT_RESOLUTIONS = '640x480,1280x720,1920x1080,3840x2160'
+
+
+class StageTimer:
+    """按阶段记录耗时样本（毫秒）。"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self.frame_totals: List[float] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.samples[name].append((time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, elapsed_ms: float):
+        self.samples.setdefault(name, []).append(elapsed_ms)
+
+    def summary(self) -> Dict:
+        stages = {}
+        for name, values in self.samples.items():
+            if not values:
+                continue
+            arr = np.asarray(values, dtype=np.float64)
+            stages[name] = {
+                'p50_ms': round(float(np.percentile(arr, 50)), 3),
+                'p95_ms': round(float(np.percentile(arr, 95)), 3),
+                'p99_ms': round(float(np.percentile(arr, 99)), 3),
+                'mean_ms': round(float(arr.mean()), 3),
+                'samples': len(values),
+            }
+        totals = np.asarray(self.frame_totals, dtype=np.float64)
+        return {
+            'stages': stages,
+            'frame_p50_ms': round(float(np.percentile(totals, 50)), 3) if len(totals) else None,
+            'frame_p95_ms': round(float(np.percentile(totals, 95)), 3) if len(totals) else None,
+            'fps': round(1000.0 / float(totals.mean()), 2) if len(totals) else None,
+        }
+
+
+def parse_resolutions(text: str):
+    resolutions = []
+    for item in text.split(','):
+        width, height = item.lower().split('x')
+        resolutions.append((int(width), int(height)))
+    return resolutions
+
+
+def synthetic_road_image(width: int, height: int, seed: int) -> np.ndarray:
+    """生成带纹理、车道线和“裂缝”的合成路面图像（RGB），同一种子结果固定。"""
+    rng = np.random.default_rng(seed)
+    image = rng.normal(110, 18, size=(height, width, 3)).clip(0, 255).astype(np.uint8)
+    image = cv2.GaussianBlur(image, (5, 5), 0)
+    lane_width = max(4, width // 120)
+    cv2.line(image, (width // 2, height), (width // 2 + width // 10, 0), (230, 230, 230), lane_width)
+    for _ in range(6):
+        points = np.cumsum(rng.integers(-height // 40 - 1, height // 40 + 2, size=(12, 2)), axis=0)
+        points += rng.integers(0, [width, height], size=2)
+        cv2.polylines(image, [points.astype(np.int32)], False, (40, 40, 40), max(1, width // 800))
+    return image
+
+
+def load_inputs(resolutions, image_dir: str, count: int) -> Dict[str, List[str]]:
+    """准备各分辨率的输入帧（data URL），与前端上传的格式一致。"""
+    inputs = {}
+    for width, height in resolutions:
+        frames = []
+        for i in range(count):
+            rgb = synthetic_road_image(width, height, seed=i)
+            ok, buf = cv2.imencode('.jpg', cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])
+            frames.append('data:image/jpeg;base64,' + base64.b64encode(buf.tobytes()).decode())
+        inputs[f'synthetic_{width}x{height}'] = frames
+
+    if image_dir:
+        from app.services.pavement_backends import list_images
+        for path in list_images(image_dir):
+            frames = inputs.setdefault(f'sample_{path.parent.name}', [])
+            frames.append('data:image/jpeg;base64,' + base64.b64encode(path.read_bytes()).decode())
+    return inputs
+
+
+def make_persistence_app(workdir: Path):
+    """在临时目录中创建 SQLite 数据库并启动告警写入线程，告警持久化走与线上相同的异步路径。"""
+    from flask import Flask
+    from app.extensions import db
+    from app.services.alert_writer import init_alert_writer
+
+    app = Flask('bench_pavement')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{workdir / 'bench.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app, init_alert_writer(app)
+
+
+@contextmanager
+def capture_stage_latency(timer: StageTimer):
+    """
+    临时拦截服务内部 STAGE_LATENCY 的观测值，按阶段记录到 timer（毫秒）。
+    各阶段耗时由 pavement_service 自身的计时点产生，基准测试不再另行实现解码、推理、渲染。
+    """
+    from app.utils.metrics import STAGE_LATENCY
+
+    original = STAGE_LATENCY.observe
+
+    def observe(value, **labels):
+        original(value, **labels)
+        if labels.get('pipeline') == 'pavement':
+            timer.add(labels.get('stage'), value * 1000)
+
+    STAGE_LATENCY.observe = observe
+    try:
+        yield
+    finally:
+        del STAGE_LATENCY.observe
+
+
+def bench_single(frames: List[str], video_id: Optional[int], iterations: int) -> Dict:
+    """
+    逐帧调用 detect_single_image；给出 video_id 时像实时流会话一样做病害跟踪，
+    并把已结束轨迹的最佳帧交给写入线程（persistence 阶段只包含入队，不等待落盘）。
+    """
+    from app.services.pavement_service import DefectTracker, detect_single_image, persist_tracks
+
+    persist = video_id is not None
+    timer = StageTimer()
+    tracker = DefectTracker()
+    with capture_stage_latency(timer):
+        for i in range(iterations):
+            start = time.perf_counter()
+            result = detect_single_image(frames[i % len(frames)])
+            if result['status'] != 'success':
+                raise RuntimeError(result['message'])
+            if persist:
+                with timer.stage('persistence'):
+                    finished = tracker.update(i, result['detections'], result['annotated_image'])
+                    persist_tracks(finished, video_id)
+            timer.frame_totals.append((time.perf_counter() - start) * 1000)
+        if persist:
+            persist_tracks(tracker.flush(), video_id)
+    return timer.summary()
+
+
+def bench_batch(frames: List[str], persist: bool, iterations: int, batch_size: int) -> Dict:
+    """
+    每次以 batch_size 帧调用 detect_batch_images（含跟踪与告警入队，计入 persistence 阶段），帧耗时按调用耗时均摊；
+    inference 等批内阶段的样本为每次批量推理的耗时。不测持久化时直接调用同一批量引擎 iter_batch_detections。
+    """
+    from app.services.pavement_service import detect_batch_images, iter_batch_detections
+
+    timer = StageTimer()
+    done = 0
+    with capture_stage_latency(timer):
+        while done < iterations:
+            size = min(batch_size, iterations - done)
+            batch = [frames[(done + k) % len(frames)] for k in range(size)]
+            start = time.perf_counter()
+            if persist:
+                results = detect_batch_images(batch, batch_size)
+            else:
+                results = list(iter_batch_detections(batch, batch_size))
+            errors = [r['message'] for r in results if r.get('status') != 'success']
+            if errors:
+                raise RuntimeError(errors[0])
+            elapsed = (time.perf_counter() - start) * 1000
+            timer.frame_totals.extend([elapsed / size] * size)
+            done += size
+    return timer.summary()
+
+
+def drain_writer(writer) -> float:
+    """等待写入线程把已入队的告警全部落盘，返回排空耗时（毫秒，不计入帧耗时，反映后台写入能否跟上）。"""
+    start = time.perf_counter()
+    writer.flush()
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='路面检测流水线分阶段基准测试')
+    parser.add_argument('--weights', default='data/weights/road_damage.pt', help='模型权重路径')
+    parser.add_argument('--backend', default='torch', help='推理后端（见 pavement_backends.BACKENDS）')
+    parser.add_argument('--resolutions', default=DEFAULT_RESOLUTIONS, help='合成图像分辨率，逗号分隔，如 1280x720')
+    parser.add_argument('--images', default=None, help='额外的样例图片目录')
+    parser.add_argument('--frames', type=int, default=8, help='每个分辨率生成的合成帧数')
+    parser.add_argument('--iterations', type=int, default=30, help='每组测量的帧数')
+    parser.add_argument('--warmup', type=int, default=3, help='正式测量前的预热帧数')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=None, help='限制 PyTorch CPU 线程数，便于不同机器对比')
+    parser.add_argument('--no-persistence', action='store_true', help='不测量告警持久化')
+    parser.add_argument('--output', default=None, help='结果输出文件（默认打印到标准输出）')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')  # 固定在 CPU 上测量
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    from app.services.pavement_backends import load_pavement_model
+    from app.services.pavement_service import set_global_model
+    from app.utils.result_cache import get_result_cache
+
+    model = load_pavement_model(args.weights, args.backend)
+    set_global_model(model)
+    # 输入帧循环复用，关闭结果缓存，否则批量检测会直接命中缓存而跳过解码与推理
+    get_result_cache('pavement').configure(max_entries=0)
+    inputs = load_inputs(parse_resolutions(args.resolutions), args.images, args.frames)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='bench_pavement_') as tmp:
+        ctx = writer = None
+        if not args.no_persistence:
+            from app.services.alert_service import create_alert_video
+            from app.services.alert_writer import register_video_dir
+            app, writer = make_persistence_app(Path(tmp))
+            ctx = app.app_context()
+            ctx.push()
+            # detect_batch_images 在当前目录的 data/alert_videos 下建告警目录，切到临时目录避免写入业务数据
+            os.chdir(tmp)
+
+        results = {}
+        try:
+            for name, frames in inputs.items():
+                video_id = None
+                if writer is not None:
+                    save_dir = str(Path(tmp) / 'alerts' / name)
+                    video_id = create_alert_video('road', f'bench_{name}', save_dir, 0, 0)
+                    register_video_dir(video_id, save_dir)
+                # 预热：排除首次推理的内存分配与算子初始化
+                bench_single(frames, None, args.warmup)
+                results[name] = {'single': bench_single(frames, video_id, args.iterations)}
+                if writer is not None:
+                    results[name]['single']['persistence_drain_ms'] = drain_writer(writer)
+                results[name]['batch'] = bench_batch(frames, writer is not None, args.iterations, args.batch_size)
+                if writer is not None:
+                    results[name]['batch']['persistence_drain_ms'] = drain_writer(writer)
+                print(f"[bench] {name}: single {results[name]['single']['fps']} fps, "
+                      f"batch {results[name]['batch']['fps']} fps", file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+            if writer is not None:
+                writer.stop()
+            if ctx is not None:
+                ctx.pop()
+
+    report = {
+        'config': {
+            'weights': args.weights,
+            'backend': args.backend,
+            'iterations': args.iterations,
+            'batch_size': args.batch_size,
+            'persistence': not args.no_persistence,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'torch': torch.__version__,
+            'torch_threads': torch.get_num_threads(),
+            'opencv': cv2.__version__,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# backend/tools/face_index_eval.py
+"""
+人脸库近似索引（IVF-Flat）召回率与延迟评估（纯 CPU，不需要数据库与模型）
+
+在 backend 目录下运行：
+    python -m tools.face_index_eval --size 100000 --nprobe 1,4,8,16,32 --output face_index.json
+    python -m tools.face_index_eval --features data/features.npy --queries 2000
+
+以精确比对（FaceGallery，矩阵化暴力扫描）为基准，对每个 nprobe 报告：
+- recall@1：近似索引返回的最近邻与精确结果一致的比例；recall@k：前 k 个结果的重合比例；
+- 单张人脸查询延迟的 p50/p95（毫秒）及相对精确比对的加速比；
+另外报告索引训练耗时、增量插入/删除的单次耗时、.npz 保存与加载耗时及文件大小。
+默认使用固定随机种子生成的合成特征：身份特征分布在低维子空间上（接近真实人脸特征的结构），
+查询为身份特征加噪声（与同一人的多张照片的距离相当）；--features 可指定真实的 (N, 128) 特征矩阵（.npy）。
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.face_gallery import FEATURE_DIM, FaceGallery
+from app.services.face_index import IVFFlatIndex, build_index
+
+
+def synthetic_features(size: int, seed: int, latent_dim: int = 32) -> np.ndarray:
+    """低秩结构的合成身份特征，不同身份之间的欧氏距离约 0.8–1.0（与 dlib 128D 特征相当）。"""
+    rng = np.random.default_rng(seed)
+    basis = rng.normal(size=(latent_dim, FEATURE_DIM)) / np.sqrt(FEATURE_DIM)
+    latent = rng.normal(size=(size, latent_dim)) * 0.11
+    noise = rng.normal(size=(size, FEATURE_DIM)) * 0.02
+    return (latent @ basis + noise).astype(np.float32)
+
+
+def make_queries(features: np.ndarray, count: int, noise: float, seed: int):
+    """从人脸库中随机抽取身份并加噪声，返回 (查询, 真实身份下标)。"""
+    rng = np.random.default_rng(seed + 1)
+    truth = rng.choice(len(features), count, replace=len(features) < count)
+    queries = features[truth] + rng.normal(size=(count, FEATURE_DIM)).astype(np.float32) * noise
+    return queries.astype(np.float32), truth
+
+
+def percentiles(samples: List[float]) -> Dict:
+    arr = np.asarray(samples) * 1000
+    return {'p50_ms': round(float(np.percentile(arr, 50)), 3), 'p95_ms': round(float(np.percentile(arr, 95)), 3)}
+
+
+def eval_exact(gallery: FaceGallery, queries: np.ndarray, k: int):
+    timings, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = gallery.search(query, k)
+        timings.append(time.perf_counter() - start)
+        results.append([name for name, _ in hits])
+    return results, timings
+
+
+def eval_index(index: IVFFlatIndex, queries: np.ndarray, k: int, nprobe: int):
+    timings, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(query, k, nprobe=nprobe)
+        timings.append(time.perf_counter() - start)
+        results.append([name for name, _ in hits])
+    return results, timings
+
+
+def eval_updates(index: IVFFlatIndex, features: np.ndarray, count: int, seed: int) -> Dict:
+    """增量插入新姓名、再删除，测量单次耗时，结束后索引内容恢复原样。"""
+    rng = np.random.default_rng(seed + 2)
+    vectors = features[rng.choice(len(features), count)] + rng.normal(size=(count, FEATURE_DIM)).astype(np.float32) * 0.05
+    names = [f'__eval_{i}' for i in range(count)]
+    inserts, deletes = [], []
+    for name, vector in zip(names, vectors):
+        start = time.perf_counter()
+        index.upsert(name, vector)
+        inserts.append(time.perf_counter() - start)
+    for name in names:
+        start = time.perf_counter()
+        index.remove(name)
+        deletes.append(time.perf_counter() - start)
+    return {'insert': percentiles(inserts), 'delete': percentiles(deletes)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='人脸库 IVF 索引召回率与延迟评估')
+    parser.add_argument('--size', type=int, default=100000, help='合成人脸库规模（使用 --features 时忽略）')
+    parser.add_argument('--features', default=None, help='真实特征矩阵 .npy 文件，形状 (N, 128)')
+    parser.add_argument('--queries', type=int, default=1000, help='查询数')
+    parser.add_argument('--query-noise', type=float, default=0.025, help='查询相对身份特征的逐维噪声标准差')
+    parser.add_argument('--k', type=int, default=5, help='recall@k 中的 k')
+    parser.add_argument('--nlist', type=int, default=0, help='簇数（0 自动）')
+    parser.add_argument('--nprobe', default='1,4,8,16,32', help='要评估的 nprobe，逗号分隔')
+    parser.add_argument('--updates', type=int, default=200, help='增量插入/删除的测量次数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='结果输出文件（默认打印到标准输出）')
+    args = parser.parse_args(argv)
+
+    if args.features:
+        features = np.load(args.features).astype(np.float32).reshape(-1, FEATURE_DIM)
+    else:
+        features = synthetic_features(args.size, args.seed)
+    names = [str(i) for i in range(len(features))]
+    queries, truth = make_queries(features, args.queries, args.query_noise, args.seed)
+    gallery = FaceGallery(names, features)
+
+    start = time.perf_counter()
+    index = build_index(names, features, nlist=args.nlist)
+    build_seconds = time.perf_counter() - start
+
+    exact, exact_timings = eval_exact(gallery, queries, args.k)
+    exact_latency = percentiles(exact_timings)
+    report = {
+        'gallery_size': len(features),
+        'queries': len(queries),
+        'k': args.k,
+        'index': index.stats(),
+        'build_seconds': round(build_seconds, 3),
+        'exact': {**exact_latency,
+                  'top1_is_true_identity': round(float(np.mean([r[0] == str(t) for r, t in zip(exact, truth)])), 4)},
+        'ivf': [],
+    }
+    for nprobe in [int(p) for p in args.nprobe.split(',') if p.strip()]:
+        approx, timings = eval_index(index, queries, args.k, nprobe)
+        latency = percentiles(timings)
+        recall_1 = np.mean([a[:1] == e[:1] for a, e in zip(approx, exact)])
+        recall_k = np.mean([len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(approx, exact)])
+        report['ivf'].append({
+            'nprobe': nprobe,
+            'recall@1': round(float(recall_1), 4),
+            f'recall@{args.k}': round(float(recall_k), 4),
+            **latency,
+            'speedup_p50': round(exact_latency['p50_ms'] / latency['p50_ms'], 1) if latency['p50_ms'] else None,
+        })
+        print(f"[face_index] nprobe={nprobe}: recall@1 {recall_1:.4f}, p50 {latency['p50_ms']}ms "
+              f"(精确 {exact_latency['p50_ms']}ms)", file=sys.stderr)
+
+    if args.updates > 0:
+        report['updates'] = eval_updates(index, features, args.updates, args.seed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'face_index.npz')
+        start = time.perf_counter()
+        index.save(path)
+        save_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = IVFFlatIndex.load(path)
+        load_seconds = time.perf_counter() - start
+        report['persistence'] = {'save_seconds': round(save_seconds, 3), 'load_seconds': round(load_seconds, 3),
+                                 'file_mb': round(os.path.getsize(path) / 1024 / 1024, 2),
+                                 'loaded_size': len(loaded)}
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# backend/tools/pavement_int8_report.py
+"""
+路面病害模型 INT8 量化与对比报告
+
+在 backend 目录下运行：
+    python -m tools.pavement_int8_report --calibration data/calibration --images data/eval
+- 首次运行（或权重更新后）会用 --calibration 目录中的图片校准生成 data/weights/road_damage_int8.onnx；
+- 随后在 --images 目录上分别用 FP32 与 INT8 推理，输出延迟、内存和检测一致性（JSON）。
+确认结果可接受后，设置 PAVEMENT_BACKEND=onnx-int8 启动服务即可切换到 INT8 模型。
+"""
+import argparse
+import json
+import sys
+
+from app.services.pavement_backends import compare_models, quantize_onnx_int8, BACKEND_ONNX_INT8, BACKENDS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='路面病害模型 FP32 / INT8 对比报告')
+    parser.add_argument('--weights', default='data/weights/road_damage.pt', help='FP32 权重路径')
+    parser.add_argument('--calibration', default='data/calibration', help='INT8 校准图片目录')
+    parser.add_argument('--images', required=True, help='评估图片目录')
+    parser.add_argument('--backend', default=BACKEND_ONNX_INT8, choices=[b for b in BACKENDS if b != 'torch'],
+                        help='与 FP32 对比的后端')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.30, help='置信度阈值（与服务一致）')
+    parser.add_argument('--iou', type=float, default=0.5, help='判定两个框一致的 IoU 阈值')
+    parser.add_argument('--max-images', type=int, default=None)
+    parser.add_argument('--requantize', action='store_true', help='忽略已有的 INT8 模型，重新校准量化')
+    parser.add_argument('--output', default=None, help='报告输出文件（默认打印到标准输出）')
+    args = parser.parse_args(argv)
+
+    if args.requantize and args.backend == BACKEND_ONNX_INT8:
+        quantize_onnx_int8(args.weights, args.calibration, args.imgsz)
+
+    try:
+        report = compare_models(args.weights, args.images, candidate_backend=args.backend,
+                                calibration_dir=args.calibration, conf=args.conf, iou_threshold=args.iou,
+                                max_images=args.max_images, imgsz=args.imgsz)
+    except (RuntimeError, ValueError) as e:
+        print(f"[int8_report] 对比失败: {e}", file=sys.stderr)
+        return 1
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# backend/tools/startup_report.py
+"""
+服务启动耗时报告
+
+在 backend 目录下运行：
+    python -m tools.startup_report                       # 对比 eager / background / lazy 三种启动模式
+    python -m tools.startup_report --modes lazy --top 30 --output startup.json
+
+每种模式在独立子进程中以 `python -X importtime` 导入 app.main，报告：
+- import_seconds：导入 app.main 的耗时（即服务可以开始接收请求的时间）；
+- ready_seconds：所有已开始加载的模型子系统结束所需的总时间，以及各子系统的状态与加载耗时；
+- top_imports：按累计导入耗时排序的顶层模块（来自 -X importtime 输出），用于定位拖慢启动的依赖。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_CHILD_SCRIPT = r'''
+import json, sys, time
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter() - start
+main.model_registry.wait_all()
+ready = time.perf_counter() - start
+print('@@STARTUP@@' + json.dumps({'import_seconds': round(imported, 3), 'ready_seconds': round(ready, 3),
+                                  'registry': main.model_registry.status()}, ensure_ascii=False))
+'''
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    解析 -X importtime 输出（import time: self [us] | cumulative | imported package），
+    返回各模块的自身耗时与累计耗时（毫秒）及嵌套深度（0 为顶层导入）。
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        records.append({
+            'module': name.strip(),
+            'self_ms': round(int(self_us) / 1000, 2),
+            'cumulative_ms': round(int(cumulative_us) / 1000, 2),
+            'depth': depth,
+        })
+    return records
+
+
+def run_mode(mode: str, top: int, timeout: float) -> Dict:
+    env = dict(os.environ, STARTUP_MODE=mode)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _CHILD_SCRIPT], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, timeout=timeout)
+    report = {'mode': mode, 'returncode': proc.returncode}
+    for line in proc.stdout.splitlines():
+        if line.startswith('@@STARTUP@@'):
+            report.update(json.loads(line[len('@@STARTUP@@'):]))
+    if proc.returncode != 0:
+        report['error'] = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'unknown error'
+
+    records = parse_importtime(proc.stderr)
+    top_level = [r for r in records if r['depth'] == 0]
+    report['import_total_ms'] = round(sum(r['cumulative_ms'] for r in top_level), 1)
+    report['top_imports'] = sorted(top_level, key=lambda r: r['cumulative_ms'], reverse=True)[:top]
+    # 关注的重依赖：是否在导入 app.main 时就被加载
+    heavy = ('tensorflow', 'torch', 'ultralytics', 'dlib', 'scipy', 'pandas')
+    loaded = {r['module'].split('.')[0] for r in records}
+    report['heavy_modules_imported'] = [name for name in heavy if name in loaded]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='服务启动耗时报告（基于 -X importtime）')
+    parser.add_argument('--modes', default='eager,background,lazy', help='要测量的启动模式，逗号分隔')
+    parser.add_argument('--top', type=int, default=20, help='列出累计导入耗时最高的顶层模块个数')
+    parser.add_argument('--timeout', type=float, default=600, help='每种模式的超时时间（秒）')
+    parser.add_argument('--output', default=None, help='结果输出文件（默认打印到标准输出）')
+    args = parser.parse_args(argv)
+
+    reports = []
+    for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+        report = run_mode(mode, args.top, args.timeout)
+        reports.append(report)
+        print(f"[startup] {mode}: import {report.get('import_seconds')}s, ready {report.get('ready_seconds')}s, "
+              f"重依赖 {report['heavy_modules_imported']}", file=sys.stderr)
+
+    text = json.dumps({'python': sys.version.split()[0], 'reports': reports}, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())